@@ -0,0 +1,283 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Count the neutron and heat calls made while serving a request.
+
+A debugging and performance aid: install() routes the neutron and heat
+clients used by horizon_bsn and openstack_dashboard through a counting
+proxy, and every client call made while a Recorder is active is recorded
+with its arguments and, optionally, the stack it was made from. Identical
+calls made more than once in one request, the N+1 pattern, are reported
+with the stacks of every call.
+
+CallBudgetMiddleware records every request. Add it to the Horizon
+settings, with the call budgets of the views to check::
+
+    MIDDLEWARE_CLASSES += (
+        'horizon_bsn.api.callbudget.CallBudgetMiddleware',)
+    # calls allowed per view name; these views may not repeat a call
+    BSN_CALL_BUDGETS = {
+        'horizon:project:connections:index': 8,
+    }
+    # raise CallBudgetExceeded instead of logging, e.g. in test settings
+    BSN_CALL_BUDGET_ENFORCE = True
+    # record the stack of every call, on by default
+    BSN_CALL_BUDGET_STACKS = False
+
+Tests may also record a block directly::
+
+    with callbudget.recording() as recorder:
+        neutron.tenantpolicy_list(request)
+    recorder.check(budget=1)
+
+The recorder belongs to the thread serving the request. Worker threads
+started for it, like those of the tenant policy bulk import and change
+sets, run their target through propagate() so their calls are counted
+too; calls made from any other thread are not recorded.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import contextlib
+import functools
+import importlib
+import logging
+import threading
+import traceback
+
+from django.conf import settings
+import six
+
+LOG = logging.getLogger(__name__)
+
+# frames of the calling code kept for each call
+STACK_DEPTH = 8
+
+# client factories wrapped by install(), as (module, attribute)
+CLIENT_FACTORIES = (('openstack_dashboard.api.neutron', 'neutronclient'),
+                    ('horizon_bsn.api.neutron', 'neutronclient'),
+                    ('openstack_dashboard.api.heat', 'heatclient'))
+
+Call = collections.namedtuple('Call', ['name', 'arguments', 'stack'])
+
+# attribute values returned as they are by the proxy
+_PLAIN_TYPES = (type(None), bool, float, dict, list, tuple, six.binary_type,
+                six.text_type) + six.integer_types
+
+_local = threading.local()
+_install_lock = threading.Lock()
+
+
+class CallBudgetExceeded(Exception):
+    pass
+
+
+class Recorder(object):
+    """Backend calls of one request.
+
+    :param stacks: keep the stack each call was made from
+    """
+
+    def __init__(self, stacks=True):
+        self.stacks = stacks
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def record(self, name, args, kwargs):
+        arguments = [repr(arg) for arg in args]
+        arguments.extend('%s=%r' % item for item in sorted(kwargs.items()))
+        arguments = ', '.join(arguments)
+        stack = None
+        if self.stacks:
+            frames = [frame for frame in traceback.extract_stack()
+                      if frame[0] != __file__.rstrip('c')]
+            stack = frames[-STACK_DEPTH:]
+        with self._lock:
+            self.calls.append(Call(name, arguments, stack))
+
+    def counts(self):
+        """Return the number of calls of each client method."""
+        return collections.Counter(call.name for call in self.calls)
+
+    def duplicates(self):
+        """Return the identical calls made more than once.
+
+        :returns: dict of (name, arguments) to the list of those calls
+        """
+        calls = collections.defaultdict(list)
+        for call in self.calls:
+            calls[(call.name, call.arguments)].append(call)
+        return dict((key, same) for key, same in calls.items()
+                    if len(same) > 1)
+
+    def report(self):
+        """Return a readable summary of the calls and duplicates."""
+        lines = ['%d backend calls' % len(self.calls)]
+        for name, count in sorted(self.counts().items()):
+            lines.append('  %4d %s' % (count, name))
+        for (name, arguments), calls in sorted(self.duplicates().items()):
+            lines.append('%s(%s) called %d times' %
+                         (name, arguments, len(calls)))
+            for i, call in enumerate(calls):
+                if call.stack:
+                    lines.append('  call %d from:' % (i + 1))
+                    lines.extend(
+                        '    ' + line.rstrip('\n')
+                        for line in traceback.format_list(call.stack))
+        return '\n'.join(lines)
+
+    def check(self, budget=None, duplicates=False):
+        """Raise CallBudgetExceeded when the calls are over budget.
+
+        :param budget: number of calls allowed, None for no limit
+        :param duplicates: allow identical calls to be repeated
+        """
+        problems = []
+        if budget is not None and len(self.calls) > budget:
+            problems.append('%d backend calls, budget is %d' %
+                            (len(self.calls), budget))
+        if not duplicates and self.duplicates():
+            problems.append('%d calls repeated' % len(self.duplicates()))
+        if problems:
+            problems.append(self.report())
+            raise CallBudgetExceeded('\n'.join(problems))
+
+
+def current():
+    """Return the recorder of the current thread, or None."""
+    return getattr(_local, 'recorder', None)
+
+
+@contextlib.contextmanager
+def recording(stacks=True):
+    """Record the backend calls of the block; yields the Recorder."""
+    install()
+    previous = current()
+    _local.recorder = Recorder(stacks)
+    try:
+        yield _local.recorder
+    finally:
+        _local.recorder = previous
+
+
+def propagate(function):
+    """Return function, recording into the current recorder when run.
+
+    For the target of a worker thread started while serving a request.
+    """
+    recorder = current()
+    if recorder is None:
+        return function
+
+    @functools.wraps(function)
+    def run(*args, **kwargs):
+        previous = current()
+        _local.recorder = recorder
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _local.recorder = previous
+    return run
+
+
+class _Proxy(object):
+    """Record the method calls of a client and of its managers."""
+
+    def __init__(self, target, name):
+        self._target = target
+        self._name = name
+
+    def __getattr__(self, attribute):
+        value = getattr(self._target, attribute)
+        if attribute.startswith('_') or \
+                isinstance(value, _PLAIN_TYPES):
+            return value
+        name = '%s.%s' % (self._name, attribute)
+        if not callable(value):
+            # a manager, e.g. heatclient's stacks
+            return _Proxy(value, name)
+
+        def call(*args, **kwargs):
+            recorder = current()
+            if recorder is not None:
+                recorder.record(name, args, kwargs)
+            return value(*args, **kwargs)
+        return call
+
+
+def _counting(factory, name):
+    def client(*args, **kwargs):
+        return _Proxy(factory(*args, **kwargs), name)
+    client._bsn_counting = True
+    return client
+
+
+def install():
+    """Route the backend clients through the counting proxy, once.
+
+    Clients patched in later, e.g. by test fixtures, are not counted:
+    patch them before recording.
+    """
+    with _install_lock:
+        for module_name, attribute in CLIENT_FACTORIES:
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError:
+                continue
+            factory = getattr(module, attribute, None)
+            if factory is None or getattr(factory, '_bsn_counting', False):
+                continue
+            setattr(module, attribute,
+                    _counting(factory, attribute.replace('client', '')))
+
+
+class CallBudgetMiddleware(object):
+    """Record the backend calls of every request and check its budget.
+
+    Views with a budget fail the check when they make more calls than
+    budgeted or repeat a call; repeated calls of other views are logged.
+    """
+
+    def __init__(self):
+        self.budgets = getattr(settings, 'BSN_CALL_BUDGETS', {})
+        self.enforce = getattr(settings, 'BSN_CALL_BUDGET_ENFORCE', False)
+        self.stacks = getattr(settings, 'BSN_CALL_BUDGET_STACKS', True)
+
+    def process_request(self, request):
+        # clients patched since the last request, e.g. by tests, are
+        # wrapped again
+        install()
+        _local.recorder = Recorder(self.stacks)
+
+    def process_response(self, request, response):
+        recorder = current()
+        _local.recorder = None
+        if recorder is None or not recorder.calls:
+            return response
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else request.path
+        if view not in self.budgets:
+            if recorder.duplicates():
+                LOG.warning("Repeated backend calls in %s: %s",
+                            view, recorder.report())
+            else:
+                LOG.debug("Backend calls of %s: %s", view, recorder.report())
+            return response
+        try:
+            recorder.check(self.budgets[view])
+        except CallBudgetExceeded as e:
+            if self.enforce:
+                raise
+            LOG.warning("Backend calls of %s over budget: %s", view, e)
+        return response
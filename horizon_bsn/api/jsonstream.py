@@ -0,0 +1,105 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Incremental decoding of large JSON documents.
+
+Used for tenant policy imports and for streamed controller responses, so
+that neither has to hold a whole document, or its decoded form, in memory.
+"""
+
+from __future__ import absolute_import
+
+import codecs
+import json
+import re
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# characters that end a number or a true/false/null literal
+_DELIMITERS = ' \t\n\r,]}'
+
+
+def iter_json(chunks):
+    """Incrementally decode a JSON array, or a stream of JSON documents.
+
+    Elements of a top level array are yielded one at a time as soon as
+    they are complete, so the whole document is never held in memory.
+    A malformed array, or data after its closing bracket, raises
+    ValueError once it is reached.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    in_array = None
+    # in an array: what the next token must be, 'first' (a value or ']'),
+    # 'value', 'separator' (',' or ']') or 'end' once it is closed
+    expect = 'first'
+    exhausted = False
+    chunks = iter(chunks)
+    while True:
+        pos = _WHITESPACE.match(buf, pos).end()
+        if pos < len(buf):
+            char = buf[pos]
+            if in_array is None:
+                in_array = char == '['
+                if in_array:
+                    pos += 1
+                continue
+            if in_array:
+                if expect == 'end':
+                    raise ValueError('Extra data after JSON array: %r'
+                                     % buf[pos:pos + 20])
+                if expect == 'separator' or char in ',]':
+                    if char == ']' and expect != 'value':
+                        expect = 'end'
+                    elif char == ',' and expect == 'separator':
+                        expect = 'value'
+                    else:
+                        raise ValueError('Unexpected %r in JSON array'
+                                         % char)
+                    pos += 1
+                    continue
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if exhausted:
+                    raise
+            else:
+                # a number or literal running to the end of the buffer may
+                # go on in the next chunk, e.g. '1' followed by '.5e3'
+                complete = end < len(buf) and buf[end] in _DELIMITERS
+                if complete or exhausted or char in '"[{':
+                    pos = end
+                    expect = 'separator'
+                    yield value
+                    continue
+        elif exhausted:
+            if in_array and expect != 'end':
+                raise ValueError('Unterminated JSON array')
+            return
+        try:
+            buf = buf[pos:] + next(chunks)
+            pos = 0
+        except StopIteration:
+            exhausted = True
+
+
+def decode_chunks(chunks, encoding='utf-8'):
+    """Decode byte chunks to text, keeping characters split across chunks."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
@@ -15,9 +15,16 @@ from __future__ import absolute_import
 
 import logging
 
+from neutronclient.common import exceptions as neutron_exceptions
 from openstack_dashboard.api import neutron
 from openstack_dashboard.api.neutron import NeutronAPIDictWrapper
 
+from horizon_bsn.api import reachabilitytest_index
+from horizon_bsn.api import request_cache
+from horizon_bsn.api import search
+from horizon_bsn.api import tenantpolicy
+from horizon_bsn.api import tenantpolicy_search
+
 LOG = logging.getLogger(__name__)
 
 # initialized by core horizon app
@@ -33,6 +40,73 @@ def reachabilitytest_list(request, **params):
     return object_list
 
 
+# exact query fields that neutron can filter on before listing
+REACHABILITYTEST_BACKEND_FILTERS = {'expected': 'expected_result',
+                                    'result': 'test_result',
+                                    'status': 'test_result'}
+
+
+def reachabilitytest_search(request, query, **params):
+    """Search reachability tests with a field-scoped query.
+
+    Terms look like ``name:web``, ``src:10.0.0.0/8``, ``segment:db``,
+    ``expected:"dropped by policy"`` or ``result:fail``; see
+    horizon_bsn.api.search. An expected or last result term is passed to
+    neutron as a filter when it is the only value asked for that
+    attribute; all terms are then answered from the tenant's index in
+    horizon_bsn.api.reachabilitytest_index, which is reused while the
+    listed tests stay the same.
+
+    :param request: request context
+    :param query: query string
+    :param tenant_id: (optional) tenant id of the tests
+    :returns: list of matching reachability tests
+    """
+    LOG.debug("reachabilitytest_search(): query=%s params=%s",
+              query, params)
+    terms = search.parse_query(query, reachabilitytest_index.FIELDS)
+    values = {}
+    for field, value in terms:
+        attribute = REACHABILITYTEST_BACKEND_FILTERS.get(field)
+        if attribute:
+            values.setdefault(attribute, set()).add(value.lower())
+    # terms are ANDed, so an attribute asked for with different values is
+    # left to the index rather than sent as a neutron (OR) list filter
+    for attribute, choices in values.items():
+        if len(choices) == 1 and attribute not in params:
+            params[attribute] = choices.pop()
+    tests = reachabilitytest_list(request, **params)
+    if not terms:
+        return tests
+    filters = tuple(sorted((name, value) for name, value in params.items()
+                           if name != 'tenant_id'))
+    tenant_id = params.get('tenant_id') or request.user.project_id
+    return reachabilitytest_index.filter_tests((tenant_id, filters), tests,
+                                               terms)
+
+
+def reachabilitytest_filter(request, reachabilitytests, query,
+                            tenant_id=None):
+    """Return the listed reachability tests matching a query.
+
+    The query syntax is that of reachabilitytest_search, but the tests are
+    the ones already listed, e.g. by the Connections panel tabs.
+
+    :param request: request context
+    :param reachabilitytests: reachability tests from reachabilitytest_list
+    :param query: query string
+    :param tenant_id: tenant the tests were listed for, None for all tenants
+    :returns: list of matching reachability tests
+    """
+    LOG.debug("reachabilitytest_filter(): query=%s tenant_id=%s",
+              query, tenant_id)
+    terms = search.parse_query(query, reachabilitytest_index.FIELDS)
+    if not terms:
+        return list(reachabilitytests)
+    return reachabilitytest_index.filter_tests((tenant_id, ()),
+                                               reachabilitytests, terms)
+
+
 def convert_to_cli(result_detail):
     l = []
     l.append("{0:20} {1:20} {2:50}".format("Path Index", "Hop Index",
@@ -70,6 +144,50 @@ def convert_logicalpath_to_cli(result_logical_path):
     return command_line
 
 
+REACHABILITYTEST_STATUS_FIELDS = ('id', 'test_result', 'test_time')
+REACHABILITYTEST_ROW_FIELDS = REACHABILITYTEST_STATUS_FIELDS + (
+    'name', 'src_tenant_name', 'src_segment_name', 'src_ip', 'dst_ip')
+
+
+def reachabilitytest_status(request, reachabilitytest_ids,
+                            fields=REACHABILITYTEST_STATUS_FIELDS):
+    """Fetch only the run status of a set of reachability tests.
+
+    All tests are fetched with a single list call asking neutron for the
+    status fields only, so polling many running tests stays cheap.
+
+    :param request: request context
+    :param reachabilitytest_ids: ids of the tests
+    :param fields: (optional) fields to fetch, the status fields by default
+    :returns: list of dicts with the keys in fields
+    """
+    LOG.debug("reachabilitytest_status(): ids=%s", reachabilitytest_ids)
+    if not reachabilitytest_ids:
+        return []
+    reachabilitytests = neutronclient(request)\
+        .list_reachabilitytests(id=list(reachabilitytest_ids),
+                                fields=list(fields))
+    return [dict((field, obj.get(field)) for field in fields)
+            for obj in reachabilitytests['reachabilitytests']]
+
+
+def reachabilitytest_row(request, reachabilitytest_id):
+    """Fetch the fields a reachability tests table row shows.
+
+    Used by the row polling a running test; unlike reachabilitytest_get
+    it leaves out the path of the last run and its CLI form.
+
+    :param request: request context
+    :param reachabilitytest_id: id of the test
+    """
+    reachabilitytests = reachabilitytest_status(
+        request, [reachabilitytest_id], fields=REACHABILITYTEST_ROW_FIELDS)
+    if not reachabilitytests:
+        raise neutron_exceptions.NotFound(
+            message="Reachability test %s not found" % reachabilitytest_id)
+    return NeutronAPIDictWrapper(reachabilitytests[0])
+
+
 def reachabilitytest_get(request, reachabilitytest_id):
     LOG.debug("reachabilitytest_get(): id=%s",
               reachabilitytest_id)
@@ -104,6 +222,7 @@ def reachabilitytest_create(request, **params):
     reachabilitytest = neutronclient(request)\
         .create_reachabilitytest(body)\
         .get('reachabilitytest')
+    reachabilitytest_index.invalidate(params['tenant_id'])
     return NeutronAPIDictWrapper(reachabilitytest)
 
 
@@ -121,6 +240,7 @@ def reachabilitytest_update(request, reachabilitytest_id, **params):
     :param run_test: boolean flag to run the test
     """
     LOG.debug("reachabilitytest_update(): params=%s", params)
+    tenant_id = params.get('tenant_id', request.user.project_id)
     if 'tenant_id' in params:
         LOG.debug("Removing tenant_id from params, it cannot be changed")
         params.pop('tenant_id')
@@ -131,6 +251,7 @@ def reachabilitytest_update(request, reachabilitytest_id, **params):
     reachabilitytest = neutronclient(request)\
         .update_reachabilitytest(reachabilitytest_id, body)\
         .get('reachabilitytest')
+    reachabilitytest_index.invalidate(tenant_id)
     return NeutronAPIDictWrapper(reachabilitytest)
 
 
@@ -138,6 +259,7 @@ def reachabilitytest_delete(request, reachabilitytest_id):
     LOG.debug("reachabilitytest_delete(): reachabilitytest_id=%s",
               reachabilitytest_id)
     neutronclient(request).delete_reachabilitytest(reachabilitytest_id)
+    reachabilitytest_index.invalidate(request.user.project_id)
 
 
 def networktemplate_list(request, **params):
@@ -149,6 +271,7 @@ def networktemplate_list(request, **params):
     return object_list
 
 
+@request_cache.cached('networktemplate')
 def networktemplate_get(request, networktemplate_id):
     LOG.debug("networktemplate_get(): networktemplate_id=%s",
               networktemplate_id)
@@ -192,6 +315,7 @@ def networktemplate_update(request, networktemplate_id, **params):
     :param body: body of the network template
     """
     LOG.debug("networktemplate_update(): params=%s", params)
+    request_cache.invalidate(request, 'networktemplate')
     # cannot update tenant_id
     if 'tenant_id' in params:
         LOG.debug("Removing tenant_id from params, "
@@ -211,9 +335,11 @@ def networktemplate_update(request, networktemplate_id, **params):
 def networktemplate_delete(request, networktemplate_id):
     LOG.debug("networktemplate_delete(): networktemplate_id=%s",
               networktemplate_id)
+    request_cache.invalidate(request, 'networktemplate')
     neutronclient(request).delete_networktemplate(networktemplate_id)
 
 
+@request_cache.cached('networktemplateassignment')
 def networktemplateassignment_list(request, **params):
     LOG.debug("networktemplateassignment_list(): params=%s", params)
     networktemplateassignments = neutronclient(request)\
@@ -224,6 +350,7 @@ def networktemplateassignment_list(request, **params):
     return assignlist
 
 
+@request_cache.cached('networktemplateassignment')
 def networktemplateassignment_get(request, networktemplateassignment_id):
     LOG.debug("networktemplateassignment_get(): id=%s",
               networktemplateassignment_id)
@@ -236,6 +363,7 @@ def networktemplateassignment_get(request, networktemplateassignment_id):
 def networktemplateassignment_delete(request, networktemplateassignment_id):
     LOG.debug("networktemplateassignment_delete(): networktemplate_id=%s",
               networktemplateassignment_id)
+    request_cache.invalidate(request, 'networktemplateassignment')
     neutronclient(request)\
         .delete_networktemplateassignment(networktemplateassignment_id)
 
@@ -253,6 +381,7 @@ def networktemplateassignment_update(request,
     LOG.debug("networktemplateassignment_update(): id=%s params=%s",
               networktemplateassignment_id,
               params)
+    request_cache.invalidate(request, 'networktemplateassignment')
     # cannot update tenant_id
     if 'tenant_id' in params:
         LOG.debug("Removing tenant_id from params, it cannot be changed")
@@ -277,6 +406,7 @@ def networktemplateassignment_create(request, **params):
     :param stack_id: ID of the heat stack
     """
     LOG.debug("networktemplateassignment_create(): params=%s", params)
+    request_cache.invalidate(request, 'networktemplateassignment')
     if 'tenant_id' not in params:
         params['tenant_id'] = request.user.project_id
     # remove id when creating object. it is autogenerated
@@ -404,6 +534,7 @@ def tenantpolicy_create(request, **params):
     tenantpolicy = (neutronclient(request)
                     .create_tenantpolicy(body)
                     .get('tenantpolicy'))
+    tenantpolicy_search.invalidate(params['tenant_id'])
     return NeutronAPIDictWrapper(tenantpolicy)
 
 
@@ -432,9 +563,38 @@ def tenantpolicy_update(request, tenantpolicy_id, **params):
     tenantpolicy = (neutronclient(request)
                     .update_tenantpolicy(tenantpolicy_id, body)
                     .get('tenantpolicy'))
+    tenantpolicy_search.invalidate(tenantpolicy.get(
+        'tenant_id', request.user.project_id))
     return NeutronAPIDictWrapper(tenantpolicy)
 
 
-def tenantpolicy_delete(request, tenantpolicy_id):
+def tenantpolicy_delete(request, tenantpolicy_id, tenant_id=None):
+    """Delete a tenant policy.
+
+    :param request: request context
+    :param tenantpolicy_id: id of the policy
+    :param tenant_id: (optional) tenant owning the policy, the tenant of
+        the request by default
+    """
     LOG.debug("tenantpolicy_delete(): tenantpolicy_id=%s", tenantpolicy_id)
     neutronclient(request).delete_tenantpolicy(tenantpolicy_id)
+    tenantpolicy_search.invalidate(tenant_id or request.user.project_id)
+
+
+def tenantpolicy_match(request, flows, **params):
+    """Find the tenant policy that the fabric applies to each flow.
+
+    The tenant policies are fetched once and compiled into a
+    tenantpolicy.PolicyMatcher, so large batches of flows are cheap.
+
+    :param request: request context
+    :param flows: list of dicts with keys source, destination and
+                  optionally protocol, source_port, destination_port
+    :param tenant_id: (optional) tenant id of the policies to match against
+    :returns: list with the first matching policy, or None, for each flow
+    """
+    LOG.debug("tenantpolicy_match(): flows=%d params=%s", len(flows), params)
+    if 'tenant_id' not in params:
+        params['tenant_id'] = request.user.project_id
+    matcher = tenantpolicy.PolicyMatcher(tenantpolicy_list(request, **params))
+    return matcher.match_many(flows)
@@ -0,0 +1,82 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-tenant search index over reachability tests.
+
+Works like horizon_bsn.api.tenantpolicy_search, with one index per tenant
+and neutron filters the tests were listed with. The write calls in
+horizon_bsn.api.neutron drop the indexes of the tenant and the all-tenant
+ones; new test results are picked up after INDEX_TTL seconds.
+
+Queries are field scoped, see horizon_bsn.api.search: ``name:web``,
+``src:10.0.0.0/8``, ``segment:db``, ``expected:"dropped by policy"``,
+``result:fail``. Free text matches any field.
+"""
+
+from __future__ import absolute_import
+
+import logging
+
+from horizon_bsn.api import search
+
+LOG = logging.getLogger(__name__)
+
+TEXT_FIELDS = {'name': 'name',
+               'src_tenant': 'src_tenant_name',
+               'src_segment': 'src_segment_name',
+               'dst_tenant': 'dst_tenant_name',
+               'dst_segment': 'dst_segment_name'}
+EXACT_FIELDS = {'expected': 'expected_result',
+                'result': 'test_result'}
+ADDRESS_FIELDS = {'src': 'src_ip',
+                  'dst': 'dst_ip'}
+ALIASES = {'tenant': ('src_tenant', 'dst_tenant'),
+           'segment': ('src_segment', 'dst_segment'),
+           'ip': ('src', 'dst'),
+           'status': ('result',)}
+FIELDS = set(TEXT_FIELDS).union(EXACT_FIELDS, ADDRESS_FIELDS, ALIASES)
+
+# number of (tenant, filters) indexes kept by a worker process
+MAX_INDEXES = 256
+# seconds an index is reused for without a write through this process
+INDEX_TTL = 10
+
+_indexes = search.IndexCache(INDEX_TTL, MAX_INDEXES, text=TEXT_FIELDS,
+                             exact=EXACT_FIELDS, address=ADDRESS_FIELDS,
+                             aliases=ALIASES)
+
+
+def invalidate(tenant_id):
+    """Drop the indexes of a tenant, and of all tenants, kept here."""
+    _indexes.invalidate(lambda key: key[0] in (tenant_id, None))
+
+
+def get_index(key, tests):
+    """Return the search index of a list of tests, building it if needed.
+
+    :param key: (tenant_id, filters) tuple the tests were listed with;
+        tenant_id is None for the tests of all tenants
+    :param tests: the tests currently listed for the key
+    """
+    return _indexes.get(key, list(tests))
+
+
+def filter_tests(key, tests, terms):
+    """Return the tests matching parsed query terms, in their order.
+
+    :param key: (tenant_id, filters) tuple the tests were listed with
+    :param tests: the tests currently listed for the key
+    :param terms: terms returned by search.parse_query
+    """
+    LOG.debug("filtering reachability tests of %s by %s", key, terms)
+    return _indexes.search(key, tests, terms)
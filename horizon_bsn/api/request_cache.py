@@ -0,0 +1,89 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Request-local cache of backend objects.
+
+Table actions evaluate ``allowed`` once for the table and again for every
+row, and tabs, rows and forms of the Connections panel look up the same
+network template assignment independently. Lookups wrapped with cached()
+are stored on the Django request, so each unique object is fetched at most
+once per HTTP request. Failures are cached too: a missing assignment is the
+common case and raises on every lookup. The write calls of the same kind
+of object drop the cached entries, so a request never reads back stale
+data it changed itself.
+"""
+
+from __future__ import absolute_import
+
+import functools
+import logging
+
+LOG = logging.getLogger(__name__)
+
+_ATTRIBUTE = '_horizon_bsn_objects'
+
+
+def _store(request):
+    if request is None:
+        return None
+    store = getattr(request, _ATTRIBUTE, None)
+    if store is None:
+        store = {}
+        try:
+            setattr(request, _ATTRIBUTE, store)
+        except AttributeError:
+            return None
+    return store
+
+
+def cached(kind):
+    """Cache the result of a lookup(request, *args) on the request.
+
+    :param kind: name of the object type, used by invalidate()
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(request, *args, **kwargs):
+            store = _store(request)
+            if store is None:
+                return func(request, *args, **kwargs)
+            key = (kind, func.__name__, args,
+                   tuple(sorted(kwargs.items())))
+            try:
+                hit = store.get(key)
+            except TypeError:
+                # unhashable arguments
+                return func(request, *args, **kwargs)
+            if hit is None:
+                try:
+                    hit = (True, func(request, *args, **kwargs))
+                except Exception as e:
+                    hit = (False, e)
+                store[key] = hit
+            else:
+                LOG.debug("%s%s served from the request cache",
+                          func.__name__, args)
+            ok, value = hit
+            if not ok:
+                raise value
+            return value
+        return wrapper
+    return decorator
+
+
+def invalidate(request, kind):
+    """Drop every cached object of one kind from the request cache."""
+    store = _store(request)
+    if store:
+        for key in [key for key in store if key[0] == kind]:
+            del store[key]
@@ -18,12 +18,12 @@ from openstack_dashboard.api.rest import urls
 from openstack_dashboard.api.rest import utils as rest_utils
 
 from horizon_bsn.api import neutron as bsnneutron
+from horizon_bsn.api import stack_topology
+from horizon_bsn.api import tenantpolicy
+from horizon_bsn.api import tenantpolicy_changeset
 
-from openstack_dashboard.api import heat
 from openstack_dashboard.api import neutron
 
-from horizon_bsn.content.connections.tabs import get_stack_topology
-
 import logging
 
 LOG = logging.getLogger(__name__)
@@ -70,8 +70,12 @@ class ReachabilityTests(generic.View):
 
     @rest_utils.ajax()
     def get(self, request):
-        result = bsnneutron.reachabilitytest_list(
-            request,
+        """List reachability tests, optionally filtered by a ?q= query.
+
+        See bsnneutron.reachabilitytest_search for the query syntax.
+        """
+        result = bsnneutron.reachabilitytest_search(
+            request, request.GET.get('q', ''),
             **{'tenant_id': request.user.project_id})
         return {'items': [n.to_dict() for n in result]}
 
@@ -81,6 +85,19 @@ class ReachabilityTests(generic.View):
         return result
 
 
+@urls.register
+class ReachabilityTestStatus(generic.View):
+    """API for polling the run status of BSN Neutron Reachability Tests"""
+    url_regex = r'neutron/reachabilityteststatus/$'
+
+    @rest_utils.ajax()
+    def get(self, request):
+        """Return id, test_result and test_time of the ?id= tests."""
+        result = bsnneutron.reachabilitytest_status(
+            request, request.GET.getlist('id'))
+        return {'items': result}
+
+
 @urls.register
 class ReachabilityQuickTest(generic.View):
     """API for BSN Neutron Reachability Tests"""
@@ -118,11 +135,15 @@ class HeatStack(generic.View):
 
     @rest_utils.ajax()
     def delete(self, request, stack_id):
+        from openstack_dashboard.api import heat
+
         result = heat.stack_delete(request, stack_id)
         return result
 
     @rest_utils.ajax()
     def get(self, request, stack_id):
+        from openstack_dashboard.api import heat
+
         result = heat.stack_get(request, stack_id)
         return result.stack_status
 
@@ -134,6 +155,8 @@ class HeatStacks(generic.View):
 
     @rest_utils.ajax()
     def post(self, request):
+        from openstack_dashboard.api import heat
+
         result = heat.stack_create(request, **request.DATA)
         return result
 
@@ -145,6 +168,8 @@ class HeatTemplateValidate(generic.View):
 
     @rest_utils.ajax()
     def post(self, request):
+        from openstack_dashboard.api import heat
+
         result = heat.template_validate(request, template=request.DATA['body'])
         return result
 
@@ -185,7 +210,7 @@ class NetworkTemplateAssignments(generic.View):
     @rest_utils.ajax()
     def get(self, request):
         try:
-            topology = get_stack_topology(request)
+            topology = stack_topology.get_stack_topology(request)
             if not topology.get('assign'):
                 return []
             tabledata = {
@@ -251,6 +276,84 @@ class NetworkTemplates(generic.View):
             **{'tenant_id': request.user.project_id})
         return {'items': [n.to_dict() for n in result]}
 
+##################################################################
+# TENANT POLICIES
+##################################################################
+
+
+@urls.register
+class TenantPolicyMatch(generic.View):
+    """API for matching flows against BSN Neutron Tenant Policies"""
+    url_regex = r'neutron/tenantpolicies/match/$'
+
+    @rest_utils.ajax(data_required=True)
+    def post(self, request):
+        """Return the first matching tenant policy for each flow.
+
+        The body is {'flows': [{'source': ..., 'destination': ...,
+        'protocol': ..., 'source_port': ..., 'destination_port': ...}]}.
+        Malformed flows are answered with 400.
+        """
+        flows = request.DATA.get('flows')
+        if not isinstance(flows, list):
+            raise rest_utils.AjaxError(400, "'flows' must be a list")
+        try:
+            flows = [tenantpolicy.validate_flow(flow) for flow in flows]
+        except ValueError as e:
+            raise rest_utils.AjaxError(400, 'Invalid flow: %s' % e)
+        result = bsnneutron.tenantpolicy_match(request, flows)
+        return {'items': [p.to_dict() if p is not None else None
+                          for p in result]}
+
+
+@urls.register
+class TenantPolicyChanges(generic.View):
+    """API for applying BSN Neutron Tenant Policy change sets"""
+    url_regex = r'neutron/tenantpolicies/changes/$'
+
+    @rest_utils.ajax(data_required=True)
+    def post(self, request):
+        """Apply adds, deletes, priority moves and updates together.
+
+        The body is {'adds': [policy, ...], 'deletes': [id, ...],
+        'moves': {id: priority, ...}, 'updates': {id: {field: value}}};
+        all keys are optional. Either every change is applied or the ones
+        already made are rolled back.
+        """
+        result = tenantpolicy_changeset.apply_changes(
+            request,
+            adds=request.DATA.get('adds', []),
+            deletes=request.DATA.get('deletes', []),
+            moves=request.DATA.get('moves', {}),
+            updates=request.DATA.get('updates', {}))
+        return {'items': [p.to_dict() for p in result]}
+
+
+@urls.register
+class TenantPolicyCompaction(generic.View):
+    """API for previewing the compaction of BSN Neutron Tenant Policies"""
+    url_regex = r'neutron/tenantpolicies/compaction/$'
+
+    @rest_utils.ajax()
+    def get(self, request):
+        """Return the compacted policy set and the changes leading to it.
+
+        The 'deletes' and 'updates' of the result can be posted as is to
+        the change set API to apply the compaction.
+        """
+        policies = bsnneutron.tenantpolicy_list(
+            request, **{'tenant_id': request.user.project_id})
+        compaction = tenantpolicy.compact(policies)
+        return {'items': compaction.policies,
+                'dropped': [{'kind': f.kind, 'id': f.policy['id'],
+                             'other': f.other['id']}
+                            for f in compaction.dropped],
+                'merges': [{'id': m.policy['id'], 'other': m.other['id'],
+                            'field': m.field, 'value': m.value}
+                           for m in compaction.merges],
+                'deletes': compaction.deletes,
+                'updates': compaction.updates}
+
 ##################################################################
 # ROUTER RULES
 ##################################################################
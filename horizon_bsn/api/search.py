@@ -0,0 +1,290 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Field-scoped search over lists of BSN objects.
+
+A query is a list of whitespace separated terms. A term is either
+``field:value``, matched against that field only, or free text matched
+against every text field. All terms must match.
+
+Text fields are tokenized once when the index is built and kept in a
+sorted token list, so a term matches by token prefix with a binary search
+(``web`` finds ``prod-web-01``). Exact fields map each value to the
+objects holding it. Address fields are kept in a CIDR prefix trie, so
+``src:10.0.0.0/8`` finds every object whose address lies inside 10/8.
+
+IndexCache keeps the indexes of a worker process between requests.
+"""
+
+from __future__ import absolute_import
+
+import bisect
+import re
+import shlex
+import threading
+import time
+
+import netaddr
+import six
+
+from horizon_bsn.api import tenantpolicy
+
+_TOKEN = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def tokenize(value):
+    """Return the lowercase word tokens of a value, and the value itself."""
+    if value is None:
+        return set()
+    if isinstance(value, (list, tuple)):
+        value = ' '.join(six.text_type(v) for v in value)
+    value = six.text_type(value).lower()
+    tokens = set(_TOKEN.findall(value))
+    tokens.add(value)
+    return tokens
+
+
+def parse_query(query, fields):
+    """Split a query string into (field, value) terms.
+
+    :param query: query string, values may be quoted
+    :param fields: names accepted before a colon; unknown names are
+        treated as part of free text (an IPv6 address contains colons)
+    :returns: list of (field or None, value) pairs
+    """
+    try:
+        words = shlex.split(query or '')
+    except (UnicodeError, ValueError):
+        words = (query or '').split()
+    terms = []
+    for word in words:
+        field, sep, value = word.partition(':')
+        field = field.lower()
+        if sep and field in fields and value:
+            terms.append((field, value))
+        elif word:
+            terms.append((None, word))
+    return terms
+
+
+def _get(obj, attribute):
+    if isinstance(obj, dict):
+        return obj.get(attribute)
+    return getattr(obj, attribute, None)
+
+
+def _same_id(obj, other):
+    return _get(obj, 'id') == _get(other, 'id')
+
+
+def _cidr_key(value):
+    try:
+        return tenantpolicy.cidr_key(value)
+    except (netaddr.AddrFormatError, TypeError, ValueError):
+        return None
+
+
+class SearchIndex(object):
+    """Text, exact and address indexes over a list of objects.
+
+    :param objects: objects or dicts to index
+    :param text: dict of query field name to attribute, prefix matched
+    :param exact: dict of query field name to attribute, matched exactly
+    :param address: dict of query field name to attribute, matched by CIDR
+        containment
+    :param aliases: dict of query field name to a tuple of field names it
+        stands for, e.g. {'segment': ('src_segment', 'dst_segment')}
+    """
+
+    def __init__(self, objects, text=None, exact=None, address=None,
+                 aliases=None):
+        self.objects = list(objects)
+        self._text = {}
+        self._exact = {}
+        self._address = {}
+        self.aliases = dict(aliases or {})
+        for field, attribute in (text or {}).items():
+            tokens = []
+            for position, obj in enumerate(self.objects):
+                tokens.extend((token, position)
+                              for token in tokenize(_get(obj, attribute)))
+            tokens.sort()
+            self._text[field] = tokens
+        for field, attribute in (exact or {}).items():
+            values = {}
+            for position, obj in enumerate(self.objects):
+                value = _get(obj, attribute)
+                values.setdefault(six.text_type(value).lower(),
+                                  set()).add(position)
+            self._exact[field] = values
+        for field, attribute in (address or {}).items():
+            trie = tenantpolicy.PrefixTrie()
+            for position, obj in enumerate(self.objects):
+                key = _cidr_key(_get(obj, attribute))
+                if key is not None:
+                    trie.setdefault(key, set).add(position)
+            self._address[field] = trie
+
+    @property
+    def fields(self):
+        return set(self._text).union(self._exact, self._address,
+                                     self.aliases)
+
+    def __len__(self):
+        return len(self.objects)
+
+    def _prefix(self, field, value):
+        tokens = self._text[field]
+        value = six.text_type(value).lower()
+        found = set()
+        start = bisect.bisect_left(tokens, (value,))
+        for token, position in tokens[start:]:
+            if not token.startswith(value):
+                break
+            found.add(position)
+        return found
+
+    def _within(self, field, value):
+        key = _cidr_key(value)
+        if key is None:
+            return set()
+        trie = self._address[field]
+        found = set(trie.get(key, ()))
+        for positions in trie.descendants(key):
+            found.update(positions)
+        return found
+
+    def _match(self, field, value):
+        if field in self.aliases:
+            found = set()
+            for name in self.aliases[field]:
+                found |= self._match(name, value)
+            return found
+        if field in self._text:
+            return self._prefix(field, value)
+        if field in self._exact:
+            return set(self._exact[field].get(
+                six.text_type(value).lower(), ()))
+        if field in self._address:
+            return self._within(field, value)
+        return set()
+
+    def positions(self, terms):
+        """Return the sorted positions of the objects matching every term.
+
+        :param terms: (field, value) pairs as returned by parse_query; a
+            field of None matches any text, exact or address field
+        """
+        result = None
+        for field, value in terms:
+            if field is None:
+                found = set()
+                for name in self._text:
+                    found |= self._prefix(name, value)
+                for name in self._exact:
+                    found |= self._match(name, value)
+                if _cidr_key(value):
+                    for name in self._address:
+                        found |= self._within(name, value)
+            else:
+                found = self._match(field, value)
+            result = found if result is None else result & found
+            if not result:
+                return []
+        if result is None:
+            return list(range(len(self.objects)))
+        return sorted(result)
+
+    def search(self, terms):
+        """Return the objects matching every term, in their original order."""
+        return [self.objects[position] for position in self.positions(terms)]
+
+    def query(self, query):
+        """Parse and run a query string."""
+        return self.search(parse_query(query, self.fields))
+
+
+class IndexCache(object):
+    """Search indexes kept by a worker process, e.g. one per tenant.
+
+    An index is reused while it is younger than ttl seconds and holds as
+    many objects as the list searched, and until invalidate() drops it;
+    the write calls in horizon_bsn.api.neutron do so for their tenant.
+    Checking the index against the listed objects is kept O(matches): the
+    matched positions are mapped onto the listed objects and the index is
+    built again if an id there differs. Field changes made by other
+    workers are thus picked up within ttl seconds.
+
+    :param ttl: seconds an index is reused for
+    :param max_indexes: number of indexes kept, the cache is emptied
+        when it is full
+    :param fields: text, exact, address and aliases of the SearchIndex
+    """
+
+    def __init__(self, ttl, max_indexes=256, **fields):
+        self.ttl = ttl
+        self.max_indexes = max_indexes
+        self.fields = fields
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, match):
+        """Drop the indexes whose key match(key) is true for."""
+        with self._lock:
+            for key in [key for key in self._indexes if match(key)]:
+                del self._indexes[key]
+
+    def _cached(self, key, objects):
+        with self._lock:
+            entry = self._indexes.get(key)
+        if entry is None:
+            return None
+        built, index = entry
+        if time.time() - built > self.ttl or len(index) != len(objects):
+            return None
+        return index
+
+    def build(self, key, objects):
+        """Build the index of objects and keep it under key."""
+        index = SearchIndex(objects, **self.fields)
+        with self._lock:
+            if len(self._indexes) >= self.max_indexes:
+                self._indexes.clear()
+            self._indexes[key] = (time.time(), index)
+        return index
+
+    def get(self, key, objects):
+        """Return the index kept under key, building it if needed."""
+        index = self._cached(key, objects)
+        if index is None:
+            index = self.build(key, objects)
+        return index
+
+    def search(self, key, objects, terms):
+        """Return the objects matching every term, in their original order.
+
+        :param key: key the objects are indexed under
+        :param objects: the objects currently listed for the key
+        :param terms: (field, value) pairs as returned by parse_query
+        """
+        objects = list(objects)
+        index = self._cached(key, objects)
+        if index is not None:
+            positions = index.positions(terms)
+            # the index may hold objects of an earlier request, so its
+            # positions are mapped onto the objects passed in
+            if all(_same_id(objects[position], index.objects[position])
+                   for position in positions):
+                return [objects[position] for position in positions]
+        index = self.build(key, objects)
+        return [objects[position] for position in index.positions(terms)]
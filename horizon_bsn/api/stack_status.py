@@ -0,0 +1,117 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cached row status for network template stacks.
+
+A network template row joins a template assignment, the template and the
+heat stack it created. Only the stack status changes while the stack is
+being built, so the assignment/template join is cached per stack and each
+poll costs a single stack_get. The stack resources are listed again only
+when the stack status changes, or when the cached list gets too old.
+
+Entries live in the Django cache, so they are shared by every thread and,
+with a shared cache backend, every worker process.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import time
+
+from django.core.cache import cache
+from openstack_dashboard.api import heat
+
+from horizon_bsn.api import neutron
+
+LOG = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'horizon_bsn:stack_row'
+# how long a template/assignment join is kept without being polled
+CACHE_TIMEOUT = 600
+# resources of a stack whose status did not change are listed again after
+RESOURCES_MAX_AGE = 60
+
+
+class AssignmentNotFound(Exception):
+    """Raised when no network template assignment exists for a stack."""
+
+
+def _cache_key(request, stack_id):
+    return '%s:%s:%s' % (CACHE_PREFIX, request.user.tenant_id, stack_id)
+
+
+def _join(request, stack_id):
+    assignments = neutron.networktemplateassignment_list(
+        request, **{'stack_id': stack_id})
+    if not assignments:
+        raise AssignmentNotFound('Network template association not found.')
+    assignment = assignments[0]
+    template = neutron.networktemplate_get(request, assignment.template_id)
+    return {'assignment_id': assignment.id,
+            'template_id': assignment.template_id,
+            'template_name': template.name}
+
+
+def _resources(resources):
+    return [(r.resource_name, r.resource_type) for r in resources]
+
+
+def remember(request, stack, assignment, template, resources):
+    """Seed the cache with data fetched elsewhere, e.g. on page load.
+
+    :param stack: heat stack
+    :param assignment: network template assignment of the stack
+    :param template: network template of the assignment
+    :param resources: resources of the stack
+    """
+    entry = {'assignment_id': assignment.id,
+             'template_id': template.id,
+             'template_name': template.name,
+             'stack_status': stack.stack_status,
+             'resources': _resources(resources),
+             'resources_time': time.time()}
+    cache.set(_cache_key(request, stack.id), entry, CACHE_TIMEOUT)
+
+
+def forget(request, stack_id):
+    cache.delete(_cache_key(request, stack_id))
+
+
+def get_row(request, stack_id):
+    """Return the current stack and the cached join for a stack row.
+
+    :param request: request context
+    :param stack_id: id of the heat stack
+    :returns: (stack, entry) where entry holds assignment_id, template_id,
+        template_name and resources as (name, type) pairs
+    :raises: AssignmentNotFound, or whatever heat raises for the stack
+    """
+    key = _cache_key(request, stack_id)
+    entry = cache.get(key)
+    if entry is None:
+        LOG.debug("stack row cache miss for stack %s", stack_id)
+        entry = _join(request, stack_id)
+    stack = heat.stack_get(request, stack_id)
+    if stack.stack_status == 'DELETE_COMPLETE':
+        # the row goes away, there is nothing left worth caching
+        cache.delete(key)
+        return stack, entry
+    age = time.time() - entry.get('resources_time', 0)
+    changed = entry.get('stack_status') != stack.stack_status
+    if changed or age > RESOURCES_MAX_AGE:
+        entry['resources'] = _resources(
+            heat.resources_list(request, stack.stack_name))
+        entry['resources_time'] = time.time()
+        entry['stack_status'] = stack.stack_status
+    cache.set(key, entry, CACHE_TIMEOUT)
+    return stack, entry
@@ -0,0 +1,88 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Topology of the heat stack created from a tenant's network template.
+
+Shared by the Connections panel and the REST API, so loading the REST
+API does not load the tables, forms and tabs of the panel. heat is
+imported on first use.
+"""
+
+from __future__ import absolute_import
+
+import json
+
+from horizon_bsn.api import neutron
+
+
+def get_stack_topology(request):
+    """Return the network template of the tenant and its stack topology.
+
+    :param request: request context
+    :returns: dict of the template, assign(ment), stack, stack_resources,
+        and the network_entities and network_connections of the stack as
+        JSON; only the last two when the tenant has no template applied
+    """
+    try:
+        assign = neutron.networktemplateassignment_get(
+            request, request.user.tenant_id)
+        networktemplate = neutron.networktemplate_get(
+            request, assign.template_id)
+    except Exception:
+        return {"network_entities": "{}",
+                "network_connections": "{}"}
+
+    from openstack_dashboard.api import heat
+
+    hc = heat.heatclient(request)
+    # we only want the one that matches the network template
+    stacks = [s for s in hc.stacks.list(tenant_id=request.user.tenant_id)
+              if s.id == assign.stack_id]
+    if not stacks:
+        # leftover association, delete the assignment
+        neutron.networktemplateassignment_delete(request,
+                                                 request.user.tenant_id)
+        return {"network_entities": "",
+                "network_connections": ""}
+    resources = hc.resources.list(assign.stack_id)
+    entities = {}
+    connections = []
+    for res in resources:
+        if res.resource_type in ('OS::Neutron::Router', 'OS::Neutron::Subnet'):
+            entities[res.physical_resource_id] = {
+                'properties': {'name': res.physical_resource_id}
+            }
+        if res.resource_type == 'OS::Neutron::RouterInterface':
+            connections.append({
+                'source': res.physical_resource_id.split(':subnet_id=')[0],
+                'destination':
+                    res.physical_resource_id.split('subnet_id=')[-1],
+                'expected_connection': 'forward'
+            })
+    resp = {'template': networktemplate,
+            'assign': assign,
+            'network_entities': json.dumps(entities),
+            'network_connections': json.dumps(connections),
+            'stack_resources': resources,
+            'stack': stacks[0]}
+    return resp
+
+
+def is_heat_available(request):
+    from openstack_dashboard.api import heat
+
+    try:
+        heat.heatclient(request)
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,618 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Offline analysis of BSN tenant policies.
+
+The fabric evaluates tenant policies in priority order, lower value first,
+and the first policy whose source, destination, ports and protocol all
+match a flow decides what happens to it. Source and destination are CIDRs
+(or the 'any' / 'external' keywords), so every address match can be
+expressed as a bit-string prefix. Two CIDRs overlap exactly when one of
+them is a prefix of the other, which lets a two level prefix trie (source,
+then destination) answer "which policies cover / overlap this one" without
+comparing every pair of policies.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import hashlib
+import json
+
+import netaddr
+import six
+
+ANY = 'any'
+EXTERNAL = 'external'
+PORT_ANY = (0, 65535)
+PROTOCOLS = ('tcp', 'udp')
+# keys of the flows matched by PolicyMatcher
+FLOW_FIELDS = ('source', 'destination', 'protocol', 'source_port',
+               'destination_port')
+
+SHADOWED = 'shadowed'
+REDUNDANT = 'redundant'
+CONFLICT = 'conflict'
+
+# prefix markers used in the keys built by cidr_key()
+_IPV4 = '4'
+_IPV6 = '6'
+_EXTERNAL = 'x'
+
+
+def cidr_key(value):
+    """Return the prefix trie key for a policy address.
+
+    'any' maps to the empty key, which is a prefix of every other key.
+    'external' gets a key of its own so it is only covered by 'any'.
+    A bare IP address is treated as a host route.
+    """
+    if value is None:
+        return ''
+    value = str(value).strip()
+    if value in ('', ANY):
+        return ''
+    if value == EXTERNAL:
+        return _EXTERNAL
+    network = netaddr.IPNetwork(value)
+    if network.version == 4:
+        marker, width = _IPV4, 32
+    else:
+        marker, width = _IPV6, 128
+    bits = format(int(network.network), '0%db' % width)
+    return marker + bits[:network.prefixlen]
+
+
+def port_range(value):
+    """Return the inclusive port interval matched by a policy port.
+
+    Port 0 (the form default) and empty values match every port.
+    """
+    if value in (None, ''):
+        return PORT_ANY
+    port = int(value)
+    if port == 0:
+        return PORT_ANY
+    return (port, port)
+
+
+def _protocol(value):
+    if not value:
+        return None
+    return str(value).lower()
+
+
+def _nexthops(value):
+    if not value:
+        return ()
+    if isinstance(value, six.string_types):
+        value = value.split(',')
+    return tuple(sorted(str(hop).strip() for hop in value if hop))
+
+
+Rule = collections.namedtuple('Rule', [
+    'policy', 'priority', 'source', 'source_port', 'destination',
+    'destination_port', 'protocol', 'action', 'nexthops'])
+
+
+def normalize(policy):
+    """Build a Rule from a tenant policy as returned by tenantpolicy_list.
+
+    The original policy object is kept on the rule so results can be
+    reported against it.
+    """
+    action = str(policy['action']).lower()
+    nexthops = _nexthops(policy.get('nexthops'))
+    if action == 'deny':
+        # nexthops are ignored by the fabric for deny policies
+        nexthops = ()
+    return Rule(policy=policy,
+                priority=int(policy['priority']),
+                source=cidr_key(policy.get('source')),
+                source_port=port_range(policy.get('source_port')),
+                destination=cidr_key(policy.get('destination')),
+                destination_port=port_range(policy.get('destination_port')),
+                protocol=_protocol(policy.get('protocol')),
+                action=action,
+                nexthops=nexthops)
+
+
+def policies_fingerprint(policies):
+    """Digest of the fields of a policy set, telling when it changed."""
+    state = [[p['id'], int(p['priority']), p.get('source'),
+              p.get('source_port'), p.get('destination'),
+              p.get('destination_port'), p.get('protocol'), p.get('action'),
+              p.get('nexthops')] for p in policies]
+    state.sort()
+    return hashlib.sha1(json.dumps(state).encode('utf-8')).hexdigest()
+
+
+def _range_covers(outer, inner):
+    return outer[0] <= inner[0] and inner[1] <= outer[1]
+
+
+def _range_overlaps(a, b):
+    return a[0] <= b[1] and b[0] <= a[1]
+
+
+def _prefixes_overlap(a, b):
+    return a.startswith(b) or b.startswith(a)
+
+
+def covers(outer, inner):
+    """True when every flow matched by inner is also matched by outer."""
+    if not inner.source.startswith(outer.source):
+        return False
+    if not inner.destination.startswith(outer.destination):
+        return False
+    if not _range_covers(outer.source_port, inner.source_port):
+        return False
+    if not _range_covers(outer.destination_port, inner.destination_port):
+        return False
+    return outer.protocol is None or outer.protocol == inner.protocol
+
+
+def overlaps(a, b):
+    """True when at least one flow is matched by both rules."""
+    if not _prefixes_overlap(a.source, b.source):
+        return False
+    if not _prefixes_overlap(a.destination, b.destination):
+        return False
+    if not _range_overlaps(a.source_port, b.source_port):
+        return False
+    if not _range_overlaps(a.destination_port, b.destination_port):
+        return False
+    return None in (a.protocol, b.protocol) or a.protocol == b.protocol
+
+
+def same_outcome(a, b):
+    return a.action == b.action and a.nexthops == b.nexthops
+
+
+class _Node(object):
+    __slots__ = ('children', 'value')
+
+    def __init__(self):
+        self.children = {}
+        self.value = None
+
+
+class PrefixTrie(object):
+    """Trie keyed by the strings produced by cidr_key().
+
+    Each node holds at most one value; callers store containers in it.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+
+    def setdefault(self, key, factory):
+        node = self._root
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _Node()
+            node = child
+        if node.value is None:
+            node.value = factory()
+        return node.value
+
+    def get(self, key, default=None):
+        """Return the value stored at exactly key."""
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return default
+        return default if node.value is None else node.value
+
+    def ancestors(self, key):
+        """Yield the values stored at key and at every prefix of key."""
+        node = self._root
+        if node.value is not None:
+            yield node.value
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return
+            if node.value is not None:
+                yield node.value
+
+    def descendants(self, key):
+        """Yield the values stored strictly below key."""
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return
+        stack = list(node.children.values())
+        while stack:
+            node = stack.pop()
+            if node.value is not None:
+                yield node.value
+            stack.extend(node.children.values())
+
+
+class PolicyIndex(object):
+    """Index of rules by source prefix, then destination prefix."""
+
+    def __init__(self, rules=()):
+        self._trie = PrefixTrie()
+        self._size = 0
+        for rule in rules:
+            self.add(rule)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, rule):
+        destinations = self._trie.setdefault(rule.source, PrefixTrie)
+        destinations.setdefault(rule.destination, list).append(rule)
+        self._size += 1
+
+    def buckets(self, source, destination):
+        """Yield the rule lists whose prefixes contain both keys."""
+        for destinations in self._trie.ancestors(source):
+            for rules in destinations.ancestors(destination):
+                yield rules
+
+    def covering(self, rule):
+        """Yield indexed rules that match every flow rule matches."""
+        for rules in self.buckets(rule.source, rule.destination):
+            for other in rules:
+                if covers(other, rule):
+                    yield other
+
+    def overlapping(self, rule):
+        """Yield indexed rules that share at least one flow with rule."""
+        sources = list(self._trie.ancestors(rule.source))
+        sources.extend(self._trie.descendants(rule.source))
+        for destinations in sources:
+            for rules in destinations.ancestors(rule.destination):
+                for other in rules:
+                    if overlaps(other, rule):
+                        yield other
+            for rules in destinations.descendants(rule.destination):
+                for other in rules:
+                    if overlaps(other, rule):
+                        yield other
+
+
+Finding = collections.namedtuple('Finding', ['kind', 'policy', 'other'])
+
+
+def _priority(rule):
+    return rule.priority
+
+
+def _check(index, rule):
+    """Compare rule against an index of higher priority rules."""
+    covering = sorted(index.covering(rule), key=_priority)
+    if covering:
+        winner = covering[0]
+        kind = REDUNDANT if same_outcome(winner, rule) else SHADOWED
+        return [Finding(kind, rule.policy, winner.policy)]
+    return [Finding(CONFLICT, rule.policy, other.policy)
+            for other in sorted(index.overlapping(rule), key=_priority)
+            if not same_outcome(other, rule)]
+
+
+def analyze(policies):
+    """Report shadowed, redundant and conflicting tenant policies.
+
+    A policy is shadowed when a single higher priority policy matches every
+    flow it matches but does something else with them, and redundant when
+    that policy does the same thing. A conflict is a partial overlap with a
+    higher priority policy that has a different outcome, so the result for
+    the overlapping flows depends on the priority order.
+
+    :param policies: tenant policies as returned by tenantpolicy_list
+    :returns: list of Finding tuples, ordered by policy priority
+    """
+    rules = sorted((normalize(p) for p in policies), key=_priority)
+    index = PolicyIndex()
+    findings = []
+    for rule in rules:
+        findings.extend(_check(index, rule))
+        index.add(rule)
+    return findings
+
+
+def check_policy(policies, policy):
+    """Analyze a single new policy against the existing tenant policies.
+
+    :param policies: existing tenant policies
+    :param policy: mapping with the fields of the policy about to be added
+    :returns: list of Finding tuples for the new policy
+    """
+    rule = normalize(policy)
+    index = PolicyIndex(r for r in (normalize(p) for p in policies)
+                        if r.priority < rule.priority)
+    return _check(index, rule)
+
+
+def validate_flow(flow):
+    """Check a flow passed to PolicyMatcher.match_many.
+
+    :param flow: mapping of FLOW_FIELDS; source and destination are IP
+        addresses or 'external', protocol and ports are optional
+    :returns: the flow with its protocol in lower case and its ports as
+        integers, None when not given
+    :raises: ValueError describing the first problem found
+    """
+    if not isinstance(flow, dict):
+        raise ValueError('a flow must be an object')
+    unknown = set(flow) - set(FLOW_FIELDS)
+    if unknown:
+        raise ValueError('unknown fields %s' % ', '.join(sorted(unknown)))
+    clean = {}
+    for field in ('source', 'destination'):
+        value = flow.get(field)
+        if not isinstance(value, six.string_types) or not value.strip():
+            raise ValueError('%s must be an IP address' % field)
+        value = value.strip()
+        if value != EXTERNAL:
+            try:
+                netaddr.IPAddress(value)
+            except (netaddr.AddrFormatError, ValueError):
+                raise ValueError('%s %r is not an IP address' %
+                                 (field, value))
+        clean[field] = value
+    protocol = _protocol(flow.get('protocol'))
+    if protocol is not None and protocol not in PROTOCOLS:
+        raise ValueError('protocol must be one of %s' % ', '.join(PROTOCOLS))
+    clean['protocol'] = protocol
+    for field in ('source_port', 'destination_port'):
+        value = flow.get(field)
+        if value in (None, ''):
+            clean[field] = None
+            continue
+        try:
+            port = int(value)
+        except (TypeError, ValueError):
+            port = -1
+        if isinstance(value, bool) or not 0 <= port <= PORT_ANY[1]:
+            raise ValueError('%s must be a port number from 0 to %d' %
+                             (field, PORT_ANY[1]))
+        clean[field] = port
+    return clean
+
+
+def _port_matches(rule_ports, port):
+    if rule_ports == PORT_ANY:
+        return True
+    return port is not None and rule_ports[0] <= port <= rule_ports[1]
+
+
+class PolicyMatcher(object):
+    """Compiled tenant policies answering "which policy matches this flow".
+
+    Policies are indexed once by source and destination prefix, with every
+    bucket kept in priority order, so a lookup only visits the buckets on
+    the path of the flow's addresses instead of every policy.
+    """
+
+    # upper bound on the number of memoized address keys
+    max_cached_addresses = 65536
+
+    def __init__(self, policies):
+        rules = sorted((normalize(p) for p in policies), key=_priority)
+        self._index = PolicyIndex(rules)
+        self._keys = {}
+
+    def __len__(self):
+        return len(self._index)
+
+    def _key(self, address):
+        key = self._keys.get(address)
+        if key is None:
+            if len(self._keys) >= self.max_cached_addresses:
+                self._keys.clear()
+            key = self._keys[address] = cidr_key(address)
+        return key
+
+    def match(self, source, destination, protocol=None, source_port=None,
+              destination_port=None):
+        """Return the first policy matching the flow, or None.
+
+        :param source: source IP address, or 'external'
+        :param destination: destination IP address, or 'external'
+        :param protocol: (optional) 'tcp' or 'udp'
+        :param source_port: (optional) source port of the flow
+        :param destination_port: (optional) destination port of the flow
+        """
+        source_key = self._key(source)
+        destination_key = self._key(destination)
+        protocol = _protocol(protocol)
+        source_port = int(source_port) if source_port else None
+        destination_port = \
+            int(destination_port) if destination_port else None
+        best = None
+        for rules in self._index.buckets(source_key, destination_key):
+            for rule in rules:
+                if best is not None and rule.priority >= best.priority:
+                    # buckets are sorted, nothing better in this one
+                    break
+                if rule.protocol not in (None, protocol):
+                    continue
+                if not _port_matches(rule.source_port, source_port):
+                    continue
+                if _port_matches(rule.destination_port, destination_port):
+                    best = rule
+                    break
+        return best.policy if best is not None else None
+
+    def match_many(self, flows):
+        """Match a batch of flows given as mappings of match() arguments."""
+        return [self.match(**flow) for flow in flows]
+
+
+def cidr_from_key(key):
+    """Return the policy address for a key built by cidr_key()."""
+    if key == '':
+        return ANY
+    if key == _EXTERNAL:
+        return EXTERNAL
+    marker, bits = key[0], key[1:]
+    version, width = (4, 32) if marker == _IPV4 else (6, 128)
+    address = netaddr.IPAddress(int(bits.ljust(width, '0'), 2), version)
+    return '%s/%d' % (address, len(bits))
+
+
+def _as_dict(policy):
+    to_dict = getattr(policy, 'to_dict', None)
+    return to_dict() if to_dict is not None else dict(policy)
+
+
+def _sibling(key):
+    """Return the other half of the parent prefix of key, or None."""
+    if len(key) < 2 or key[-1] not in '01':
+        return None
+    return key[:-1] + ('1' if key[-1] == '0' else '0')
+
+
+Merge = collections.namedtuple('Merge', ['policy', 'other', 'field', 'value'])
+
+Compaction = collections.namedtuple('Compaction', [
+    'policies', 'dropped', 'merges', 'updates', 'deletes'])
+
+# rule attributes that are widened when two sibling prefixes are merged
+_MERGE_FIELDS = ('source', 'destination')
+
+
+def _merge_candidates(rules, field):
+    """Yield (survivor, absorbed) pairs of rules on sibling prefixes.
+
+    The two rules must agree on everything but the merged field. The
+    survivor is the higher priority one, so no priority has to change.
+    """
+    groups = {}
+    for rule in rules:
+        key = rule._replace(policy=None, priority=None, **{field: None})
+        groups.setdefault(key, {}).setdefault(getattr(rule, field), rule)
+    for by_prefix in groups.values():
+        for prefix, rule in sorted(by_prefix.items()):
+            sibling = by_prefix.get(_sibling(prefix))
+            if sibling is None or prefix[-1] != '0':
+                continue
+            yield tuple(sorted((rule, sibling), key=_priority))
+
+
+def _merge_is_safe(index, merged, absorbed):
+    """True when no policy between the pair sees a flow change its fate.
+
+    Flows of the absorbed rule are now decided at the survivor's priority,
+    which only matters if a policy in between matches some of them and does
+    something else with them.
+    """
+    for other in index.overlapping(merged):
+        between = merged.priority < other.priority < absorbed.priority
+        if between and not same_outcome(other, merged):
+            return False
+    return True
+
+
+def _covered_below(index, rule):
+    """Return a lower priority rule that can take over all flows of rule.
+
+    That is the closest lower priority rule covering it with the same
+    outcome, provided no policy in between matches any of its flows
+    differently. Returns None when there is no such rule.
+    """
+    lower = (other for other in index.covering(rule)
+             if other.priority > rule.priority)
+    below = sorted((other for other in lower if same_outcome(other, rule)),
+                   key=_priority)
+    if not below or not _merge_is_safe(index, rule, below[0]):
+        return None
+    return below[0]
+
+
+def compact(policies):
+    """Compute an equivalent tenant policy set with fewer policies.
+
+    Policies that are shadowed or redundant are dropped, as are policies
+    whose flows would end up with the same outcome at a lower priority
+    policy covering them. Then policies
+    that only differ by sibling source or destination prefixes (e.g.
+    10.0.0.0/24 and 10.0.1.0/24) and have the same outcome are merged into
+    the parent prefix, as long as no policy between them in priority order
+    would now see a different flow. Both steps repeat until nothing
+    changes, so merged prefixes keep aggregating upwards.
+
+    :param policies: tenant policies as returned by tenantpolicy_list
+    :returns: Compaction with the resulting policies as dicts, the Finding
+        of every dropped policy, the Merge steps taken, and the field
+        updates and deletes that turn the current set into the compacted one
+    """
+    originals = dict((p['id'], p) for p in policies)
+    rules = dict((p['id'], normalize(p)) for p in policies)
+    dropped = []
+    merges = []
+    updates = {}
+    deletes = set()
+
+    def delete(policy_id):
+        del rules[policy_id]
+        updates.pop(policy_id, None)
+        deletes.add(policy_id)
+
+    changed = True
+    while changed:
+        changed = False
+        for finding in analyze(rule.policy for rule in rules.values()):
+            if finding.kind in (SHADOWED, REDUNDANT):
+                delete(finding.policy['id'])
+                dropped.append(finding._replace(
+                    policy=originals[finding.policy['id']],
+                    other=originals[finding.other['id']]))
+                changed = True
+        index = PolicyIndex(rules.values())
+        for rule in sorted(rules.values(), key=_priority):
+            other = _covered_below(index, rule)
+            if other is not None:
+                delete(rule.policy['id'])
+                dropped.append(Finding(REDUNDANT,
+                                       originals[rule.policy['id']],
+                                       originals[other.policy['id']]))
+                changed = True
+        for field in _MERGE_FIELDS:
+            index = PolicyIndex(rules.values())
+            merged_ids = set()
+            for survivor, absorbed in list(_merge_candidates(rules.values(),
+                                                             field)):
+                survivor_id = survivor.policy['id']
+                absorbed_id = absorbed.policy['id']
+                if survivor_id in merged_ids or absorbed_id in merged_ids:
+                    # already changed this round, retried on the next one
+                    continue
+                parent = getattr(survivor, field)[:-1]
+                merged = survivor._replace(**{field: parent})
+                if not _merge_is_safe(index, merged, absorbed):
+                    continue
+                value = cidr_from_key(parent)
+                policy = _as_dict(survivor.policy)
+                policy[field] = value
+                merged = rules[survivor_id] = merged._replace(policy=policy)
+                # the stale entries left in the index only make later
+                # checks in this round more conservative
+                index.add(merged)
+                delete(absorbed_id)
+                updates.setdefault(survivor_id, {})[field] = value
+                merges.append(Merge(originals[survivor_id],
+                                    originals[absorbed_id], field, value))
+                merged_ids.update((survivor_id, absorbed_id))
+                changed = True
+    compacted = sorted((_as_dict(rule.policy) for rule in rules.values()),
+                       key=lambda p: int(p['priority']))
+    return Compaction(compacted, dropped, merges, updates, sorted(deletes))
@@ -0,0 +1,334 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Multi-policy change sets for BSN tenant policies.
+
+A change set takes policy additions, deletions, priority moves and field
+updates together, turns them into the smallest list of tenantpolicy_create /
+update / delete calls against the current policy set and applies them in
+stages. Calls inside a stage never depend on each other and run in
+parallel; stages are ordered so that a priority is always free before a
+policy is moved or created there. If any call fails, the calls that
+already succeeded are undone in reverse order.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import logging
+import threading
+
+from horizon_bsn.api import callbudget
+from horizon_bsn.api import neutron
+from horizon_bsn.api import tenantpolicy
+
+LOG = logging.getLogger(__name__)
+
+MIN_PRIORITY = 1
+MAX_PRIORITY = 3000
+DEFAULT_WORKERS = 8
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+POLICY_FIELDS = ('priority', 'source', 'source_port', 'destination',
+                 'destination_port', 'protocol', 'action', 'nexthops')
+
+Operation = collections.namedtuple('Operation',
+                                   ['kind', 'policy_id', 'params'])
+
+
+class ChangeSetError(Exception):
+    """Raised when a change set is invalid or could not be applied."""
+
+    def __init__(self, message, cause=None, rolled_back=False):
+        super(ChangeSetError, self).__init__(message)
+        self.cause = cause
+        self.rolled_back = rolled_back
+
+
+def _fields(policy):
+    return dict((field, policy.get(field)) for field in POLICY_FIELDS
+                if policy.get(field) is not None)
+
+
+def _match_key(policy):
+    """Everything but the priority, normalized like the analyzer does."""
+    return tenantpolicy.normalize(policy)._replace(policy=None, priority=None)
+
+
+class ChangeSet(object):
+    """Plan of the calls needed to turn the current policies into a new set.
+
+    :param current: tenant policies as returned by tenantpolicy_list
+    :param adds: policies to create, as dicts of tenant policy fields
+    :param deletes: ids of policies to delete
+    :param moves: dict mapping policy id to its new priority
+    :param updates: dict mapping policy id to a dict of changed fields
+    :param tenant_id: (optional) tenant the policies belong to, created
+        policies go to the tenant of the request when it is not given
+    """
+
+    def __init__(self, current, adds=(), deletes=(), moves=None,
+                 updates=None, tenant_id=None):
+        self.current = dict((p['id'], p) for p in current)
+        self.tenant_id = tenant_id
+        # fields as they are on the backend while the set is applied
+        self._state = {}
+        self.stages = self._plan(list(adds), set(deletes), dict(moves or {}),
+                                 dict(updates or {}))
+
+    def __len__(self):
+        return sum(len(stage) for stage in self.stages)
+
+    @property
+    def operations(self):
+        return [op for stage in self.stages for op in stage]
+
+    def _plan(self, adds, deletes, moves, updates):
+        unknown = (deletes | set(moves) | set(updates)) - set(self.current)
+        if unknown:
+            raise ChangeSetError('Unknown tenant policies: %s' %
+                                 ', '.join(sorted(unknown)))
+        changed_and_deleted = deletes & (set(moves) | set(updates))
+        if changed_and_deleted:
+            raise ChangeSetError('Tenant policies both changed and deleted: '
+                                 '%s' % ', '.join(sorted(changed_and_deleted)))
+
+        # a priority in an update is a move, everything else is a field
+        # change that does not depend on any other call
+        field_updates = []
+        for policy_id, fields in sorted(updates.items()):
+            fields = dict(fields)
+            if 'priority' in fields:
+                moves[policy_id] = fields.pop('priority')
+            policy = self.current[policy_id]
+            fields = dict((field, fields[field]) for field in POLICY_FIELDS
+                          if field in fields)
+            fields = dict((field, value) for field, value in fields.items()
+                          if policy.get(field) != value)
+            if fields:
+                field_updates.append(Operation(UPDATE, policy_id, fields))
+
+        # final priority of every policy that is kept
+        kept = dict((policy_id, int(moves.get(policy_id,
+                                              policy['priority'])))
+                    for policy_id, policy in self.current.items()
+                    if policy_id not in deletes)
+
+        # an add identical to a deleted policy is cheaper as a move
+        deleted_by_key = collections.defaultdict(list)
+        for policy_id in sorted(deletes):
+            deleted_by_key[_match_key(self.current[policy_id])].append(
+                policy_id)
+        creates = []
+        for add in adds:
+            try:
+                reusable = deleted_by_key.get(_match_key(add))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ChangeSetError('Invalid tenant policy %s: %s' %
+                                     (add, e))
+            if reusable:
+                policy_id = reusable.pop(0)
+                deletes.discard(policy_id)
+                kept[policy_id] = int(add['priority'])
+            else:
+                creates.append(_fields(add))
+
+        targets = list(kept.values()) + [int(c['priority']) for c in creates]
+        if len(targets) != len(set(targets)):
+            raise ChangeSetError('Tenant policy priorities must be unique')
+        for priority in targets:
+            if not MIN_PRIORITY <= priority <= MAX_PRIORITY:
+                raise ChangeSetError('Priority %d is out of range' % priority)
+
+        stages = []
+        if field_updates:
+            # widened policies go in before the policies they replace are
+            # deleted, so no flow falls through in between
+            stages.append(field_updates)
+        if deletes:
+            stages.append([Operation(DELETE, deleted_id, None)
+                           for deleted_id in sorted(deletes)])
+        stages.extend(self._plan_moves(kept, set(targets)))
+        if creates:
+            stages.append([Operation(CREATE, None, params)
+                           for params in creates])
+        return stages
+
+    def _plan_moves(self, kept, targets):
+        """Order priority moves so every move lands on a free priority.
+
+        Moves whose target is free run together in one stage. When every
+        remaining target is taken the moves form cycles (e.g. a swap) and
+        one policy is parked on a spare priority to break the cycle.
+        """
+        occupied = dict((int(self.current[policy_id]['priority']), policy_id)
+                        for policy_id in kept)
+        pending = dict((policy_id, (int(self.current[policy_id]['priority']),
+                                    priority))
+                       for policy_id, priority in kept.items()
+                       if int(self.current[policy_id]['priority']) != priority)
+        stages = []
+        while pending:
+            ready = sorted(policy_id
+                           for policy_id, (_old, new) in pending.items()
+                           if new not in occupied)
+            if not ready:
+                policy_id = min(pending)
+                spare = self._spare_priority(occupied, targets)
+                old, new = pending[policy_id]
+                pending[policy_id] = (spare, new)
+                del occupied[old]
+                occupied[spare] = policy_id
+                stages.append([Operation(UPDATE, policy_id,
+                                         {'priority': spare})])
+                continue
+            stage = []
+            for policy_id in ready:
+                old, new = pending.pop(policy_id)
+                del occupied[old]
+                occupied[new] = policy_id
+                stage.append(Operation(UPDATE, policy_id, {'priority': new}))
+            stages.append(stage)
+        return stages
+
+    @staticmethod
+    def _spare_priority(occupied, targets):
+        for priority in range(MAX_PRIORITY, MIN_PRIORITY - 1, -1):
+            if priority not in occupied and priority not in targets:
+                return priority
+        raise ChangeSetError('No spare priority left to reorder policies')
+
+    def _inverse(self, op, result):
+        if op.kind == CREATE:
+            return Operation(DELETE, result['id'], None)
+        if op.kind == DELETE:
+            return Operation(CREATE, None, _fields(self.current[op.policy_id]))
+        previous = self._state[op.policy_id]
+        return Operation(UPDATE, op.policy_id,
+                         dict((field, previous.get(field))
+                              for field in op.params))
+
+    def _call(self, request, op):
+        if op.kind == CREATE:
+            params = dict(op.params)
+            if self.tenant_id is not None:
+                params['tenant_id'] = self.tenant_id
+            return neutron.tenantpolicy_create(request, **params)
+        if op.kind == DELETE:
+            policy = self.current.get(op.policy_id, {})
+            return neutron.tenantpolicy_delete(
+                request, op.policy_id,
+                tenant_id=policy.get('tenant_id', self.tenant_id))
+        return neutron.tenantpolicy_update(request, op.policy_id,
+                                           **dict(op.params))
+
+    def _run_stage(self, request, stage, max_workers):
+        """Run the calls of one stage in parallel.
+
+        :returns: list of (operation, result, exception) tuples
+        """
+        outcomes = [None] * len(stage)
+        lock = threading.Lock()
+        queue = list(enumerate(stage))
+
+        def worker():
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    index, op = queue.pop()
+                try:
+                    outcomes[index] = (op, self._call(request, op), None)
+                except Exception as e:
+                    LOG.info("Tenant policy change %s failed: %s", op, e)
+                    outcomes[index] = (op, None, e)
+
+        if len(stage) == 1 or max_workers <= 1:
+            worker()
+            return outcomes
+        threads = [threading.Thread(target=callbudget.propagate(worker))
+                   for _i in range(min(max_workers, len(stage)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def apply(self, request, max_workers=DEFAULT_WORKERS):
+        """Apply the change set, rolling back on the first failed stage.
+
+        :returns: list of policies created by the change set
+        :raises: ChangeSetError
+        """
+        self._state = dict((policy_id, _fields(policy))
+                           for policy_id, policy in self.current.items())
+        done = []
+        created = []
+        for stage in self.stages:
+            outcomes = self._run_stage(request, stage, max_workers)
+            inverses = []
+            failure = None
+            for op, result, error in outcomes:
+                if error is not None:
+                    failure = failure or error
+                    continue
+                inverses.append(self._inverse(op, result))
+                if op.kind == UPDATE:
+                    self._state[op.policy_id].update(op.params)
+                elif op.kind == CREATE:
+                    created.append(result)
+            done.append(inverses)
+            if failure is not None:
+                rolled_back = self._rollback(request, done, max_workers)
+                raise ChangeSetError(
+                    'Failed to apply tenant policy changes: %s' % failure,
+                    cause=failure, rolled_back=rolled_back)
+        return created
+
+    def _rollback(self, request, done, max_workers):
+        LOG.info("Rolling back %d tenant policy changes",
+                 sum(len(inverses) for inverses in done))
+        complete = True
+        for inverses in reversed(done):
+            for op, _result, error in self._run_stage(request, inverses,
+                                                      max_workers):
+                if error is not None:
+                    LOG.error("Tenant policy rollback %s failed: %s",
+                              op, error)
+                    complete = False
+        return complete
+
+
+def apply_changes(request, adds=(), deletes=(), moves=None, updates=None,
+                  max_workers=DEFAULT_WORKERS, **params):
+    """Apply adds, deletes, priority moves and updates as one change set.
+
+    :param request: request context
+    :param adds: policies to create, as dicts of tenant policy fields
+    :param deletes: ids of policies to delete
+    :param moves: dict mapping policy id to its new priority
+    :param updates: dict mapping policy id to a dict of changed fields
+    :param tenant_id: (optional) tenant id of the policies
+    :returns: list of policies created by the change set
+    """
+    LOG.debug("apply_changes(): adds=%d deletes=%d moves=%d params=%s",
+              len(adds), len(deletes), len(moves or {}), params)
+    if 'tenant_id' not in params:
+        params['tenant_id'] = request.user.project_id
+    current = neutron.tenantpolicy_list(request, **params)
+    changeset = ChangeSet(current, adds=adds, deletes=deletes, moves=moves,
+                          updates=updates, tenant_id=params['tenant_id'])
+    return changeset.apply(request, max_workers=max_workers)
@@ -0,0 +1,86 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-tenant search index over tenant policies.
+
+The index of a tenant is built once and reused by the filter requests of
+that tenant, see search.IndexCache: the write calls in
+horizon_bsn.api.neutron drop it, and policies changed through another
+worker are picked up after INDEX_TTL seconds.
+
+Queries are field scoped, see horizon_bsn.api.search: ``action:deny``,
+``dst:10.0.0.0/8`` (destinations inside 10/8), ``src:external``,
+``proto:tcp``, ``port:443``, ``nexthop:10.1``, ``priority:100``.
+Free text matches any field.
+"""
+
+from __future__ import absolute_import
+
+import logging
+
+from horizon_bsn.api import search
+
+LOG = logging.getLogger(__name__)
+
+TEXT_FIELDS = {'nexthop': 'nexthops',
+               'source_cidr': 'source',
+               'destination_cidr': 'destination'}
+EXACT_FIELDS = {'action': 'action',
+                'proto': 'protocol',
+                'priority': 'priority',
+                'sport': 'source_port',
+                'dport': 'destination_port'}
+ADDRESS_FIELDS = {'src': 'source',
+                  'dst': 'destination'}
+ALIASES = {'source': ('src',),
+           'destination': ('dst',),
+           'ip': ('src', 'dst'),
+           'protocol': ('proto',),
+           'port': ('sport', 'dport'),
+           'nexthops': ('nexthop',)}
+FIELDS = set(TEXT_FIELDS).union(EXACT_FIELDS, ADDRESS_FIELDS, ALIASES)
+
+# number of tenants whose index is kept by a worker process
+MAX_INDEXES = 256
+# seconds an index is reused for without a write through this process
+INDEX_TTL = 30
+
+_indexes = search.IndexCache(INDEX_TTL, MAX_INDEXES, text=TEXT_FIELDS,
+                             exact=EXACT_FIELDS, address=ADDRESS_FIELDS,
+                             aliases=ALIASES)
+
+
+def invalidate(tenant_id):
+    """Drop the index of a tenant kept by this process."""
+    _indexes.invalidate(lambda key: key == tenant_id)
+
+
+def get_index(tenant_id, policies):
+    """Return the search index of a tenant's policies, building it if needed.
+
+    :param tenant_id: tenant the policies belong to
+    :param policies: the tenant's current policies, in display order
+    """
+    return _indexes.get(tenant_id, list(policies))
+
+
+def filter_policies(tenant_id, policies, query):
+    """Return the policies matching a query, in their original order.
+
+    :param tenant_id: tenant the policies belong to
+    :param policies: the tenant's current policies
+    :param query: query string
+    """
+    terms = search.parse_query(query, FIELDS)
+    LOG.debug("filtering the policies of tenant %s by %s", tenant_id, terms)
+    return _indexes.search(tenant_id, policies, terms)
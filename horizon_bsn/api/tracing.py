@@ -0,0 +1,181 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tracing of backend calls, tied to the Horizon request making them.
+
+Every traced call records its method, path, status, size, time to first
+byte and total latency. The slowest calls are kept in memory by a
+SlowLog, and a sample of all calls is written to the
+``horizon_bsn.api.tracing`` logger at INFO, so turning that logger on
+shows whether time is spent in the controller or in the dashboard.
+
+Calls are tagged with the correlation id of the Horizon request being
+served: the OpenStack request id when the request carries one, a new id
+otherwise. CorrelationMiddleware sets it for every request; add it to
+MIDDLEWARE_CLASSES in the Horizon settings::
+
+    MIDDLEWARE_CLASSES += (
+        'horizon_bsn.api.tracing.CorrelationMiddleware',)
+
+Code outside a request, e.g. a script, may use ``with correlate(...)``.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import contextlib
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+import uuid
+
+LOG = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = 'HTTP_X_OPENSTACK_REQUEST_ID'
+
+Trace = collections.namedtuple('Trace', ['correlation_id', 'method', 'path',
+                                         'status', 'bytes', 'ttfb',
+                                         'latency', 'started'])
+
+_local = threading.local()
+
+
+def correlation_id():
+    """Return the correlation id of the current thread, or None."""
+    return getattr(_local, 'correlation_id', None)
+
+
+def request_correlation_id(request):
+    """Return the correlation id of a Horizon request, creating it once."""
+    cid = getattr(request, '_bsn_correlation_id', None)
+    if cid is None:
+        cid = request.META.get(REQUEST_ID_HEADER)
+        if not cid:
+            cid = 'req-%s' % uuid.uuid4()
+        request._bsn_correlation_id = cid
+    return cid
+
+
+@contextlib.contextmanager
+def correlate(request=None, cid=None):
+    """Tag the backend calls of the block with a correlation id.
+
+    :param request: Horizon request whose id is used
+    :param cid: explicit correlation id, used when request is None
+    """
+    previous = correlation_id()
+    if request is not None:
+        cid = request_correlation_id(request)
+    _local.correlation_id = cid or 'req-%s' % uuid.uuid4()
+    try:
+        yield _local.correlation_id
+    finally:
+        _local.correlation_id = previous
+
+
+class CorrelationMiddleware(object):
+    """Set the correlation id of the thread serving a request."""
+
+    def process_request(self, request):
+        _local.correlation_id = request_correlation_id(request)
+
+    def process_response(self, request, response):
+        _local.correlation_id = None
+        return response
+
+
+class SlowLog(object):
+    """Thread-safe record of the slowest traces.
+
+    :param size: number of traces kept
+    """
+
+    def __init__(self, size=50):
+        self.size = size
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        # the heap holds the fastest of the kept traces first, so it is
+        # the one replaced by a slower trace
+        item = (trace.latency, next(self._counter), trace)
+        with self._lock:
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif item > self._heap[0]:
+                heapq.heapreplace(self._heap, item)
+
+    def slowest(self):
+        """Return the kept traces, slowest first."""
+        with self._lock:
+            items = sorted(self._heap, reverse=True)
+        return [trace for _latency, _n, trace in items]
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+
+
+def first_byte(state):
+    """Note that the response of a call started arriving."""
+    if state is not None and state['ttfb'] is None:
+        state['ttfb'] = time.time() - state['started']
+
+
+def add_bytes(state, count):
+    if state is not None:
+        state['bytes'] += count
+
+
+class Tracer(object):
+    """Time backend calls.
+
+    :param slow_log: SlowLog of the slowest calls
+    :param sample_rate: fraction of calls written to the trace log
+    :param slow_threshold: seconds above which a call is always logged
+    """
+
+    def __init__(self, slow_log=None, sample_rate=0.01, slow_threshold=2.0):
+        self.slow_log = slow_log if slow_log is not None else SlowLog()
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+
+    def start(self, method, path):
+        """Return the state of a call starting now."""
+        return {'correlation_id': correlation_id(), 'method': method,
+                'path': path, 'started': time.time(), 'ttfb': None,
+                'bytes': 0}
+
+    def finish(self, state, status=None):
+        """Record a finished call; status is None for a failed call."""
+        latency = time.time() - state['started']
+        trace = Trace(state['correlation_id'], state['method'],
+                      state['path'], status, state['bytes'], state['ttfb'],
+                      latency, state['started'])
+        self.slow_log.add(trace)
+        if latency >= self.slow_threshold:
+            LOG.warning("Slow backend call %s", _format(trace))
+        elif random.random() < self.sample_rate:
+            LOG.info("Backend call %s", _format(trace))
+        return trace
+
+
+def _format(trace):
+    ttfb = '-' if trace.ttfb is None else '%.1fms' % (trace.ttfb * 1000)
+    return ('[%s] %s %s status=%s bytes=%d ttfb=%s total=%.1fms' %
+            (trace.correlation_id, trace.method, trace.path, trace.status,
+             trace.bytes, ttfb, trace.latency * 1000))
@@ -0,0 +1,172 @@
+/**
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use this file except in compliance with the License. You may obtain
+ * a copy of the License at
+ *
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+ * WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+ * License for the specific language governing permissions and limitations
+ * under the License.
+ */
+
+(function() {
+  'use strict';
+
+  angular
+    .module('bsn.bsndashboard.networktemplateassignment')
+    .factory('bsn.bsndashboard.networktemplateassignment.stack-poller.service', stackPollerService);
+
+  stackPollerService.$inject = [
+    '$document',
+    '$timeout',
+    'horizon.app.core.openstack-service-api.bsnneutron'
+  ];
+
+  /**
+   * @ngdoc factory
+   * @name bsn.bsndashboard.networktemplateassignment.stack-poller.service
+   *
+   * @Description
+   * Follows the status of heat stacks being created or deleted. Each stack
+   * is polled once however many tables watch it, and its watchers are only
+   * called when the status changes. The delay between two polls doubles, with
+   * jitter, while the status stays the same, and polling pauses while the
+   * browser tab is hidden. A stack is dropped once its status is final.
+   */
+  function stackPollerService($document, $timeout, bsnneutron) {
+    var MIN_DELAY = 2000;
+    var MAX_DELAY = 30000;
+    var MAX_ERRORS = 3;
+    var stacks = {};
+    var paused = [];
+
+    var service = {
+      watch: watch,
+      unwatch: unwatch
+    };
+
+    $document.on('visibilitychange', resume);
+
+    return service;
+
+    //////////////
+
+    /**
+     * @name watch
+     * @description Call onChange(status, previousStatus) whenever the status
+     * of the stack changes, until it is final.
+     *
+     * @returns A function that stops watching.
+     */
+    function watch(stackId, onChange) {
+      var stack = stacks[stackId];
+      if (!stack) {
+        stack = stacks[stackId] = {
+          id: stackId,
+          status: null,
+          delay: MIN_DELAY,
+          errors: 0,
+          timer: null,
+          watchers: [onChange]
+        };
+        poll(stack);
+      } else {
+        stack.watchers.push(onChange);
+      }
+      return function() {
+        unwatch(stackId, onChange);
+      };
+    }
+
+    function unwatch(stackId, onChange) {
+      var stack = stacks[stackId];
+      if (!stack) {
+        return;
+      }
+      stack.watchers = stack.watchers.filter(function(watcher) {
+        return watcher !== onChange;
+      });
+      if (stack.watchers.length === 0) {
+        drop(stack);
+      }
+    }
+
+    function drop(stack) {
+      $timeout.cancel(stack.timer);
+      delete stacks[stack.id];
+    }
+
+    function poll(stack) {
+      stack.timer = null;
+      if ($document[0].hidden) {
+        paused.push(stack);
+        return;
+      }
+      bsnneutron.check_status(stack.id).then(onStatus, onError);
+
+      function onStatus(response) {
+        var status = response.data;
+        var previous = stack.status;
+        if (stacks[stack.id] !== stack) {
+          // no longer watched
+          return;
+        }
+        stack.errors = 0;
+        if (status === previous) {
+          stack.delay = Math.min(stack.delay * 2, MAX_DELAY);
+        } else {
+          stack.status = status;
+          stack.delay = MIN_DELAY;
+          angular.forEach(stack.watchers.slice(), function(watcher) {
+            watcher(status, previous);
+          });
+        }
+        if (/_IN_PROGRESS$/.test(status)) {
+          schedule(stack);
+        } else {
+          drop(stack);
+        }
+      }
+
+      function onError() {
+        stack.errors += 1;
+        if (stack.errors >= MAX_ERRORS) {
+          drop(stack);
+        } else {
+          stack.delay = Math.min(stack.delay * 2, MAX_DELAY);
+          schedule(stack);
+        }
+      }
+    }
+
+    function schedule(stack) {
+      if (stacks[stack.id] !== stack) {
+        return;
+      }
+      // half the delay plus up to as much again at random, so tables opened
+      // together do not keep polling together
+      var delay = stack.delay / 2 + Math.random() * stack.delay / 2;
+      stack.timer = $timeout(function() {
+        poll(stack);
+      }, delay);
+    }
+
+    function resume() {
+      if ($document[0].hidden) {
+        return;
+      }
+      var stopped = paused;
+      paused = [];
+      angular.forEach(stopped, function(stack) {
+        if (stacks[stack.id] === stack) {
+          // the status may have changed at any time while hidden
+          stack.delay = MIN_DELAY;
+          poll(stack);
+        }
+      });
+    }
+  }
+})();
@@ -25,11 +25,10 @@
     'horizon.framework.widgets.magic-search.service',
     'horizon.framework.util.actions.action-result.service',
     'horizon.framework.conf.resource-type-registry.service',
-    'horizon.app.core.openstack-service-api.bsnneutron',
-    '$interval'
+    'bsn.bsndashboard.networktemplateassignment.stack-poller.service'
   ];
 
-  function controller($q, $scope, events, searchService, actionResultService, registry, bsnneutron, $interval) {
+  function controller($q, $scope, events, searchService, actionResultService, registry, stackPoller) {
     var ctrl = this;
 
     // 'Public' Controller members
@@ -55,6 +54,9 @@
     ctrl.resourceType.list().then(onLoad);
     ctrl.resourceType.initActions($scope);
     $scope.$on(events.SERVER_SEARCH_UPDATED, handleServerSearch);
+    $scope.$on('$destroy', function() {
+      stopWatching();
+    });
 
     // Local functions
 
@@ -78,10 +80,9 @@
     function actionResultHandler(returnValue) {
       return $q.when(returnValue, actionSuccessHandler);
     }
-  
-    var interval;
-    var stack_id;
-    
+
+    var stopWatching = angular.noop;
+
     function actionSuccessHandler(result) { // eslint-disable-line no-unused-vars
 
       // The action has completed (for whatever "complete" means to that
@@ -106,9 +107,8 @@
 
         // Handle deleted items
         if (deletedIds.length) {
-          stack_id = deletedIds[0];
           ctrl.itemsSrc = difference(ctrl.itemsSrc, deletedIds,'id');
-          interval = $interval(check_state, 2000, 0, true);
+          watchStack(deletedIds[0]);
         }
 
         // Handle updated and created items
@@ -117,13 +117,7 @@
           // this is simple and robust for the common use case.
           // TODO: If we want more detailed updates, we could do so here.
           // ctrl.resourceType.list().then(onLoad);
-          if (createdIds) {
-            stack_id = createdIds[0];
-          }
-          else {
-            stack_id = updatedIds[0];
-          }
-          interval = $interval(check_state, 2000, 0, true);
+          watchStack(createdIds.length ? createdIds[0] : updatedIds[0]);
         }
 
         // Handle failed items
@@ -139,22 +133,11 @@
       }
     }
 
-    function check_state() {
-      bsnneutron.check_status(stack_id).then(function(result) {
-        if (result.data == "CREATE_COMPLETE") {
-          ctrl.resourceType.list().then(onLoad);
-          $interval.cancel(interval);
-        }
-        else if (result.data == "DELETE_COMPLETE") {
-          ctrl.resourceType.list().then(onLoad);
-          $interval.cancel(interval);
-        }
-        else if (result.data == "DELETE_IN_PROGRESS" || result.data == "CREATE_IN_PROGRESS") {
-          ctrl.resourceType.list().then(onLoad);
-        }
-        else {
-          $interval.cancel(interval);
-        }
+    function watchStack(stackId) {
+      // the table reloads when the stack status changes, until it is final
+      stopWatching();
+      stopWatching = stackPoller.watch(stackId, function() {
+        ctrl.resourceType.list().then(onLoad);
       });
     }
 
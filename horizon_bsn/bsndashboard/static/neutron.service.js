@@ -29,14 +29,30 @@
    * @param {Object} apiService
    * @param {Object} toastService
    * @description Provides access to Neutron APIs.
+   *
+   * Lookups of the same data made at the same time share one request, and
+   * their responses are reused for a while, see CACHE_TTL. The create, update
+   * and delete calls drop the cached responses of the data they change.
    * @returns {Object} The service
    */
   function neutronAPI(apiService, toastService) {
+    // milliseconds a response is reused; 0 only shares requests in flight.
+    // The assignment list carries the status of its stack, which changes
+    // without any call made here.
+    var CACHE_TTL = {
+      networktemplate: 60000,
+      networktemplateassignment: 0,
+      reachabilitytest: 10000,
+      router: 30000
+    };
+    var cache = {};
+
     var service = {
       reachabilitytest_create: reachabilitytest_create,
       reachabilitytest_list: reachabilitytest_list,
       reachabilitytest_run: reachabilitytest_run,
       reachabilitytest_delete: reachabilitytest_delete,
+      reachabilitytest_status: reachabilitytest_status,
 
       networktemplate_create: networktemplate_create,
       networktemplate_list: networktemplate_list,
@@ -65,6 +81,55 @@
 
     /////////////
 
+    /**
+     * @name cached
+     * @description Return the pending or recent promise of a lookup, or make
+     * the request. Failed lookups are not kept.
+     *
+     * @returns The promise of the request.
+     */
+    function cached(resource, key, request) {
+      var entries = cache[resource] = cache[resource] || {};
+      var entry = entries[key];
+      if (entry && (entry.pending || entry.expires > Date.now())) {
+        return entry.promise;
+      }
+      entry = entries[key] = {pending: true, promise: request()};
+      entry.promise.then(function() {
+        entry.pending = false;
+        entry.expires = Date.now() + CACHE_TTL[resource];
+      }, function() {
+        if (entries[key] === entry) {
+          delete entries[key];
+        }
+      });
+      return entry.promise;
+    }
+
+    function invalidate(resources) {
+      angular.forEach(resources, function(resource) {
+        // lookups still in flight keep the entries they were made for
+        cache[resource] = {};
+      });
+    }
+
+    /**
+     * @name invalidating
+     * @description Drop the cached responses of resources when a change is
+     * made, and again once it is done, as lookups made in between may return
+     * data from before the change.
+     *
+     * @returns The promise of the change.
+     */
+    function invalidating(resources, request) {
+      invalidate(resources);
+      var promise = request();
+      promise.finally(function() {
+        invalidate(resources);
+      });
+      return promise;
+    }
+
     // Neutron Services
 
 
@@ -81,10 +146,12 @@
      * @returns {Object} The result of the creation call.
      */
     function reachabilitytest_create(test) {
-      return apiService.post('api/neutron/reachabilitytests/', test)
-        .error(function () {
-          toastService.add('error', gettext('Error creating reachability test'));
-        });
+      return invalidating(['reachabilitytest'], function() {
+        return apiService.post('api/neutron/reachabilitytests/', test)
+          .error(function () {
+            toastService.add('error', gettext('Error creating reachability test'));
+          });
+      });
     }
 
     /**
@@ -94,10 +161,12 @@
      * @returns {Object} An object with property "items." Each item is a test.
      */
     function reachabilitytest_list() {
-      return apiService.get('api/neutron/reachabilitytests/')
-        .error(function () {
-          toastService.add('error', gettext('Error getting reachability tests'));
-        });
+      return cached('reachabilitytest', 'list', function() {
+        return apiService.get('api/neutron/reachabilitytests/')
+          .error(function () {
+            toastService.add('error', gettext('Error getting reachability tests'));
+          });
+      });
     }
 
     /**
@@ -107,10 +176,12 @@
      * @returns {Object} The result of running the reachability test.
      */
     function reachabilitytest_run(id) {
-      return apiService.patch('api/neutron/reachabilitytests/' + id + '/')
-        .error(function () {
-          toastService.add('error', gettext('Error running reachability tests'));
-        });
+      return invalidating(['reachabilitytest'], function() {
+        return apiService.patch('api/neutron/reachabilitytests/' + id + '/')
+          .error(function () {
+            toastService.add('error', gettext('Error running reachability tests'));
+          });
+      });
     }
 
     /**
@@ -120,9 +191,27 @@
      * @returns {Object} An object with property "items." Each item is a test.
      */
     function reachabilitytest_delete(id) {
-      return apiService.delete('api/neutron/reachabilitytests/' + id + '/')
+      return invalidating(['reachabilitytest'], function() {
+        return apiService.delete('api/neutron/reachabilitytests/' + id + '/')
+          .error(function() {
+            toastService.add('error', gettext('Error deleting reachability test'));
+          });
+      });
+    }
+
+    /**
+     * @name reachabilitytest_status
+     * @param {Array} ids - The ids of the tests
+     * @description Get only id, test_result and test_time of several tests
+     * in one call.
+     *
+     * @returns {Object} An object with property "items." Each item is the
+     * status of a test.
+     */
+    function reachabilitytest_status(ids) {
+      return apiService.get('api/neutron/reachabilityteststatus/', {params: {id: ids}})
         .error(function() {
-          toastService.add('error', gettext('Error deleting reachability test'));
+          toastService.add('error', gettext('Error getting reachability test status'));
         });
     }
 
@@ -188,10 +277,12 @@
      * @returns The result of the creation call.
      */
     function networktemplate_create(template) {
-      return apiService.post('api/neutron/networktemplate/', template)
-        .error(function() {
-          toastService.add('error', gettext('Error creating network template'));
-        });
+      return invalidating(['networktemplate'], function() {
+        return apiService.post('api/neutron/networktemplate/', template)
+          .error(function() {
+            toastService.add('error', gettext('Error creating network template'));
+          });
+      });
     }
 
     /**
@@ -201,10 +292,12 @@
      * @returns {Object} An object with property "items." Each item is a template.
      */
     function networktemplate_list() {
-      return apiService.get('api/neutron/networktemplate/')
-        .error(function() {
-          toastService.add('error', gettext('Error getting network templates'));
-        });
+      return cached('networktemplate', 'list', function() {
+        return apiService.get('api/neutron/networktemplate/')
+          .error(function() {
+            toastService.add('error', gettext('Error getting network templates'));
+          });
+      });
     }
 
     /**
@@ -214,10 +307,12 @@
      * @returns The network template.
      */
     function networktemplate_get(id) {
-      return apiService.get('api/neutron/networktemplate/' + id + '/')
-        .error(function() {
-          toastService.add('error', gettext('Error getting network template'));
-        });
+      return cached('networktemplate', id, function() {
+        return apiService.get('api/neutron/networktemplate/' + id + '/')
+          .error(function() {
+            toastService.add('error', gettext('Error getting network template'));
+          });
+      });
     }
 
     /**
@@ -227,10 +322,12 @@
      * @returns The result of the patch call.
      */
     function networktemplate_update(id, template) {
-      return apiService.patch('api/neutron/networktemplate/' + id + '/', template)
-        .error(function() {
-          toastService.add('error', gettext('Error updating network template'));
-        });
+      return invalidating(['networktemplate'], function() {
+        return apiService.patch('api/neutron/networktemplate/' + id + '/', template)
+          .error(function() {
+            toastService.add('error', gettext('Error updating network template'));
+          });
+      });
     }
 
     /**
@@ -240,10 +337,12 @@
      * @returns The result of the deletion call.
      */
     function networktemplate_delete(id) {
-      return apiService.delete('api/neutron/networktemplate/' + id + '/')
-        .error(function() {
-          toastService.add('error', gettext('Error deleting network template'));
-        });
+      return invalidating(['networktemplate'], function() {
+        return apiService.delete('api/neutron/networktemplate/' + id + '/')
+          .error(function() {
+            toastService.add('error', gettext('Error deleting network template'));
+          });
+      });
     }
 
     /**
@@ -259,10 +358,12 @@
      * @returns The result of the deletion call.
      */
     function heatstack_delete(id) {
-      return apiService.delete('api/heat/stack/' + id + '/')
-        .error(function() {
-          toastService.add('error', gettext('Error deleting heat stack'));
-        });
+      return invalidating(['networktemplateassignment'], function() {
+        return apiService.delete('api/heat/stack/' + id + '/')
+          .error(function() {
+            toastService.add('error', gettext('Error deleting heat stack'));
+          });
+      });
     }
 
     /**
@@ -272,10 +373,12 @@
      * @returns The result of the creation call.
      */
     function heatstack_create(stack) {
-      return apiService.post('api/heat/stack/', stack)
-        .error(function() {
-          toastService.add('error', gettext('Error creating heat stack'));
-        });
+      return invalidating(['networktemplateassignment'], function() {
+        return apiService.post('api/heat/stack/', stack)
+          .error(function() {
+            toastService.add('error', gettext('Error creating heat stack'));
+          });
+      });
     }
 
     /**
@@ -312,10 +415,12 @@
      * @returns The result of the creation call.
      */
     function networktemplateassignment_create(assignment) {
-      return apiService.post('api/neutron/networktemplateassignment/', assignment)
-        .error(function() {
-          toastService.add('error', gettext('Error applying network template assignment'));
-        });
+      return invalidating(['networktemplateassignment'], function() {
+        return apiService.post('api/neutron/networktemplateassignment/', assignment)
+          .error(function() {
+            toastService.add('error', gettext('Error applying network template assignment'));
+          });
+      });
     }
 
     /**
@@ -327,10 +432,12 @@
      * @returns The result of the list call.
      */
     function networktemplateassignment_list() {
-      return apiService.get('api/neutron/networktemplateassignment/')
-        .error(function() {
-          toastService.add('error', gettext('Error getting network template assignment'));
-        });
+      return cached('networktemplateassignment', 'list', function() {
+        return apiService.get('api/neutron/networktemplateassignment/')
+          .error(function() {
+            toastService.add('error', gettext('Error getting network template assignment'));
+          });
+      });
     }
 
     /**
@@ -342,10 +449,12 @@
      * @returns The result of the update call.
      */
     function networktemplateassignment_update(assignment) {
-      return apiService.patch('api/neutron/networktemplateassignment/', assignment)
-        .error(function() {
-          toastService.add('error', gettext('Error patching network template assignment'));
-        });
+      return invalidating(['networktemplateassignment'], function() {
+        return apiService.patch('api/neutron/networktemplateassignment/', assignment)
+          .error(function() {
+            toastService.add('error', gettext('Error patching network template assignment'));
+          });
+      });
     }
 
     /**
@@ -355,14 +464,16 @@
      * @returns The result of the deletion call.
      */
     function networktemplateassignment_delete(id) {
-      return apiService.delete('api/neutron/networktemplateassignment/' + id + '/').then(
-        function success(response) {
-          return response;
-        },
-        function error() {
-          toastService.add('error', gettext('Error deleting network template assignment'));
-        }
-      );
+      return invalidating(['networktemplateassignment'], function() {
+        return apiService.delete('api/neutron/networktemplateassignment/' + id + '/').then(
+          function success(response) {
+            return response;
+          },
+          function error() {
+            toastService.add('error', gettext('Error deleting network template assignment'));
+          }
+        );
+      });
     }
 
     /**
@@ -378,10 +489,12 @@
      * @returns The result of the get call.
      */
     function router_get() {
-      return apiService.get('api/neutron/router/')
-        .error(function() {
-          toastService.add('error', gettext('Error getting router id'));
-        });
+      return cached('router', 'get', function() {
+        return apiService.get('api/neutron/router/')
+          .error(function() {
+            toastService.add('error', gettext('Error getting router id'));
+          });
+      });
     }
 
     /**
@@ -391,10 +504,12 @@
      * @returns The result of the deletion call.
      */
     function router_update(router) {
-      return apiService.patch('api/neutron/router/', router)
-        .error(function() {
-          toastService.add('error', gettext('Error updating router'));
-        });
+      return invalidating(['router'], function() {
+        return apiService.patch('api/neutron/router/', router)
+          .error(function() {
+            toastService.add('error', gettext('Error updating router'));
+          });
+      });
     }
 
   }
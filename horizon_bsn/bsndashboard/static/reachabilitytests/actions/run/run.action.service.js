@@ -23,7 +23,8 @@
     'bsn.bsndashboard.reachabilitytests.resourceType',
     'horizon.app.core.openstack-service-api.bsnneutron',
     'horizon.framework.util.actions.action-result.service',
-    'horizon.framework.widgets.toast.service'
+    'horizon.framework.widgets.toast.service',
+    'bsn.bsndashboard.reachabilitytests.status-poller.service'
   ];
 
   /**
@@ -34,14 +35,16 @@
    * @Description
    * Brings up the run tests confirmation modal dialog.
 
-   * On submit, run given tests.
+   * On submit, run given tests. The row then follows the run through the
+   * status poller instead of reloading the whole table.
    * On cancel, do nothing.
    */
   function runTestService(
     resourceType,
     bsnneutron,
     actionResultService,
-    toast
+    toast,
+    statusPoller
   ) {
     var service = {
       allowed: allowed,
@@ -59,6 +62,12 @@
     function perform(test) {
       var outcome = bsnneutron.reachabilitytest_run(test.id).then(onRunTest);
       return outcome;
+
+      function onRunTest(response) {
+        toast.add('success', interpolate(message.success, [response.data.name]));
+        statusPoller.watch(test);
+        return actionResultService.getActionResult().result;
+      }
     }
 
     function allowed() {
@@ -68,13 +77,5 @@
 
       return promise;
     }
-
-    function onRunTest(response) {
-      var test = response.data;
-      toast.add('success', interpolate(message.success, [test.name]));
-      return actionResultService.getActionResult()
-        .updated(resourceType, test.id)
-        .result;
-    }
   }
 })();
@@ -39,8 +39,8 @@
   ];
 
   /**
-   * Getting the table to update the test_time and test_result after running is difficult. Instead, these are put in
-   * the drawer as a workaround.
+   * test_time and test_result of a test that is run are updated in place by the status poller, so they are shown
+   * both in the table and in the drawer.
    */
   function run(registry, bsnneutron, basePath, reachabilitytestsResourceType) {
     registry.getResourceType(reachabilitytestsResourceType)
@@ -101,6 +101,14 @@
         id: 'expected_result',
         priority: 1,
         sortDefault: true,
+      })
+      .append({
+        id: 'test_time',
+        priority: 2
+      })
+      .append({
+        id: 'test_result',
+        priority: 1
       });
 
     function listFunction() {
@@ -0,0 +1,110 @@
+/**
+ * Licensed under the Apache License, Version 2.0 (the "License"); you may
+ * not use self file except in compliance with the License. You may obtain
+ * a copy of the License at
+ *
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+ * WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+ * License for the specific language governing permissions and limitations
+ * under the License.
+ */
+
+(function() {
+  'use strict';
+
+  angular
+    .module('bsn.bsndashboard.reachabilitytests')
+    .factory('bsn.bsndashboard.reachabilitytests.status-poller.service', statusPollerService);
+
+  statusPollerService.$inject = [
+    '$timeout',
+    'horizon.app.core.openstack-service-api.bsnneutron'
+  ];
+
+  /**
+   * @ngdoc factory
+   * @name bsn.bsndashboard.reachabilitytests.status-poller.service
+   *
+   * @Description
+   * Keeps the test_result and test_time of running tests up to date in place.
+   * Every running test shown in the table is watched through the same poll,
+   * which fetches the status of all of them in a single request and stops
+   * once none of them is pending anymore. Tests missing from the response were
+   * deleted and are dropped. Failed polls are retried after a growing delay,
+   * and polling stops after MAX_ERRORS failures in a row.
+   */
+  function statusPollerService($timeout, bsnneutron) {
+    var POLL_INTERVAL = 2000;
+    var MAX_DELAY = 30000;
+    var MAX_ERRORS = 3;
+    var watched = {};
+    var timer = null;
+    var errors = 0;
+
+    var service = {
+      watch: watch
+    };
+
+    return service;
+
+    //////////////
+
+    function watch(test) {
+      test.test_result = 'pending';
+      watched[test.id] = test;
+      if (!timer) {
+        errors = 0;
+        timer = $timeout(poll, POLL_INTERVAL);
+      }
+    }
+
+    function poll() {
+      var ids = Object.keys(watched);
+      bsnneutron.reachabilitytest_status(ids).then(function(response) {
+        onStatus(ids, response);
+      }, onError);
+    }
+
+    function onStatus(ids, response) {
+      var pending = {};
+      errors = 0;
+      angular.forEach(response.data.items, function(status) {
+        var test = watched[status.id];
+        if (!test) {
+          return;
+        }
+        test.test_result = status.test_result;
+        test.test_time = status.test_time;
+        if (status.test_result === 'pending') {
+          pending[status.id] = true;
+        }
+      });
+      angular.forEach(ids, function(id) {
+        // done, or deleted when missing from the response
+        if (!pending[id]) {
+          delete watched[id];
+        }
+      });
+      schedule(POLL_INTERVAL);
+    }
+
+    function onError() {
+      errors += 1;
+      if (errors >= MAX_ERRORS) {
+        watched = {};
+        errors = 0;
+      }
+      schedule(Math.min(POLL_INTERVAL * Math.pow(2, errors), MAX_DELAY));
+    }
+
+    function schedule(delay) {
+      timer = null;
+      if (Object.keys(watched).length > 0) {
+        timer = $timeout(poll, delay);
+      }
+    }
+  }
+})();
@@ -18,7 +18,7 @@ from django.utils.translation import ugettext_lazy as _
 from horizon import messages
 from horizon import tables
 from horizon_bsn.api import neutron
-from openstack_dashboard.api import heat
+from horizon_bsn.api import stack_status
 
 import logging
 
@@ -67,26 +67,16 @@ class StacksUpdateRow(tables.Row):
         return datum.stack_status != 'DELETE_COMPLETE'
 
     def get_data(self, request, stack_id):
-        assignment = None
+        entry = None
         try:
-            assignments = neutron.networktemplateassignment_list(
-                request, **{'stack_id': stack_id})
-            if not assignments:
-                raise Exception('Network template associationg not found.')
-            assignment = assignments[0]
-
-            template = neutron.networktemplate_get(request,
-                                                   assignment.template_id)
-
-            stack = heat.stack_get(request, stack_id)
-            resources = heat.resources_list(request, stack.stack_name)
+            stack, entry = stack_status.get_row(request, stack_id)
             if stack.stack_status == 'DELETE_COMPLETE':
                 # returning 404 to the ajax call removes the
                 # row from the table on the ui
                 raise Http404
             rowdata = {
-                'template_id': assignment.template_id,
-                'template_name': template.name,
+                'template_id': entry['template_id'],
+                'template_name': entry['template_name'],
                 'stack_id': stack_id,
                 'heat_stack_name': stack.stack_name,
                 'description': stack.description,
@@ -94,17 +84,16 @@ class StacksUpdateRow(tables.Row):
                 'stack_status': stack.stack_status,
                 'stack_status_reason': stack.stack_status_reason,
                 'resources': mark_safe('<br>'.join([
-                    ('%s (%s)' % (r.resource_name,
-                                  r.resource_type)).replace(' ', '&nbsp;')
-                    for r in resources]))
+                    ('%s (%s)' % (name, resource_type)).replace(' ', '&nbsp;')
+                    for name, resource_type in entry['resources']]))
             }
             return rowdata
         except Http404:
             try:
                 # remove corresponding network template
-                if assignment:
+                if entry:
                     neutron.networktemplateassignment_delete(
-                        request, assignment.id)
+                        request, entry['assignment_id'])
                 msg = _('Removed template association for stack_id %s') % \
                     stack_id
                 LOG.debug(msg)
@@ -11,15 +11,276 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import httplib
-import logging as log
+import collections
+import errno
+import hashlib
+import json
+import logging
+import select
+import socket
+import threading
+import time
+
+from six.moves import http_client
+from six.moves import queue
+
+from horizon_bsn.api import jsonstream
+from horizon_bsn.api import tracing
+
+LOG = logging.getLogger(__name__)
 
-session_map = {}
 HASH_HEADER = 'Floodlight-Verify-Path'
+LOGIN_PREFIX = '/api/v1/'
+LOGIN_URL = 'auth/login'
+# seconds a controller session is assumed to stay valid, and how long
+# before that it is renewed
+SESSION_LIFETIME = 3600
+SESSION_REFRESH_MARGIN = 60
+ROLE_URL = 'core/controller/role'
+# bytes read from the socket at a time by streamed requests
+CHUNK_SIZE = 64 * 1024
+# errnos telling that a request never reached the controller, so it is
+# safe to send it to another node even when it is not idempotent
+_UNREACHABLE_ERRNOS = (errno.ECONNREFUSED, errno.EHOSTUNREACH,
+                       errno.ENETUNREACH, errno.EHOSTDOWN)
+
+# errors raised when a kept-alive connection was closed by the controller
+_STALE_CONNECTION_ERRORS = (http_client.BadStatusLine,
+                            http_client.CannotSendRequest,
+                            http_client.ResponseNotReady,
+                            socket.error)
+# methods replayed when the connection fails after the request was sent
+_IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of keep-alive HTTPS connections, per host.
+
+    A connection is handed to one thread at a time and goes back to the
+    pool once its response has been read completely. Idle connections are
+    dropped after max_idle_time seconds, and checked before reuse: a
+    socket that became readable while idle was closed by the controller.
+
+    :param max_idle: idle connections kept per host
+    :param max_idle_time: seconds an idle connection is kept
+    :param timeout: socket timeout of new connections
+    :param connection_class: class used to open connections
+    """
+
+    def __init__(self, max_idle=4, max_idle_time=60, timeout=30,
+                 connection_class=http_client.HTTPSConnection, **kwargs):
+        self.max_idle = max_idle
+        self.max_idle_time = max_idle_time
+        self.timeout = timeout
+        self.connection_class = connection_class
+        self.connection_kwargs = kwargs
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(('created', 'reused', 'expired',
+                                     'unhealthy', 'discarded', 'retried',
+                                     'requests'), 0)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """Return pool counters and the idle connections per host."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = dict((host, len(idle))
+                                 for host, idle in self._idle.items())
+        return stats
+
+    @staticmethod
+    def _healthy(connection):
+        sock = connection.sock
+        if sock is None:
+            return False
+        try:
+            readable, _w, _x = select.select([sock], [], [], 0)
+        except (select.error, ValueError):
+            return False
+        # an idle keep-alive socket has nothing to read unless the
+        # controller closed it
+        return not readable
+
+    def acquire(self, host):
+        """Return (connection, reused) for host."""
+        now = time.time()
+        while True:
+            with self._lock:
+                idle = self._idle.get(host)
+                if not idle:
+                    break
+                connection, released = idle.pop()
+            if now - released > self.max_idle_time:
+                self._count('expired')
+                connection.close()
+            elif not self._healthy(connection):
+                self._count('unhealthy')
+                connection.close()
+            else:
+                self._count('reused')
+                return connection, True
+        return self._connect(host), False
+
+    def _connect(self, host):
+        self._count('created')
+        return self.connection_class(host, timeout=self.timeout,
+                                     **self.connection_kwargs)
+
+    def release(self, host, connection):
+        """Give a connection whose response was fully read back."""
+        with self._lock:
+            idle = self._idle.setdefault(host, [])
+            if len(idle) < self.max_idle:
+                idle.append((connection, time.time()))
+                return
+            self._stats['discarded'] += 1
+        connection.close()
+
+    def discard(self, connection):
+        self._count('discarded')
+        connection.close()
+
+    def clear(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _released in connections:
+                connection.close()
+
+    def _open(self, host, method, path, body, headers, trace=None):
+        """Send a request and return (connection, response).
+
+        A request failing on a reused connection is retried once on a new
+        connection, as the controller may have closed it in between. A
+        request that was sent before the connection failed may have been
+        processed, so it is only retried when idempotent.
+        """
+        self._count('requests')
+        connection, reused = self.acquire(host)
+        sent = False
+        try:
+            try:
+                connection.request(method, path, body, headers or {})
+                sent = True
+                response = connection.getresponse()
+            except _STALE_CONNECTION_ERRORS as e:
+                if not reused or not _is_stale_error(e):
+                    raise
+                if sent and method not in _IDEMPOTENT_METHODS:
+                    raise
+                LOG.debug("Reconnecting to %s after %r", host, e)
+                connection.close()
+                self._count('retried')
+                connection = self._connect(host)
+                response = self._send(connection, method, path, body,
+                                      headers)
+        except Exception:
+            self.discard(connection)
+            raise
+        tracing.first_byte(trace)
+        return connection, response
+
+    def _finish(self, host, connection, response):
+        if response.will_close:
+            self.discard(connection)
+        else:
+            self.release(host, connection)
+
+    def urlopen(self, host, method, path, body=None, headers=None,
+                trace=None):
+        """Send a request over a pooled connection.
+
+        :param trace: call state from Tracer.start, or None
+        :returns: (status, reason, body, hash header)
+        """
+        connection, response = self._open(host, method, path, body, headers,
+                                          trace)
+        try:
+            data = response.read()
+        except Exception:
+            self.discard(connection)
+            raise
+        tracing.add_bytes(trace, len(data))
+        self._finish(host, connection, response)
+        return (response.status, response.reason, data,
+                response.getheader(HASH_HEADER))
+
+    def urlopen_stream(self, host, method, path, body=None, headers=None,
+                       chunk_size=CHUNK_SIZE, trace=None):
+        """Send a request and stream its body.
+
+        The connection goes back to the pool once the chunks have been
+        read to the end, and is closed if the iteration stops early.
+
+        :returns: (status, reason, iterator over body chunks, hash header)
+        """
+        connection, response = self._open(host, method, path, body, headers,
+                                          trace)
+
+        def chunks():
+            done = False
+            try:
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    tracing.add_bytes(trace, len(chunk))
+                    yield chunk
+                done = True
+            finally:
+                if done:
+                    self._finish(host, connection, response)
+                else:
+                    self.discard(connection)
+
+        return (response.status, response.reason, chunks(),
+                response.getheader(HASH_HEADER))
+
+    @staticmethod
+    def _send(connection, method, path, body, headers):
+        connection.request(method, path, body, headers or {})
+        return connection.getresponse()
+
+
+def _drained(elements, chunks, trace, status):
+    try:
+        for element in elements:
+            yield element
+        # whitespace may follow the document; the connection is only
+        # reused once the response has been read to the end
+        for _chunk in chunks:
+            pass
+    finally:
+        # closes the connection when the caller stopped early
+        chunks.close()
+        tracer.finish(trace, status)
+
+
+def _is_stale_error(error):
+    # checked first: on Python 3 RemoteDisconnected, raised when the
+    # controller closed the connection, is also a socket error without
+    # errno
+    if isinstance(error, _STALE_CONNECTION_ERRORS[:-1]):
+        return True
+    return getattr(error, 'errno', None) in (errno.EPIPE,
+                                             errno.ECONNRESET,
+                                             errno.ECONNABORTED)
+
+
+# shared by every thread of the process
+pool = ConnectionPool()
+# rest_lib.tracer.slow_log.slowest() lists the slowest controller calls
+tracer = tracing.Tracer()
 
 
 def request(url, prefix="/api/v1/data/controller/", method='GET',
-            data='', hashPath=None, host="127.0.0.1:8080", cookie=None):
+            data='', hashPath=None, host="127.0.0.1:8080", cookie=None,
+            connection_pool=None):
     headers = {'Content-type': 'application/json'}
 
     if cookie:
@@ -28,24 +289,449 @@ def request(url, prefix="/api/v1/data/controller/", method='GET',
     if hashPath:
         headers[HASH_HEADER] = hashPath
 
-    connection = httplib.HTTPSConnection(host)
-
+    trace = tracer.start(method, host + prefix + url)
     try:
-        connection.request(method, prefix + url, data, headers)
-        response = connection.getresponse()
-        ret = (response.status, response.reason, response.read(),
-               response.getheader(HASH_HEADER))
-        if response.status >= 300:
-            log.info('Controller REQUEST: %s %s:body=%r' %
+        ret = (connection_pool or pool).urlopen(host, method, prefix + url,
+                                                data, headers, trace)
+        tracer.finish(trace, ret[0])
+        if ret[0] >= 300:
+            LOG.info('Controller REQUEST: %s %s:body=%r' %
                      (method, host + prefix + url, data))
-            log.info('Controller RESPONSE: status=%d reason=%r, data=%r,'
+            LOG.info('Controller RESPONSE: status=%d reason=%r, data=%r,'
                      'hash=%r' % ret)
         return ret
     except Exception as e:
-        log.error("Controller REQUEST exception: %s" % e)
+        tracer.finish(trace)
+        LOG.error("Controller REQUEST exception: %s" % e)
         raise
 
 
+def request_iter(url, prefix="/api/v1/data/controller/", method='GET',
+                 data='', hashPath=None, host="127.0.0.1:8080", cookie=None,
+                 connection_pool=None, chunk_size=CHUNK_SIZE):
+    """Send a request and decode its JSON response incrementally.
+
+    Elements of a top level array are parsed from the socket one at a time
+    as the caller iterates, so a response of any size is processed in
+    constant memory. Any other document, e.g. an error description, is
+    yielded as a single element. The iterator must be consumed, or closed,
+    for the connection to be released.
+
+    :returns: (status, reason, iterator over elements, hash header)
+    """
+    headers = {'Content-type': 'application/json'}
+    if cookie:
+        headers['Cookie'] = 'session_cookie=%s' % cookie
+    if hashPath:
+        headers[HASH_HEADER] = hashPath
+    trace = tracer.start(method, host + prefix + url)
+    try:
+        status, reason, chunks, hash_path = (
+            connection_pool or pool).urlopen_stream(
+                host, method, prefix + url, data, headers, chunk_size, trace)
+    except Exception as e:
+        tracer.finish(trace)
+        LOG.error("Controller REQUEST exception: %s" % e)
+        raise
+    if status >= 300:
+        LOG.info('Controller REQUEST: %s %s:body=%r' %
+                 (method, host + prefix + url, data))
+        LOG.info('Controller RESPONSE: status=%d reason=%r' %
+                 (status, reason))
+    elements = jsonstream.iter_json(jsonstream.decode_chunks(chunks))
+    return (status, reason, _drained(elements, chunks, trace, status),
+            hash_path)
+
+
+class LoginError(Exception):
+    pass
+
+
+class SessionManager(object):
+    """Thread-safe cache of controller session cookies.
+
+    Sessions are keyed by host and credentials, and shared by every thread
+    of the process. A session is renewed refresh_margin seconds before it
+    is due to expire, and once more when the controller answers 401.
+    Concurrent threads needing the same session wait for a single login.
+
+    :param lifetime: seconds a session is assumed to stay valid
+    :param refresh_margin: seconds before expiry a session is renewed
+    """
+
+    def __init__(self, lifetime=SESSION_LIFETIME,
+                 refresh_margin=SESSION_REFRESH_MARGIN):
+        self.lifetime = lifetime
+        self.refresh_margin = refresh_margin
+        self._sessions = {}
+        self._login_locks = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(host, user, password):
+        # the password itself is not kept in the cache
+        digest = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return host, user, digest
+
+    def _valid(self, key):
+        session = self._sessions.get(key)
+        if session and session[1] - self.refresh_margin > time.time():
+            return session[0]
+        return None
+
+    def _login(self, host, user, password):
+        data = json.dumps({'user': user, 'password': password})
+        status, reason, body, _hash = request(
+            LOGIN_URL, prefix=LOGIN_PREFIX, method='POST', data=data,
+            host=host)
+        try:
+            cookie = json.loads(body).get('session_cookie')
+        except (TypeError, ValueError, AttributeError):
+            cookie = None
+        if status != 200 or not cookie:
+            raise LoginError("Login to controller %s as %s failed: %s %s" %
+                             (host, user, status, reason))
+        return cookie
+
+    def cookie(self, host, user, password):
+        """Return a valid session cookie, logging in if needed."""
+        key = self._key(host, user, password)
+        with self._lock:
+            cookie = self._valid(key)
+            if cookie:
+                return cookie
+            login_lock = self._login_locks.setdefault(key, threading.Lock())
+        with login_lock:
+            # another thread may have logged in while we waited
+            with self._lock:
+                cookie = self._valid(key)
+            if cookie:
+                return cookie
+            LOG.debug("Logging in to controller %s as %s", host, user)
+            cookie = self._login(host, user, password)
+            with self._lock:
+                self._sessions[key] = (cookie, time.time() + self.lifetime)
+            return cookie
+
+    def invalidate(self, host, user, password, cookie=None):
+        """Forget a session, only if it still is cookie when given."""
+        key = self._key(host, user, password)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session and (cookie is None or session[0] == cookie):
+                del self._sessions[key]
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def request(self, host, user, password, url, method='GET', data='',
+                hashPath=None, prefix="/api/v1/data/controller/"):
+        """Send a request in the cached session of user on host.
+
+        :returns: (status, reason, body, hash header)
+        """
+        cookie = self.cookie(host, user, password)
+        ret = request(url, prefix=prefix, method=method, data=data,
+                      hashPath=hashPath, host=host, cookie=cookie)
+        if ret[0] == 401:
+            self.invalidate(host, user, password, cookie)
+            cookie = self.cookie(host, user, password)
+            ret = request(url, prefix=prefix, method=method, data=data,
+                          hashPath=hashPath, host=host, cookie=cookie)
+        return ret
+
+
+# shared by every thread of the process
+sessions = SessionManager()
+
+
+class NoControllerAvailable(Exception):
+    pass
+
+
+class ControllerCluster(object):
+    """Route requests to the nodes of a controller cluster.
+
+    The role and latency of every node are probed, with a short timeout,
+    whenever the last probe is older than probe_interval, and right away
+    when a request to a node fails. Writes go to the active node and fail
+    over to the next healthy node when the request could not reach it.
+    Reads go to the fastest healthy node and are hedged: when it has not
+    answered within hedge_delay seconds, the read is also sent to the
+    next node and the first answer wins.
+
+    :param hosts: "address:port" of every node
+    :param probe_timeout: socket timeout of health probes, in seconds
+    :param probe_interval: seconds a probe result is trusted
+    :param hedge_delay: seconds before a read is sent to another node
+    """
+
+    def __init__(self, hosts, probe_timeout=0.5, probe_interval=5,
+                 hedge_delay=0.05):
+        self.hosts = list(hosts)
+        self.probe_timeout = probe_timeout
+        self.probe_interval = probe_interval
+        self.hedge_delay = hedge_delay
+        self.probe_pool = ConnectionPool(max_idle=1, timeout=probe_timeout)
+        self._nodes = dict((host, {'healthy': True, 'role': None,
+                                   'latency': None})
+                           for host in self.hosts)
+        self._probed = 0
+        self._lock = threading.Lock()
+
+    def nodes(self):
+        """Return a copy of the state of every node."""
+        with self._lock:
+            return dict((host, dict(node))
+                        for host, node in self._nodes.items())
+
+    def _record(self, host, healthy, latency=None, role=None):
+        with self._lock:
+            node = self._nodes[host]
+            node['healthy'] = healthy
+            if role is not None:
+                node['role'] = role
+            if latency is not None:
+                # moving average, so one slow answer does not reorder nodes
+                node['latency'] = (latency if node['latency'] is None else
+                                   0.7 * node['latency'] + 0.3 * latency)
+
+    def _probe_node(self, host, cookie):
+        start = time.time()
+        try:
+            status, _reason, body, _hash = request(
+                ROLE_URL, host=host, cookie=cookie,
+                connection_pool=self.probe_pool)
+        except Exception as e:
+            LOG.info("Controller %s failed its health probe: %s", host, e)
+            self._record(host, False)
+            return
+        role = None
+        try:
+            role = json.loads(body)
+            role = (role[0] if isinstance(role, list) else role).get('role')
+        except (TypeError, ValueError, AttributeError, IndexError):
+            pass
+        self._record(host, status < 500, time.time() - start,
+                     role or 'unknown')
+
+    def probe(self, cookie=None):
+        """Probe every node in parallel."""
+        with self._lock:
+            self._probed = time.time()
+        threads = [threading.Thread(target=self._probe_node,
+                                    args=(host, cookie))
+                   for host in self.hosts]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join(self.probe_timeout * 2)
+
+    def _ranked(self, cookie, by_latency):
+        with self._lock:
+            # a single thread probes while the others use the last results
+            stale = time.time() - self._probed > self.probe_interval
+            if stale:
+                self._probed = time.time()
+        if stale:
+            self.probe(cookie)
+        with self._lock:
+            nodes = [(host, dict(node)) for host, node in self._nodes.items()
+                     if node['healthy']]
+        order = self.hosts.index
+        if by_latency:
+            def key(item):
+                latency = item[1]['latency']
+                return (latency is None, latency, order(item[0]))
+        else:
+            def key(item):
+                return (item[1]['role'] != 'active', order(item[0]))
+        return [host for host, _node in sorted(nodes, key=key)]
+
+    def active(self, cookie=None):
+        """Return the host of the active node."""
+        hosts = self._ranked(cookie, by_latency=False)
+        if not hosts:
+            raise NoControllerAvailable(
+                "No healthy controller in %s" % ', '.join(self.hosts))
+        return hosts[0]
+
+    def _timed(self, host, url, kwargs):
+        start = time.time()
+        ret = request(url, host=host, **kwargs)
+        self._record(host, True, time.time() - start)
+        return ret
+
+    def _write(self, url, kwargs):
+        tried = set()
+        while True:
+            hosts = [host for host in self._ranked(kwargs.get('cookie'),
+                                                   by_latency=False)
+                     if host not in tried]
+            if not hosts:
+                raise NoControllerAvailable(
+                    "No healthy controller in %s" % ', '.join(self.hosts))
+            host = hosts[0]
+            tried.add(host)
+            try:
+                return self._timed(host, url, kwargs)
+            except socket.error as e:
+                if getattr(e, 'errno', None) not in _UNREACHABLE_ERRNOS:
+                    raise
+                LOG.warning("Controller %s unreachable, failing over: %s",
+                            host, e)
+                self._record(host, False)
+                # the standby may have taken over
+                self.probe(kwargs.get('cookie'))
+
+    def _read(self, url, kwargs):
+        hosts = self._ranked(kwargs.get('cookie'), by_latency=True)
+        if not hosts:
+            raise NoControllerAvailable(
+                "No healthy controller in %s" % ', '.join(self.hosts))
+        results = queue.Queue()
+
+        def run(host):
+            try:
+                results.put((host, self._timed(host, url, kwargs), None))
+            except Exception as e:
+                results.put((host, None, e))
+
+        pending = 0
+        error = None
+        while hosts or pending:
+            if hosts:
+                thread = threading.Thread(target=run, args=(hosts.pop(0),))
+                thread.daemon = True
+                thread.start()
+                pending += 1
+            try:
+                # wait for an answer, or hedge to the next node
+                host, ret, e = results.get(
+                    timeout=self.hedge_delay if hosts else None)
+            except queue.Empty:
+                continue
+            pending -= 1
+            if e is None:
+                return ret
+            LOG.warning("Read from controller %s failed: %s", host, e)
+            self._record(host, False)
+            error = e
+        raise error
+
+    def request(self, url, method='GET', data='', hashPath=None,
+                cookie=None, prefix="/api/v1/data/controller/"):
+        """Send a request to the cluster.
+
+        :returns: (status, reason, body, hash header)
+        """
+        kwargs = {'prefix': prefix, 'method': method, 'data': data,
+                  'hashPath': hashPath, 'cookie': cookie}
+        if method == 'GET':
+            return self._read(url, kwargs)
+        return self._write(url, kwargs)
+
+
+class ResponseCache(object):
+    """Conditional GETs of controller data, keyed by host and URL.
+
+    The last hash, body and decoded body of every URL are kept. The hash
+    is sent back with the next GET of the URL; when the controller answers
+    304, or with the same hash, the cached body is returned and the
+    decoded body is reused without parsing it again. The least recently
+    used URLs are dropped beyond max_entries.
+
+    :param max_entries: number of URLs kept
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def _fetch(self, url, host, cookie, prefix):
+        """Return (response, cached entry still valid, entry)."""
+        key = (host, prefix + url)
+        entry = self._lookup(key)
+        ret = request(url, prefix=prefix, host=host, cookie=cookie,
+                      hashPath=entry['hash'] if entry else None)
+        status, reason, body, hash_path = ret
+        same_hash = bool(hash_path) and entry is not None and (
+            hash_path == entry['hash'])
+        unchanged = entry is not None and (
+            status == 304 or (status == 200 and same_hash))
+        with self._lock:
+            self._stats['hits' if unchanged else 'misses'] += 1
+            if unchanged:
+                return (200, reason, entry['body'], entry['hash']), entry
+            if status == 200 and hash_path:
+                entry = {'hash': hash_path, 'body': body}
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                return ret, entry
+            self._entries.pop(key, None)
+        return ret, None
+
+    def get(self, url, host="127.0.0.1:8080", cookie=None,
+            prefix="/api/v1/data/controller/"):
+        """GET a URL, reusing the cached body when it is unchanged.
+
+        :returns: (status, reason, body, hash header)
+        """
+        return self._fetch(url, host, cookie, prefix)[0]
+
+    def get_json(self, url, host="127.0.0.1:8080", cookie=None,
+                 prefix="/api/v1/data/controller/"):
+        """GET and decode a URL; an unchanged body is not decoded again.
+
+        The decoded value is shared by every caller and must not be
+        modified.
+
+        :returns: (status, decoded body or None on error)
+        """
+        ret, entry = self._fetch(url, host, cookie, prefix)
+        if ret[0] != 200:
+            return ret[0], None
+        if entry is None:
+            return ret[0], json.loads(ret[2])
+        with self._lock:
+            decoded = entry.get('decoded')
+        if decoded is None:
+            decoded = json.loads(entry['body'])
+            with self._lock:
+                entry['decoded'] = decoded
+        return ret[0], decoded
+
+    def invalidate(self, host=None, url=None,
+                   prefix="/api/v1/data/controller/"):
+        """Forget a URL, every URL of a host, or everything."""
+        with self._lock:
+            if url is not None:
+                self._entries.pop((host, prefix + url), None)
+            elif host is not None:
+                for key in [key for key in self._entries if key[0] == host]:
+                    del self._entries[key]
+            else:
+                self._entries.clear()
+
+
 def get(cookie, url, server, port, hashPath=None):
     host = "%s:%d" % (server, port)
     return request(url, hashPath=hashPath, host=host, cookie=cookie)
@@ -0,0 +1,247 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Asyncio client for the BSN controller REST API.
+
+Python 3.5 or later only: nothing imports this module implicitly, callers
+guard the import, e.g.::
+
+    try:
+        from horizon_bsn.content.connections.reachability_tests \\
+            import rest_lib_async
+    except (ImportError, SyntaxError):
+        rest_lib_async = None
+
+AsyncClient has the get/post/patch/put/delete surface of rest_lib, as
+coroutines, and returns the same (status, reason, body, hash header)
+tuples. Requests run concurrently over keep-alive connections pooled per
+host, up to max_connections per host; each request has its own timeout
+and may be cancelled. Requests are not pipelined on a connection: a slow
+response would hold back every request queued behind it, so concurrency
+comes from the pooled connections instead.
+"""
+
+import asyncio
+import logging
+
+from horizon_bsn.content.connections.reachability_tests import rest_lib
+
+LOG = logging.getLogger(__name__)
+
+_NO_BODY_STATUS = (204, 304)
+
+
+class _Connection(object):
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+    async def _read_headers(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Controller closed the connection")
+        parts = status_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        status, reason = parts[1], parts[2] if len(parts) > 2 else ''
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _sep, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return int(status), reason, headers
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if not size:
+                # trailers end with an empty line
+                while (await self.reader.readline()) not in (b'\r\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    async def request(self, method, path, body, headers):
+        """Send a request and read its response.
+
+        :returns: (status, reason, body, headers, keep alive)
+        """
+        body = body.encode('utf-8') if isinstance(body, str) else body
+        lines = ['%s %s HTTP/1.1' % (method, path)]
+        lines.extend('%s: %s' % item for item in headers.items())
+        lines.append('Content-Length: %d' % len(body or b''))
+        head = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        self.writer.write(head + (body or b''))
+        await self.writer.drain()
+
+        status, reason, response_headers = await self._read_headers()
+        keep_alive = response_headers.get('connection', '').lower() != 'close'
+        if method == 'HEAD' or status in _NO_BODY_STATUS:
+            data = b''
+        elif response_headers.get('transfer-encoding', '').lower() == \
+                'chunked':
+            data = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            data = await self.reader.readexactly(
+                int(response_headers['content-length']))
+        else:
+            data = await self.reader.read()
+            keep_alive = False
+        return status, reason, data, response_headers, keep_alive
+
+
+class AsyncClient(object):
+    """Concurrent controller client for one event loop.
+
+    :param max_connections: connections opened per host at most; further
+        requests wait for one of them
+    :param timeout: default seconds a request may take, connecting
+        included
+    :param ssl: SSL context, True for the default context, or False for
+        plain HTTP
+    :param max_idle: idle connections kept per host
+    """
+
+    def __init__(self, max_connections=8, timeout=30, ssl=True, max_idle=8):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.ssl = ssl
+        self.max_idle = max_idle
+        self._idle = {}
+        self._slots = {}
+        self.stats = dict.fromkeys(('created', 'reused', 'discarded',
+                                    'requests', 'timeouts'), 0)
+
+    async def _acquire(self, host):
+        idle = self._idle.get(host)
+        while idle:
+            connection = idle.pop()
+            if connection.reader.at_eof():
+                connection.close()
+                continue
+            self.stats['reused'] += 1
+            return connection
+        address, _sep, port = host.rpartition(':')
+        reader, writer = await asyncio.open_connection(
+            address, int(port), ssl=self.ssl or None)
+        self.stats['created'] += 1
+        return _Connection(reader, writer)
+
+    def _release(self, host, connection):
+        idle = self._idle.setdefault(host, [])
+        if len(idle) < self.max_idle:
+            idle.append(connection)
+        else:
+            self._discard(connection)
+
+    def _discard(self, connection):
+        self.stats['discarded'] += 1
+        connection.close()
+
+    async def _urlopen(self, host, method, path, body, headers):
+        slots = self._slots.get(host)
+        if slots is None:
+            slots = self._slots[host] = asyncio.Semaphore(
+                self.max_connections)
+        async with slots:
+            connection = await self._acquire(host)
+            try:
+                status, reason, data, response_headers, keep_alive = \
+                    await connection.request(method, path, body, headers)
+            except BaseException:
+                # a timeout or a cancellation leaves the connection in the
+                # middle of a response
+                self._discard(connection)
+                raise
+            if keep_alive:
+                self._release(host, connection)
+            else:
+                self._discard(connection)
+        return (status, reason, data,
+                response_headers.get(rest_lib.HASH_HEADER.lower()))
+
+    async def request(self, url, prefix="/api/v1/data/controller/",
+                      method='GET', data='', hashPath=None,
+                      host="127.0.0.1:8080", cookie=None, timeout=None):
+        """Send a request, see rest_lib.request.
+
+        :param timeout: seconds the request may take, overriding the
+            client default; None keeps the default
+        """
+        headers = {'Host': host, 'Content-type': 'application/json'}
+        if cookie:
+            headers['Cookie'] = 'session_cookie=%s' % cookie
+        if hashPath:
+            headers[rest_lib.HASH_HEADER] = hashPath
+        self.stats['requests'] += 1
+        try:
+            ret = await asyncio.wait_for(
+                self._urlopen(host, method, prefix + url, data, headers),
+                timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            LOG.error("Controller REQUEST timed out: %s %s",
+                      method, host + prefix + url)
+            raise
+        if ret[0] >= 300:
+            LOG.info('Controller REQUEST: %s %s:body=%r',
+                     method, host + prefix + url, data)
+            LOG.info('Controller RESPONSE: status=%d reason=%r, data=%r,'
+                     'hash=%r', *ret)
+        return ret
+
+    async def get(self, cookie, url, server, port, hashPath=None,
+                  timeout=None):
+        return await self.request(url, hashPath=hashPath,
+                                  host="%s:%d" % (server, port),
+                                  cookie=cookie, timeout=timeout)
+
+    async def post(self, cookie, url, server, port, data, hashPath=None,
+                   timeout=None):
+        return await self.request(url, method='POST', data=data,
+                                  hashPath=hashPath,
+                                  host="%s:%d" % (server, port),
+                                  cookie=cookie, timeout=timeout)
+
+    async def patch(self, cookie, url, server, port, data, hashPath=None,
+                    timeout=None):
+        return await self.request(url, method='PATCH', data=data,
+                                  hashPath=hashPath,
+                                  host="%s:%d" % (server, port),
+                                  cookie=cookie, timeout=timeout)
+
+    async def put(self, cookie, url, server, port, data, hashPath=None,
+                  timeout=None):
+        return await self.request(url, method='PUT', data=data,
+                                  hashPath=hashPath,
+                                  host="%s:%d" % (server, port),
+                                  cookie=cookie, timeout=timeout)
+
+    async def delete(self, cookie, url, server, port, hashPath=None,
+                     timeout=None):
+        return await self.request(url, method='DELETE', hashPath=hashPath,
+                                  host="%s:%d" % (server, port),
+                                  cookie=cookie, timeout=timeout)
+
+    def close(self):
+        """Close every idle connection."""
+        for idle in self._idle.values():
+            for connection in idle:
+                connection.close()
+        self._idle = {}
@@ -47,12 +47,21 @@ class RunQuickTest(tables.LinkAction):
 
 
 class ReachabilityTestFilterAction(tables.FilterAction):
+    verbose_name = _("Filter, e.g. src:10.0.0.0/8 result:fail")
 
     def filter(self, table, reachabilitytests, filter_string):
-        """Naive case-insentitive search."""
-        q = filter_string.lower()
-        return [reachabilitytest for reachabilitytest in reachabilitytests
-                if q in reachabilitytest.name.lower()]
+        """Search the listed tests with neutron.reachabilitytest_filter.
+
+        Besides names, tests can be searched by field, e.g.
+        ``src:10.0.0.0/8``, ``segment:web``, ``expected:"dropped by
+        policy"`` or ``result:fail``.
+        """
+        request = table.request
+        # the admin tab lists the tests of every tenant
+        tenant_id = (None if request.path_info.startswith('/admin/')
+                     else request.user.project_id)
+        return neutron.reachabilitytest_filter(
+            request, reachabilitytests, filter_string, tenant_id=tenant_id)
 
 
 class RunTest(tables.BatchAction):
@@ -90,6 +99,19 @@ STATUS_CHOICES = (
 )
 
 
+class ReachabilityTestUpdateRow(tables.Row):
+    ajax = True
+
+    def load_cells(self, datum=None):
+        # only tests with a run in progress poll for their result
+        test = datum if datum is not None else self.datum
+        self.ajax = getattr(test, 'test_result', None) == 'pending'
+        super(ReachabilityTestUpdateRow, self).load_cells(datum)
+
+    def get_data(self, request, id):
+        return neutron.reachabilitytest_row(request, id)
+
+
 class ReachabilityTestsTable(tables.DataTable):
     id = tables.Column("id", hidden=True)
     name = tables.Column("name", verbose_name=_("Name"))
@@ -114,3 +136,5 @@ class ReachabilityTestsTable(tables.DataTable):
         table_actions = (CreateReachabilityTest, RunQuickTest,
                          DeleteReachabilityTests, ReachabilityTestFilterAction)
         row_actions = (RunTest, UpdateTest, DeleteReachabilityTests)
+        status_columns = ["status", ]
+        row_class = ReachabilityTestUpdateRow
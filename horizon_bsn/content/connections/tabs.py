@@ -23,6 +23,8 @@ from horizon.utils import memoized
 from openstack_dashboard import api
 
 from horizon_bsn.api import neutron
+from horizon_bsn.api import stack_status
+from horizon_bsn.api import stack_topology
 from horizon_bsn.content.connections.network_template.tables \
     import NetworkTemplateAdminTable
 from horizon_bsn.content.connections.network_template.tables \
@@ -32,10 +34,6 @@ from horizon_bsn.content.connections.reachability_tests.tables \
 from horizon_bsn.content.connections.tenant_policies.tables \
     import TenantPoliciesTable
 
-import json
-
-from openstack_dashboard.api import heat
-
 LOG = logging.getLogger(__name__)
 
 
@@ -57,58 +55,6 @@ class NetworkTemplateAdminTab(tabs.TableTab):
             return []
 
 
-def get_stack_topology(request):
-    try:
-        assign = neutron.networktemplateassignment_get(
-            request, request.user.tenant_id)
-        networktemplate = neutron.networktemplate_get(
-            request, assign.template_id)
-    except Exception:
-        return {"network_entities": "{}",
-                "network_connections": "{}"}
-
-    hc = heat.heatclient(request)
-    # we only want the one that matches the network template
-    stacks = [s for s in hc.stacks.list(tenant_id=request.user.tenant_id)
-              if s.id == assign.stack_id]
-    if not stacks:
-        # leftover association, delete the assignment
-        neutron.networktemplateassignment_delete(request,
-                                                 request.user.tenant_id)
-        return {"network_entities": "",
-                "network_connections": ""}
-    resources = hc.resources.list(assign.stack_id)
-    entities = {}
-    connections = []
-    for res in resources:
-        if res.resource_type in ('OS::Neutron::Router', 'OS::Neutron::Subnet'):
-            entities[res.physical_resource_id] = {
-                'properties': {'name': res.physical_resource_id}
-            }
-        if res.resource_type == 'OS::Neutron::RouterInterface':
-            connections.append({
-                'source': res.physical_resource_id.split(':subnet_id=')[0],
-                'destination':
-                    res.physical_resource_id.split('subnet_id=')[-1],
-                'expected_connection': 'forward'
-            })
-    resp = {'template': networktemplate,
-            'assign': assign,
-            'network_entities': json.dumps(entities),
-            'network_connections': json.dumps(connections),
-            'stack_resources': resources,
-            'stack': stacks[0]}
-    return resp
-
-
-def is_heat_available(request):
-    try:
-        heat.heatclient(request)
-        return True
-    except Exception:
-        return False
-
-
 class NetworkTemplateTab(tabs.TableTab):
     table_classes = (NetworkTemplateTable,)
     name = _("Network Template")
@@ -117,7 +63,7 @@ class NetworkTemplateTab(tabs.TableTab):
 
     def allowed(self, request):
         # don't show tab to tenants if heat isn't installed
-        if not is_heat_available(request):
+        if not stack_topology.is_heat_available(request):
             return False
         # don't show the regular template tab to admins
         return (not request.path_info.startswith('/admin/')
@@ -125,9 +71,13 @@ class NetworkTemplateTab(tabs.TableTab):
 
     def get_networktemplate_data(self):
         try:
-            topology = get_stack_topology(self.request)
+            topology = stack_topology.get_stack_topology(self.request)
             if not topology.get('assign'):
                 return []
+            # row refreshes start from what this page load fetched
+            stack_status.remember(self.request, topology['stack'],
+                                  topology['assign'], topology['template'],
+                                  topology['stack_resources'])
             tabledata = {
                 'template_id': topology['template'].id,
                 'template_name': topology['template'].name,
@@ -0,0 +1,319 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Bulk import and export of tenant policies.
+
+Imports are parsed as a stream, validated row by row with the same fields
+used by the Add Tenant Policy form and created by a small pool of worker
+threads, so a file with thousands of policies is applied in one operation
+and every row gets its own result.
+"""
+
+import codecs
+import collections
+import csv
+import json
+import logging
+import threading
+
+from django.forms import ValidationError
+from django.utils.translation import ugettext_lazy as _
+from horizon import forms
+import six
+from six.moves import queue
+import yaml
+
+from horizon_bsn.api import callbudget
+from horizon_bsn.api import jsonstream
+from horizon_bsn.api import neutron
+from horizon_bsn.content.connections.tenant_policies import fields
+
+LOG = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'json', 'yaml')
+CONTENT_TYPES = {'csv': 'text/csv',
+                 'json': 'application/json',
+                 'yaml': 'application/x-yaml'}
+FIELDS = ('priority', 'source', 'source_port', 'destination',
+          'destination_port', 'protocol', 'action', 'nexthops')
+MIN_PRIORITY = 1
+MAX_PRIORITY = 3000
+DEFAULT_WORKERS = 8
+CHUNK_SIZE = 64 * 1024
+
+CREATED = 'created'
+INVALID = 'invalid'
+FAILED = 'failed'
+
+RowResult = collections.namedtuple('RowResult',
+                                   ['row', 'status', 'message', 'policy'])
+
+
+##################################################################
+# EXPORT
+##################################################################
+
+
+def _export_row(policy):
+    row = dict((field, policy.get(field)) for field in FIELDS)
+    nexthops = row['nexthops'] or []
+    if isinstance(nexthops, six.string_types):
+        nexthops = [hop for hop in nexthops.split(',') if hop]
+    row['nexthops'] = list(nexthops)
+    return row
+
+
+class _Echo(object):
+    """File-like object handing back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def export_policies(policies, fmt):
+    """Yield a serialized policy set chunk by chunk.
+
+    :param policies: tenant policies as returned by tenantpolicy_list
+    :param fmt: one of FORMATS
+    """
+    policies = sorted(policies, key=lambda p: int(p['priority']))
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(FIELDS)
+        for policy in policies:
+            row = _export_row(policy)
+            row['nexthops'] = ','.join(row['nexthops'])
+            yield writer.writerow([row[field] for field in FIELDS])
+    elif fmt == 'json':
+        yield '['
+        separator = '\n'
+        for policy in policies:
+            yield separator + json.dumps(_export_row(policy), sort_keys=True)
+            separator = ',\n'
+        yield '\n]\n'
+    elif fmt == 'yaml':
+        for policy in policies:
+            yield yaml.safe_dump([_export_row(policy)],
+                                 default_flow_style=False)
+    else:
+        raise ValueError('Unsupported format %s' % fmt)
+
+
+##################################################################
+# PARSING
+##################################################################
+
+
+def _chunks(fileobj):
+    if hasattr(fileobj, 'chunks'):
+        # django UploadedFile
+        for chunk in fileobj.chunks(CHUNK_SIZE):
+            yield chunk
+        return
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _text_chunks(fileobj):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in _chunks(fileobj):
+        if isinstance(chunk, six.binary_type):
+            chunk = decoder.decode(chunk)
+        yield chunk
+
+
+def parse_policies(fileobj, fmt):
+    """Yield (row number, row) pairs from an import file.
+
+    :param fileobj: file-like object or django UploadedFile
+    :param fmt: one of FORMATS
+    """
+    if fmt == 'csv':
+        lines = _text_chunks(fileobj)
+        if six.PY2:
+            lines = (chunk.encode('utf-8') for chunk in lines)
+        # rows are counted like the other formats: quoted line breaks and
+        # skipped blank lines would throw off reader.line_num
+        for number, row in enumerate(csv.DictReader(_lines(lines)), 1):
+            yield number, row
+    elif fmt == 'json':
+        rows = jsonstream.iter_json(_text_chunks(fileobj))
+        for number, row in enumerate(rows, 1):
+            yield number, row
+    elif fmt == 'yaml':
+        # PyYAML reads the stream incrementally but builds each document
+        # whole, so a list document is expanded in place
+        number = 0
+        for document in yaml.safe_load_all(fileobj):
+            rows = document if isinstance(document, list) else [document]
+            for row in rows:
+                number += 1
+                yield number, row
+    else:
+        raise ValueError('Unsupported format %s' % fmt)
+
+
+def _lines(chunks):
+    pending = ''
+    for chunk in chunks:
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if pending:
+        yield pending
+
+
+##################################################################
+# VALIDATION
+##################################################################
+
+
+def validate_row(row):
+    """Validate one imported row with the Add Tenant Policy form fields.
+
+    :returns: dict ready to be passed to tenantpolicy_create
+    :raises: ValidationError
+    """
+    if not isinstance(row, dict):
+        raise ValidationError(_("Row must be a mapping of policy fields"))
+    unknown = set(row) - set(FIELDS) - set(['id', 'tenant_id'])
+    if unknown:
+        raise ValidationError(_("Unknown fields: %s") %
+                              ', '.join(sorted(unknown)))
+
+    def value(field):
+        data = row.get(field)
+        if isinstance(data, six.string_types):
+            data = data.strip()
+        return data
+
+    data = {}
+    try:
+        data['priority'] = int(value('priority'))
+    except (TypeError, ValueError):
+        raise ValidationError(_("Priority must be an integer"))
+    if not MIN_PRIORITY <= data['priority'] <= MAX_PRIORITY:
+        raise ValidationError(_("Priority must be in the range of "
+                                "%(min)d to %(max)d") %
+                              {'min': MIN_PRIORITY, 'max': MAX_PRIORITY})
+    for field in ('source', 'destination'):
+        cidr = fields.RuleCIDRField().clean(value(field) or '')
+        data[field] = 'any' if cidr == '0.0.0.0/0' else cidr
+    for field in ('source_port', 'destination_port'):
+        port = value(field)
+        port = fields.PortField(required=False).clean(
+            '0' if port in (None, '') else str(port))
+        data[field] = int(port)
+    data['protocol'] = (value('protocol') or '').lower()
+    if data['protocol'] not in ('', 'tcp', 'udp'):
+        raise ValidationError(_("Protocol must be tcp, udp or empty"))
+    has_port = data['source_port'] > 0 or data['destination_port'] > 0
+    if has_port and not data['protocol']:
+        raise ValidationError(_('Protocol must be specified if either '
+                                'source or destination port is specified'))
+    data['action'] = (value('action') or '').lower()
+    if data['action'] not in ('permit', 'deny'):
+        raise ValidationError(_("Action must be permit or deny"))
+    nexthops = value('nexthops') or ''
+    if not isinstance(nexthops, six.string_types):
+        nexthops = ','.join(str(hop).strip() for hop in nexthops)
+    nexthops = forms.MultiIPField(required=False).clean(nexthops)
+    data['nexthops'] = '' if data['action'] == 'deny' else nexthops
+    return data
+
+
+def _error_message(error):
+    if isinstance(error, ValidationError):
+        return '; '.join(six.text_type(m) for m in error.messages)
+    return six.text_type(error)
+
+
+##################################################################
+# IMPORT
+##################################################################
+
+
+def import_policies(request, rows, existing_priorities=(),
+                    max_workers=DEFAULT_WORKERS):
+    """Validate and create tenant policies with bounded concurrency.
+
+    Rows are validated as they are read; valid rows are handed to at most
+    max_workers threads through a bounded queue, so neither the parsed
+    input nor the pending creates pile up in memory.
+
+    :param request: request context
+    :param rows: iterable of (row number, row) pairs, see parse_policies
+    :param existing_priorities: priorities already used by the tenant
+    :param max_workers: number of concurrent tenantpolicy_create calls
+    :returns: list of RowResult ordered by row number
+    """
+    results = []
+    lock = threading.Lock()
+    pending = queue.Queue(maxsize=max_workers * 2)
+    used = set(int(p) for p in existing_priorities)
+
+    def record(result):
+        with lock:
+            results.append(result)
+
+    def worker():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            number, data = item
+            try:
+                policy = neutron.tenantpolicy_create(request, **data)
+                record(RowResult(number, CREATED, '', policy))
+            except Exception as e:
+                LOG.info("Failed to import tenant policy row %s: %s",
+                         number, e)
+                record(RowResult(number, FAILED, _error_message(e), None))
+
+    workers = [threading.Thread(target=callbudget.propagate(worker))
+               for _i in range(max(1, max_workers))]
+    for thread in workers:
+        thread.daemon = True
+        thread.start()
+    try:
+        rows = iter(rows)
+        while True:
+            try:
+                number, row = next(rows)
+            except StopIteration:
+                break
+            except Exception as e:
+                # the rest of the stream cannot be parsed
+                record(RowResult(None, INVALID, _error_message(e), None))
+                break
+            try:
+                data = validate_row(row)
+                if data['priority'] in used:
+                    raise ValidationError(_("Priority %d is already in use")
+                                          % data['priority'])
+            except Exception as e:
+                record(RowResult(number, INVALID, _error_message(e), None))
+                continue
+            used.add(data['priority'])
+            pending.put((number, data))
+    finally:
+        for _thread in workers:
+            pending.put(None)
+        for thread in workers:
+            thread.join()
+    return sorted(results, key=lambda r: (r.row is None, r.row))
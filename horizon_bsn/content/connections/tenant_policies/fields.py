@@ -0,0 +1,47 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Form fields shared by the tenant policy forms and the bulk importer.
+"""
+from django.forms import ValidationError
+from django.utils.translation import ugettext_lazy as _
+from horizon import forms
+
+
+class RuleCIDRField(forms.IPField):
+    """Extends IPField to allow ('any','external') keywords and requires CIDR
+
+    """
+    def __init__(self, *args, **kwargs):
+        kwargs['mask'] = True
+        super(RuleCIDRField, self).__init__(*args, **kwargs)
+
+    def validate(self, value):
+        keywords = ['any', 'external']
+        if value in keywords:
+            self.ip = value
+        else:
+            if '/' not in value:
+                raise ValidationError(_("Input must be in CIDR format"))
+            super(RuleCIDRField, self).validate(value)
+
+
+class PortField(forms.DecimalField):
+    """Port number input
+
+    """
+    def validate(self, value):
+        if int(value) not in range(0, 65536):
+            raise ValidationError(_("Port must be in the range of 0 to 65535"))
+        super(PortField, self).validate(value)
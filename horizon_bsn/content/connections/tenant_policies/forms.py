@@ -24,50 +24,27 @@ from horizon import forms
 from horizon import messages
 
 from horizon_bsn.api import neutron
+from horizon_bsn.api import tenantpolicy
+from horizon_bsn.api import tenantpolicy_changeset
+from horizon_bsn.content.connections.tenant_policies import bulk
+from horizon_bsn.content.connections.tenant_policies import fields
 
 import logging
 
 LOG = logging.getLogger(__name__)
 
 
-class RuleCIDRField(forms.IPField):
-    """Extends IPField to allow ('any','external') keywords and requires CIDR
-
-    """
-    def __init__(self, *args, **kwargs):
-        kwargs['mask'] = True
-        super(RuleCIDRField, self).__init__(*args, **kwargs)
-
-    def validate(self, value):
-        keywords = ['any', 'external']
-        if value in keywords:
-            self.ip = value
-        else:
-            if '/' not in value:
-                raise ValidationError(_("Input must be in CIDR format"))
-            super(RuleCIDRField, self).validate(value)
-
-
-class PortField(forms.DecimalField):
-    """Port number input
-
-    """
-    def validate(self, value):
-        if int(value) not in range(0, 65536):
-            raise ValidationError(_("Port must be in the range of 0 to 65535"))
-        super(PortField, self).validate(value)
-
-
 class AddTenantPolicy(forms.SelfHandlingForm):
     priority = forms.ChoiceField(label=_("Priority"),
                                  help_text=_("Select a Priority for the "
                                              "policy. Lower value = higher "
                                              "priority."))
-    source = RuleCIDRField(label=_("Source CIDR"), widget=forms.TextInput())
-    source_port = PortField(required=False, initial=0)
-    destination = RuleCIDRField(label=_("Destination CIDR"),
-                                widget=forms.TextInput())
-    destination_port = PortField(required=False, initial=0)
+    source = fields.RuleCIDRField(label=_("Source CIDR"),
+                                  widget=forms.TextInput())
+    source_port = fields.PortField(required=False, initial=0)
+    destination = fields.RuleCIDRField(label=_("Destination CIDR"),
+                                       widget=forms.TextInput())
+    destination_port = fields.PortField(required=False, initial=0)
     action = forms.ChoiceField(label=_("Action"))
     protocol = forms.ChoiceField(label=_("Protocol"),
                                  help_text=_("Protocol is mandatory when "
@@ -94,6 +71,8 @@ class AddTenantPolicy(forms.SelfHandlingForm):
         existing_priorities = []
         all_policies = neutron.tenantpolicy_list(
             request, **{'tenant_id': request.user.project_id})
+        # kept for the shadowing check in clean()
+        self.existing_policies = all_policies
         for policy in all_policies:
             existing_priorities.append(policy['priority'])
 
@@ -118,8 +97,36 @@ class AddTenantPolicy(forms.SelfHandlingForm):
             cleaned_data['destination'] = 'any'
         if 'action' in cleaned_data and cleaned_data['action'] == 'deny':
             cleaned_data['nexthops'] = ''
+        self._check_shadowing(cleaned_data)
         return cleaned_data
 
+    def _check_shadowing(self, data):
+        """Reject policies that a higher priority policy already covers."""
+        required = ('priority', 'source', 'destination', 'action')
+        missing = any(not data.get(field) for field in required)
+        if missing or int(data['priority']) < 0:
+            # field errors are reported by the individual fields
+            return
+        try:
+            findings = tenantpolicy.check_policy(
+                getattr(self, 'existing_policies', []), data)
+        except Exception as e:
+            LOG.debug("Skipping tenant policy shadowing check: %s", e)
+            return
+        for finding in findings:
+            params = {'priority': finding.other['priority'],
+                      'action': finding.other['action']}
+            if finding.kind == tenantpolicy.SHADOWED:
+                raise ValidationError(
+                    _("This policy would never match any traffic: it is "
+                      "shadowed by policy %(priority)s (%(action)s).")
+                    % params)
+            if finding.kind == tenantpolicy.REDUNDANT:
+                raise ValidationError(
+                    _("This policy is redundant: policy %(priority)s "
+                      "(%(action)s) already matches the same traffic.")
+                    % params)
+
     def _validate_protocol(self, data):
         if ((int(data['source_port']) > 0 or int(data['destination_port']) > 0)
                 and data['protocol'] not in ['tcp', 'udp']):
@@ -140,3 +147,142 @@ class AddTenantPolicy(forms.SelfHandlingForm):
             messages.error(request, msg)
             redirect = reverse(self.failure_url)
             exceptions.handle(request, msg, redirect=redirect)
+
+
+class MatchFlowForm(forms.SelfHandlingForm):
+    source = forms.IPField(label=_("Source IP Address"))
+    source_port = fields.PortField(label=_("Source Port"), required=False,
+                                   initial=0)
+    destination = forms.IPField(label=_("Destination IP Address"))
+    destination_port = fields.PortField(label=_("Destination Port"),
+                                        required=False, initial=0)
+    protocol = forms.ChoiceField(label=_("Protocol"), required=False)
+    failure_url = 'horizon:project:connections:index'
+
+    def __init__(self, request, *args, **kwargs):
+        super(MatchFlowForm, self).__init__(request, *args, **kwargs)
+        self.fields['protocol'].choices = [('', _('None')),
+                                           ('tcp', 'TCP'),
+                                           ('udp', 'UDP')]
+
+    def handle(self, request, data):
+        try:
+            policy = neutron.tenantpolicy_match(request, [data])[0]
+        except Exception as e:
+            msg = _('Failed to match flow against tenant policies: %s') % e
+            LOG.info(msg)
+            redirect = reverse(self.failure_url)
+            exceptions.handle(request, msg, redirect=redirect)
+            return False
+        if policy is None:
+            msg = _("No tenant policy matches this flow.")
+        else:
+            msg = _("Flow matches tenant policy %(priority)s: %(action)s "
+                    "%(source)s %(source_port)s -- %(destination)s "
+                    "%(destination_port)s %(protocol)s") % policy
+        LOG.debug(msg)
+        messages.info(request, msg)
+        return True
+
+
+class ImportTenantPolicies(forms.SelfHandlingForm):
+    policy_file = forms.FileField(label=_("Policy File"))
+    file_format = forms.ChoiceField(label=_("Format"),
+                                    choices=[('csv', 'CSV'),
+                                             ('json', 'JSON'),
+                                             ('yaml', 'YAML')])
+    failure_url = 'horizon:project:connections:index'
+    # number of failed rows listed individually
+    max_reported_rows = 20
+
+    def handle(self, request, data):
+        try:
+            existing = neutron.tenantpolicy_list(
+                request, **{'tenant_id': request.user.project_id})
+            rows = bulk.parse_policies(data['policy_file'],
+                                       data['file_format'])
+            results = bulk.import_policies(
+                request, rows, [p['priority'] for p in existing])
+        except Exception as e:
+            msg = _('Failed to import tenant policies: %s') % e
+            LOG.info(msg)
+            redirect = reverse(self.failure_url)
+            exceptions.handle(request, msg, redirect=redirect)
+            return False
+        created = [r for r in results if r.status == bulk.CREATED]
+        failed = [r for r in results if r.status != bulk.CREATED]
+        msg = _("Imported %(created)d of %(total)d tenant policies") % {
+            'created': len(created), 'total': len(results)}
+        LOG.debug(msg)
+        if created:
+            messages.success(request, msg)
+        else:
+            messages.warning(request, msg)
+        for result in failed[:self.max_reported_rows]:
+            if result.row is None:
+                messages.error(request, _("Import stopped: %s") %
+                               result.message)
+            else:
+                messages.error(request, _("Row %(row)s: %(message)s") % {
+                    'row': result.row, 'message': result.message})
+        if len(failed) > self.max_reported_rows:
+            messages.error(request, _("%d more rows failed") %
+                           (len(failed) - self.max_reported_rows))
+        return True
+
+
+class CompactTenantPolicies(forms.SelfHandlingForm):
+    fingerprint = forms.CharField(widget=forms.HiddenInput())
+    failure_url = 'horizon:project:connections:index'
+
+    def __init__(self, request, *args, **kwargs):
+        super(CompactTenantPolicies, self).__init__(request, *args, **kwargs)
+        self.policies = []
+        self.compaction = None
+        try:
+            self.policies = neutron.tenantpolicy_list(
+                request, **{'tenant_id': request.user.project_id})
+            self.compaction = tenantpolicy.compact(self.policies)
+        except Exception as e:
+            msg = _('Failed to compact tenant policies: %s') % e
+            LOG.info(msg)
+            redirect = reverse(self.failure_url)
+            exceptions.handle(request, msg, redirect=redirect)
+        self.fields['fingerprint'].initial = \
+            tenantpolicy.policies_fingerprint(self.policies)
+
+    def clean(self):
+        cleaned_data = super(CompactTenantPolicies, self).clean()
+        fingerprint = tenantpolicy.policies_fingerprint(self.policies)
+        if cleaned_data.get('fingerprint') != fingerprint:
+            raise ValidationError(_('Tenant policies changed since the '
+                                    'preview was computed, please review '
+                                    'the new preview.'))
+        return cleaned_data
+
+    def handle(self, request, data):
+        compaction = self.compaction
+        if compaction is None:
+            # the policies could not be listed or compacted in __init__
+            messages.error(request, _('Failed to compact tenant policies.'))
+            return False
+        if not compaction.deletes and not compaction.updates:
+            messages.info(request, _("Tenant policies are already compact."))
+            return True
+        try:
+            changeset = tenantpolicy_changeset.ChangeSet(
+                self.policies, deletes=compaction.deletes,
+                updates=compaction.updates)
+            changeset.apply(request)
+        except Exception as e:
+            msg = _('Failed to compact tenant policies: %s') % e
+            LOG.info(msg)
+            redirect = reverse(self.failure_url)
+            exceptions.handle(request, msg, redirect=redirect)
+            return False
+        msg = _("Compacted %(before)d tenant policies into %(after)d") % {
+            'before': len(self.policies),
+            'after': len(compaction.policies)}
+        LOG.debug(msg)
+        messages.success(request, msg)
+        return True
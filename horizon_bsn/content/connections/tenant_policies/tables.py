@@ -14,20 +14,29 @@
 
 import logging
 
+from django.core.urlresolvers import reverse
+from django import shortcuts
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ungettext_lazy
+from horizon import exceptions
+from horizon import messages
 from horizon import tables
 from horizon_bsn.api import neutron
+from horizon_bsn.api import tenantpolicy_changeset
+from horizon_bsn.api import tenantpolicy_search
 
 LOG = logging.getLogger(__name__)
 
 
 class RandomFilterAction(tables.FilterAction):
     def filter(self, table, policies, filter_string):
-        """Naive case-insentitive search."""
-        q = filter_string.lower()
-        return [policy for policy in policies
-                if q in str(policy.to_dict())]
+        """Search the per-tenant policy index.
+
+        Supports field-scoped terms such as ``action:deny`` or
+        ``dst:10.0.0.0/8``, see horizon_bsn.api.tenantpolicy_search.
+        """
+        return tenantpolicy_search.filter_policies(
+            table.request.user.project_id, policies, filter_string)
 
 
 class AddTenantPolicy(tables.LinkAction):
@@ -38,6 +47,48 @@ class AddTenantPolicy(tables.LinkAction):
     icon = "plus"
 
 
+class AnalyzeTenantPolicies(tables.LinkAction):
+    name = "analyze"
+    verbose_name = _("Analyze Policies")
+    url = "horizon:project:connections:tenant_policies:analyze"
+    classes = ("btn-edit",)
+    icon = "search"
+
+
+class CompactTenantPolicies(tables.LinkAction):
+    name = "compact"
+    verbose_name = _("Compact Policies")
+    url = "horizon:project:connections:tenant_policies:compact"
+    classes = ("ajax-modal", "btn-edit")
+    icon = "compress"
+
+
+class MatchFlow(tables.LinkAction):
+    name = "match"
+    verbose_name = _("Match Flow")
+    url = "horizon:project:connections:tenant_policies:match"
+    classes = ("ajax-modal", "btn-edit")
+    icon = "random"
+
+
+class ImportTenantPolicies(tables.LinkAction):
+    name = "import"
+    verbose_name = _("Import Policies")
+    url = "horizon:project:connections:tenant_policies:import"
+    classes = ("ajax-modal", "btn-create")
+    icon = "upload"
+
+
+class ExportTenantPolicies(tables.LinkAction):
+    name = "export"
+    verbose_name = _("Export Policies")
+    url = "horizon:project:connections:tenant_policies:export"
+    icon = "download"
+
+    def get_link_url(self, datum=None):
+        return reverse(self.url, kwargs={'file_format': 'csv'})
+
+
 class RemoveTenantPolicy(tables.DeleteAction):
     @staticmethod
     def action_present(count):
@@ -58,7 +109,32 @@ class RemoveTenantPolicy(tables.DeleteAction):
     failure_url = 'horizon:project:connections:index'
 
     def delete(self, request, id):
-        neutron.tenantpolicy_delete(request, id)
+        policy = self.table.get_object_by_id(id)
+        neutron.tenantpolicy_delete(request, id,
+                                    tenant_id=getattr(policy, 'tenant_id',
+                                                      None))
+
+    def handle(self, table, request, obj_ids):
+        """Delete the selected policies as one change set.
+
+        The deletes run in parallel and are rolled back together if any of
+        them fails, instead of leaving a partially deleted selection.
+        """
+        names = [table.get_object_display(table.get_object_by_id(obj_id))
+                 for obj_id in obj_ids]
+        try:
+            changeset = tenantpolicy_changeset.ChangeSet(table.data,
+                                                         deletes=obj_ids)
+            changeset.apply(request)
+            self.success_ids.extend(obj_ids)
+            messages.success(request, _('%(action)s: %(objs)s') % {
+                'action': self.action_past(len(names)),
+                'objs': ', '.join(names)})
+        except Exception as e:
+            LOG.info("Failed to delete tenant policies %s: %s", obj_ids, e)
+            exceptions.handle(request,
+                              _('Unable to delete tenant policies: %s') % e)
+        return shortcuts.redirect(self.get_success_url(request))
 
 
 class TenantPoliciesTable(tables.DataTable):
@@ -83,6 +159,34 @@ class TenantPoliciesTable(tables.DataTable):
     class Meta(object):
         name = "tenantpolicies"
         verbose_name = _("Tenant Policies")
-        table_actions = (AddTenantPolicy, RemoveTenantPolicy,
+        table_actions = (AddTenantPolicy, ImportTenantPolicies,
+                         ExportTenantPolicies, AnalyzeTenantPolicies,
+                         CompactTenantPolicies, MatchFlow, RemoveTenantPolicy,
                          RandomFilterAction,)
         row_actions = (RemoveTenantPolicy,)
+
+
+FINDING_DISPLAY_CHOICES = (
+    ("shadowed", _("Shadowed")),
+    ("redundant", _("Redundant")),
+    ("conflict", _("Conflict")),
+)
+
+
+class PolicyFindingsTable(tables.DataTable):
+    id = tables.Column("id", hidden=True)
+    kind = tables.Column("kind", verbose_name=_("Finding"),
+                         display_choices=FINDING_DISPLAY_CHOICES)
+    priority = tables.Column("priority", verbose_name=_("Priority"))
+    policy = tables.Column("policy", verbose_name=_("Policy"))
+    other_priority = tables.Column("other_priority",
+                                   verbose_name=_("Matched By Priority"))
+    other = tables.Column("other", verbose_name=_("Matched By Policy"))
+
+    def get_object_id(self, finding):
+        return finding['id']
+
+    class Meta(object):
+        name = "tenantpolicyfindings"
+        verbose_name = _("Tenant Policy Analysis")
+        multi_select = False
@@ -22,4 +22,11 @@ VIEWS_MOD = (
 urlpatterns = patterns(
     VIEWS_MOD,
     url(r'^create/$', views.CreateTenantPolicyView.as_view(), name='create'),
+    url(r'^analyze/$', views.AnalyzeView.as_view(), name='analyze'),
+    url(r'^compact/$', views.CompactView.as_view(), name='compact'),
+    url(r'^match/$', views.MatchFlowView.as_view(), name='match'),
+    url(r'^import/$', views.ImportTenantPoliciesView.as_view(),
+        name='import'),
+    url(r'^export/(?P<file_format>csv|json|yaml)/$',
+        views.ExportTenantPoliciesView.as_view(), name='export'),
 )
@@ -15,12 +15,106 @@
 Views for managing reachability test.
 """
 from django.core.urlresolvers import reverse_lazy
+from django import http
+from django.utils.translation import ugettext_lazy as _
+from django.views import generic
+from horizon import exceptions
 from horizon import forms
+from horizon import tables
+from horizon_bsn.api import neutron
+from horizon_bsn.api import tenantpolicy
+from horizon_bsn.content.connections.tenant_policies import bulk
 from horizon_bsn.content.connections.tenant_policies \
     import forms as project_forms
+from horizon_bsn.content.connections.tenant_policies \
+    import tables as project_tables
+
+POLICY_DISPLAY = ("%(action)s %(source)s %(source_port)s -- "
+                  "%(destination)s %(destination_port)s %(protocol)s")
 
 
 class CreateTenantPolicyView(forms.ModalFormView):
     form_class = project_forms.AddTenantPolicy
     template_name = 'project/connections/tenant_policies/create.html'
     success_url = reverse_lazy("horizon:project:connections:index")
+
+
+class ImportTenantPoliciesView(forms.ModalFormView):
+    form_class = project_forms.ImportTenantPolicies
+    template_name = 'project/connections/tenant_policies/import.html'
+    success_url = reverse_lazy("horizon:project:connections:index")
+
+
+class ExportTenantPoliciesView(generic.View):
+    def get(self, request, file_format):
+        try:
+            policies = neutron.tenantpolicy_list(
+                request, **{'tenant_id': request.user.project_id})
+        except Exception:
+            exceptions.handle(request,
+                              _('Unable to retrieve tenant policies.'),
+                              redirect=reverse_lazy(
+                                  "horizon:project:connections:index"))
+        response = http.StreamingHttpResponse(
+            bulk.export_policies(policies, file_format),
+            content_type=bulk.CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = \
+            'attachment; filename="tenant_policies.%s"' % file_format
+        return response
+
+
+class MatchFlowView(forms.ModalFormView):
+    form_class = project_forms.MatchFlowForm
+    template_name = 'project/connections/tenant_policies/match.html'
+    success_url = reverse_lazy("horizon:project:connections:index")
+
+
+class CompactView(forms.ModalFormView):
+    form_class = project_forms.CompactTenantPolicies
+    template_name = 'project/connections/tenant_policies/compact.html'
+    success_url = reverse_lazy("horizon:project:connections:index")
+
+    def get_context_data(self, **kwargs):
+        context = super(CompactView, self).get_context_data(**kwargs)
+        form = context['form']
+        compaction = form.compaction
+        context['policy_count'] = len(form.policies)
+        if compaction is not None:
+            context['compacted_count'] = len(compaction.policies)
+            context['dropped'] = [
+                {'kind': finding.kind,
+                 'policy': POLICY_DISPLAY % finding.policy,
+                 'priority': finding.policy['priority'],
+                 'other_priority': finding.other['priority']}
+                for finding in compaction.dropped]
+            context['merges'] = [
+                {'priority': merge.policy['priority'],
+                 'other_priority': merge.other['priority'],
+                 'other': POLICY_DISPLAY % merge.other,
+                 'field': merge.field,
+                 'value': merge.value}
+                for merge in compaction.merges]
+        return context
+
+
+class AnalyzeView(tables.DataTableView):
+    table_class = project_tables.PolicyFindingsTable
+    template_name = 'project/connections/tenant_policies/analyze.html'
+    page_title = _("Tenant Policy Analysis")
+
+    def get_data(self):
+        try:
+            policies = neutron.tenantpolicy_list(
+                self.request, **{'tenant_id': self.request.user.project_id})
+            findings = tenantpolicy.analyze(policies)
+        except Exception:
+            exceptions.handle(self.request,
+                              _('Unable to analyze tenant policies.'))
+            return []
+        return [{'id': index,
+                 'kind': finding.kind,
+                 'priority': finding.policy['priority'],
+                 'policy': POLICY_DISPLAY % finding.policy,
+                 'other_priority': finding.other['priority'],
+                 'other': POLICY_DISPLAY % finding.other}
+                for index, finding in enumerate(findings)]
@@ -17,3 +17,19 @@ from oslotest import base
 class TestCase(base.BaseTestCase):
 
     """Test case base class for all unit tests."""
+
+
+class DictCache(object):
+    """Stand-in for the Django cache API, backed by a dict."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
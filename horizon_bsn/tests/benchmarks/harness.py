@@ -0,0 +1,156 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Timing, memory and baseline helpers shared by the benchmarks."""
+
+import gc
+import json
+import os
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2, peak memory is not measured
+    tracemalloc = None
+
+# a result regresses when its p95 is more than TOLERANCE times, and
+# SLACK seconds above, its baseline, or when it makes more backend calls
+TOLERANCE = 1.5
+SLACK = 0.005
+MEMORY_TOLERANCE = 1.5
+
+
+def percentile(values, fraction):
+    """Return the value below which fraction of the values fall."""
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def peak_memory(func):
+    """Return the peak memory allocated by func, in KiB, or None."""
+    if tracemalloc is None:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak // 1024
+
+
+def measure(func, repeat=10, warmup=1, setup=None, calls=None,
+            memory=True):
+    """Time func and return its result summary.
+
+    :param func: callable to time
+    :param repeat: timed runs
+    :param warmup: untimed runs first, filling caches and imports
+    :param setup: callable run, untimed, before every run
+    :param calls: callable returning the backend calls made so far
+    :param memory: measure peak memory with one more run
+    :returns: dict with p50, p95, min and max seconds, calls per run and
+        peak_kib
+    """
+    for _i in range(warmup):
+        if setup:
+            setup()
+        func()
+    timings = []
+    made = 0
+    for _i in range(repeat):
+        if setup:
+            setup()
+        before = calls() if calls else 0
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+        made += (calls() - before) if calls else 0
+    result = {'p50': percentile(timings, 0.5),
+              'p95': percentile(timings, 0.95),
+              'min': min(timings),
+              'max': max(timings),
+              'calls': made // repeat if calls else None,
+              'peak_kib': None}
+    if memory:
+        if setup:
+            setup()
+        result['peak_kib'] = peak_memory(func)
+    return result
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(path, results):
+    """Merge results into the baselines stored at path."""
+    baselines = load_baselines(path)
+    for name, result in results.items():
+        baselines[name] = dict((key, result[key])
+                               for key in ('p95', 'calls', 'peak_kib'))
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def regressions(name, result, baselines):
+    """Return the ways result regressed from its baseline.
+
+    A result without a baseline has nothing to regress from; callers warn
+    about it, see missing_baseline().
+    """
+    baseline = baselines.get(name)
+    if not baseline:
+        return []
+    found = []
+    if result['p95'] > baseline['p95'] * TOLERANCE + SLACK:
+        found.append('p95 %.1fms, baseline %.1fms' %
+                     (result['p95'] * 1000, baseline['p95'] * 1000))
+    if result['calls'] is not None and baseline.get('calls') is not None \
+            and result['calls'] > baseline['calls']:
+        found.append('%d backend calls, baseline %d' %
+                     (result['calls'], baseline['calls']))
+    if result['peak_kib'] and baseline.get('peak_kib') and \
+            result['peak_kib'] > baseline['peak_kib'] * MEMORY_TOLERANCE:
+        found.append('peak %dKiB, baseline %dKiB' %
+                     (result['peak_kib'], baseline['peak_kib']))
+    return found
+
+
+def missing_baseline(name, baselines):
+    """Return a warning when name has no baseline, else None."""
+    if baselines.get(name):
+        return None
+    return ('WARNING %s has no baseline, it is not checked for '
+            'regressions' % name)
+
+
+def format_result(name, result):
+    calls = '-' if result['calls'] is None else result['calls']
+    peak = '-' if result['peak_kib'] is None else '%dKiB' % result['peak_kib']
+    return '%-48s p50 %8.2fms  p95 %8.2fms  calls %4s  peak %s' % (
+        name, result['p50'] * 1000, result['p95'] * 1000, calls, peak)
+
+
+def update_requested():
+    """Whether this run records its results as the new baselines."""
+    return os.environ.get('BSN_BENCH_UPDATE') == '1'
@@ -0,0 +1,267 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Micro-benchmarks of the pure-Python hot paths.
+
+Times, over synthetic inputs of growing size:
+
+* neutron.convert_to_cli and neutron.convert_logicalpath_to_cli, run on
+  every reachability test detail view,
+* AddTenantPolicy.populate_priority_choices, run on every render of the
+  Add Tenant Policy form,
+* the reachability test and tenant policy filter actions,
+* the resource parsing of get_stack_topology, run on every Connections
+  index render.
+
+For each benchmark the time per size and the growth exponent between the
+smallest and the largest size are printed (about 1.0 for linear work),
+the results are written to --output, and the run fails when a result
+regresses past micro_baselines.json. Results without a baseline there are
+only warned about: record the baselines on the machine the benchmarks
+run on, then run them::
+
+    tox -e bench -- --update
+    tox -e bench
+
+--sizes changes the input sizes.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+
+import six
+
+from horizon_bsn.tests.benchmarks import harness
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'micro_baselines.json')
+SIZES = (10, 100, 1000, 10000)
+# the priority range of tenant policies
+MAX_POLICIES = 3000
+TENANT_ID = 'demo'
+
+# fake backends patched in by the benchmark being run
+_fixtures = []
+
+
+class _User(object):
+    tenant_id = project_id = TENANT_ID
+
+
+class _Request(object):
+    user = _User()
+    META = {}
+    session = {}
+
+
+class _Table(object):
+    request = _Request()
+
+
+class _Form(object):
+    pass
+
+
+def _setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                          'horizon_bsn.tests.benchmarks.settings')
+    import django
+    django.setup()
+
+
+def _backends(neutron=None, heat=None):
+    from horizon_bsn.tests import fake_backends
+
+    backends = fake_backends.FakeBackends(neutron, heat)
+    backends.setUp()
+    _fixtures.append(backends)
+    return backends
+
+
+def _cleanup():
+    while _fixtures:
+        _fixtures.pop().cleanUp()
+
+
+def bench_convert_to_cli(size):
+    from horizon_bsn.api import neutron
+
+    detail = [{'path-index': i // 8, 'hop-index': i % 8,
+               'hop-name': 'leaf%d-eth%d' % (i, i % 48)}
+              for i in range(size)]
+    return lambda: neutron.convert_to_cli(detail)
+
+
+def bench_convert_logicalpath_to_cli(size):
+    from horizon_bsn.api import neutron
+
+    path = [{'hop-index': i, 'hop': 'segment%d' % i,
+             'ingress-interface-name': 'if%d' % i, 'policy': 'permit any',
+             'route': '10.%d.0.0/16' % (i % 256),
+             'egress-interface-name': 'if%d' % (i + 1)}
+            for i in range(size)]
+    return lambda: neutron.convert_logicalpath_to_cli(path)
+
+
+def bench_populate_priority_choices(size):
+    from horizon_bsn.content.connections.tenant_policies import forms
+    from horizon_bsn.tests import fake_backends
+
+    neutron = fake_backends.FakeNeutronClient()
+    neutron.seed_tenantpolicies(min(size, MAX_POLICIES), tenant_id=TENANT_ID)
+    _backends(neutron)
+    populate = six.get_unbound_function(
+        forms.AddTenantPolicy.populate_priority_choices)
+    return lambda: populate(_Form(), _Request())
+
+
+def bench_reachabilitytest_filter(size):
+    from horizon_bsn.api import neutron as bsnneutron
+    from horizon_bsn.tests import fake_backends
+
+    neutron = fake_backends.FakeNeutronClient()
+    neutron.seed_reachabilitytests(size, tenant_id=TENANT_ID)
+    _backends(neutron)
+    return lambda: bsnneutron.reachabilitytest_search(
+        _Request(), 'src:10.0.0.0/8 segment:web1 test',
+        tenant_id=TENANT_ID)
+
+
+def _tenantpolicy_filter(size):
+    from horizon_bsn.content.connections.tenant_policies import tables
+    from horizon_bsn.tests import fake_backends
+
+    neutron = fake_backends.FakeNeutronClient()
+    neutron.seed_tenantpolicies(size, tenant_id=TENANT_ID)
+    policies = neutron.list_tenantpolicies()['tenantpolicies']
+    action = tables.RandomFilterAction()
+    return lambda: action.filter(_Table(), policies,
+                                 'action:deny dst:192.168.0.0/16')
+
+
+def bench_tenantpolicy_filter(size):
+    """Filter with the index of the tenant already built."""
+    return _tenantpolicy_filter(size)
+
+
+def bench_tenantpolicy_filter_cold(size):
+    """Filter right after a policy change, building the index."""
+    from horizon_bsn.api import tenantpolicy_search
+
+    run = _tenantpolicy_filter(size)
+
+    def cold():
+        tenantpolicy_search.invalidate(TENANT_ID)
+        run()
+    return cold
+
+
+def bench_stack_topology(size):
+    from horizon_bsn.api import stack_topology
+    from horizon_bsn.tests import fake_backends
+
+    neutron = fake_backends.FakeNeutronClient()
+    heat = fake_backends.FakeHeatClient(tenant_id=TENANT_ID)
+    stack = heat.add_stack('auto-three tier', subnets=size)
+    neutron.seed_networktemplate(tenant_id=TENANT_ID, stack_id=stack.id)
+    _backends(neutron, heat)
+    # a new request each time, as the lookups are cached per request
+    return lambda: stack_topology.get_stack_topology(_Request())
+
+
+BENCHMARKS = (bench_convert_to_cli,
+              bench_convert_logicalpath_to_cli,
+              bench_populate_priority_choices,
+              bench_reachabilitytest_filter,
+              bench_tenantpolicy_filter,
+              bench_tenantpolicy_filter_cold,
+              bench_stack_topology)
+
+
+def growth(small, large):
+    """Return k where the time grew as size ** k between two results."""
+    (n1, t1), (n2, t2) = small, large
+    if n1 == n2 or t1 <= 0 or t2 <= 0:
+        return None
+    return math.log(t2 / t1) / math.log(float(n2) / n1)
+
+
+def run(sizes, names=None):
+    """Run the benchmarks and return their results by name."""
+    results = {}
+    for benchmark in BENCHMARKS:
+        name = benchmark.__name__[len('bench_'):]
+        if names and name not in names:
+            continue
+        timings = []
+        for size in sizes:
+            func = benchmark(size)
+            # enough runs for stable numbers, without waiting on big sizes
+            repeat = max(5, min(100, 20000 // size))
+            try:
+                result = harness.measure(func, repeat=repeat, memory=False)
+            finally:
+                _cleanup()
+            key = '%s/n=%d' % (name, size)
+            results[key] = result
+            timings.append((size, result['p50']))
+            print(harness.format_result(key, result))
+        exponent = growth(timings[0], timings[-1])
+        if exponent is not None:
+            print('%-48s grows as n^%.2f' % (name, exponent))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help="comma separated input sizes")
+    parser.add_argument('--only', action='append',
+                        help="run only this benchmark, e.g. convert_to_cli")
+    parser.add_argument('--output', help="write the results to this file")
+    parser.add_argument('--update', action='store_true',
+                        help="record the results as the new baselines")
+    args = parser.parse_args(argv)
+    _setup_django()
+
+    results = run([int(size) for size in args.sizes.split(',')], args.only)
+    if args.output:
+        directory = os.path.dirname(os.path.abspath(args.output))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.update:
+        harness.save_baselines(BASELINE_FILE, results)
+        return 0
+    baselines = harness.load_baselines(BASELINE_FILE)
+    failed = False
+    missing = False
+    for name in sorted(results):
+        warning = harness.missing_baseline(name, baselines)
+        if warning:
+            print(warning)
+            missing = True
+        for problem in harness.regressions(name, results[name], baselines):
+            print('REGRESSION %s: %s' % (name, problem))
+            failed = True
+    if missing:
+        print('Record the missing baselines with --update')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Django settings of the view benchmarks.
+
+The Horizon test settings, with the horizon-bsn panels enabled.
+"""
+
+from openstack_dashboard.test.settings import *  # noqa
+from openstack_dashboard.utils import settings as dashboard_settings
+
+import horizon_bsn.enabled
+import openstack_dashboard.enabled
+
+ROOT_URLCONF = 'openstack_dashboard.urls'
+
+_apps = []
+dashboard_settings.update_dashboards(
+    [openstack_dashboard.enabled, horizon_bsn.enabled],
+    HORIZON_CONFIG, _apps)  # noqa
+# application labels must stay unique
+INSTALLED_APPS = ([app for app in _apps if app not in INSTALLED_APPS]  # noqa
+                  + list(INSTALLED_APPS))  # noqa
+
+# the benchmarks time the views, not the debug machinery
+DEBUG = False
+TEMPLATE_DEBUG = False
+
+# backend calls of the views, see horizon_bsn.api.callbudget; budgeted
+# views fail the benchmarks when they go over budget or repeat a call
+MIDDLEWARE_CLASSES = tuple(MIDDLEWARE_CLASSES) + (  # noqa
+    'horizon_bsn.api.callbudget.CallBudgetMiddleware',)
+# Budgets are the neutron and heat calls of the seeded fake backends,
+# counted in the views' current code. Tabs loaded on their own go to the
+# index view. Not budgeted: views whose calls grow with their input, the
+# tenant policy import and compact, and network_template:remove, which
+# polls the stack while it is deleted.
+BSN_CALL_BUDGETS = {
+    # stack topology (4), tests, routers, policies
+    'horizon:project:connections:index': 7,
+    'horizon:project:connections:reachability_tests:detail': 1,
+    'horizon:project:connections:tenant_policies:analyze': 1,
+    'horizon:project:connections:tenant_policies:export': 1,
+    'horizon:project:connections:tenant_policies:match': 1,
+    # GET: template and assignment; POST adds the template validation,
+    # assignment create and update and the stack create
+    'horizon:project:connections:network_template:apply': 7,
+    'horizon:project:connections:network_template:populate_template': 7,
+    'horizon:project:connections:network_template:select': 2,
+}
+BSN_CALL_BUDGET_ENFORCE = True
@@ -0,0 +1,196 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""End-to-end latency of the Connections panel views and REST endpoints.
+
+Every view is driven through the Django test client against the
+in-memory backends of horizon_bsn.tests.fake_backends, seeded at several
+data sizes. For each view and size the p50 and p95 latency, the backend
+calls per request and the peak memory are printed, and the run fails
+when a result regresses past view_baselines.json. Results without a
+baseline there are only warned about: record the baselines on the
+machine the benchmarks run on, then run them::
+
+    BSN_BENCH_UPDATE=1 tox -e bench-views
+    tox -e bench-views
+
+or, in an environment with Horizon installed::
+
+    django-admin test horizon_bsn.tests.benchmarks.views \\
+        --settings=horizon_bsn.tests.benchmarks.settings
+
+BSN_BENCH_UPDATE=1 records the results as the new baselines,
+BSN_BENCH_SIZES=10,1000 changes the number of reachability tests,
+BSN_BENCH_LATENCY=0.002 delays every backend call, and
+BSN_BENCH_REPEAT sets the timed runs per view.
+"""
+
+import json
+import os
+
+from django.core.urlresolvers import reverse
+from openstack_dashboard.test import helpers
+
+import horizon_bsn.api.rest  # noqa
+from horizon_bsn.tests.benchmarks import harness
+from horizon_bsn.tests import fake_backends
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'view_baselines.json')
+SIZES = [int(size) for size in
+         os.environ.get('BSN_BENCH_SIZES', '10,1000,20000').split(',')]
+POLICIES = 3000
+LATENCY = float(os.environ.get('BSN_BENCH_LATENCY', '0'))
+REPEAT = int(os.environ.get('BSN_BENCH_REPEAT', '10'))
+TEMPLATE_PARAMETERS = {'out_net_name': 'web', 'out_net_cidr': '10.1.0.0/24',
+                       'mid_net_name': 'app', 'mid_net_cidr': '10.2.0.0/24',
+                       'inner_net_name': 'db',
+                       'inner_net_cidr': '10.3.0.0/24'}
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+class ViewBenchmarks(helpers.TestCase):
+
+    results = {}
+    baselines = harness.load_baselines(BASELINE_FILE)
+
+    @classmethod
+    def tearDownClass(cls):
+        if harness.update_requested():
+            harness.save_baselines(BASELINE_FILE, cls.results)
+        super(ViewBenchmarks, cls).tearDownClass()
+
+    def setUp(self):
+        super(ViewBenchmarks, self).setUp()
+        self.tenant_id = self.request.user.tenant_id
+
+    def _backends(self, tests=0, policies=POLICIES):
+        """Install fake backends seeded with tests and policies."""
+        neutron = fake_backends.FakeNeutronClient(latency=LATENCY)
+        heat = fake_backends.FakeHeatClient(latency=LATENCY,
+                                            tenant_id=self.tenant_id)
+        neutron.seed_reachabilitytests(tests, tenant_id=self.tenant_id)
+        neutron.seed_tenantpolicies(policies, tenant_id=self.tenant_id)
+        neutron.seed_routers(3, tenant_id=self.tenant_id)
+        stack = heat.add_stack('auto-three tier')
+        neutron.seed_networktemplate(tenant_id=self.tenant_id,
+                                     stack_id=stack.id)
+        backends = fake_backends.FakeBackends(neutron, heat)
+        backends.setUp()
+        self.addCleanup(backends.cleanUp)
+        return backends
+
+    def _bench(self, name, func, setup=None):
+        backends = self._current
+
+        def calls():
+            made = sum(backends.neutron.calls.values())
+            return made + sum(backends.heat.calls.values())
+
+        result = harness.measure(func, repeat=REPEAT, setup=setup,
+                                 calls=calls)
+        print(harness.format_result(name, result))
+        self.results[name] = result
+        if harness.update_requested():
+            return
+        warning = harness.missing_baseline(name, self.baselines)
+        if warning:
+            print('%s, record it with BSN_BENCH_UPDATE=1' % warning)
+        problems = harness.regressions(name, result, self.baselines)
+        self.assertEqual([], problems, '%s regressed' % name)
+
+    def _get(self, url, status=200, **extra):
+        def get():
+            response = self.client.get(url, **extra)
+            self.assertEqual(status, response.status_code)
+        return get
+
+    def test_connections_index(self):
+        url = reverse('horizon:project:connections:index')
+
+        def search():
+            # server side table filters are posted with the table form
+            response = self.client.post(
+                url, {'reachabilitytests__filter__q': 'result:pass'})
+            self.assertEqual(200, response.status_code)
+
+        for size in SIZES:
+            self._current = self._backends(tests=size)
+            self._bench('index/tests=%d' % size, self._get(url))
+            self._bench('index/tests=%d/search' % size, search)
+
+    def test_reachabilitytest_detail(self):
+        for size in SIZES:
+            self._current = self._backends(tests=size)
+            test = self._current.neutron.list_reachabilitytests(
+                test_result='pass')['reachabilitytests'][0]
+            url = reverse('horizon:project:connections:reachability_tests:'
+                          'detail', args=[test['id']])
+            self._bench('detail/tests=%d' % size, self._get(url))
+
+    def test_network_template_apply(self):
+        self._current = backends = self._backends()
+        template = backends.neutron.list_networktemplates()[
+            'networktemplates'][0]
+        url = reverse('horizon:project:connections:network_template:apply',
+                      args=[template['id']])
+
+        def unassigned():
+            for assign in backends.neutron.list_networktemplateassignments()[
+                    'networktemplateassignments']:
+                backends.neutron.delete_networktemplateassignment(
+                    assign['id'])
+            backends.heat._stacks.clear()
+            backends.neutron.reset_calls()
+            backends.heat.reset_calls()
+
+        def apply_template():
+            self.client.get(url)
+            response = self.client.post(url, TEMPLATE_PARAMETERS)
+            self.assertEqual(302, response.status_code)
+
+        self._bench('network_template/apply', apply_template,
+                    setup=unassigned)
+
+    def test_rest_endpoints(self):
+        for size in SIZES:
+            self._current = backends = self._backends(tests=size)
+            ids = [test['id'] for test in
+                   backends.neutron.list_reachabilitytests()[
+                       'reachabilitytests'][:50]]
+            self._bench('rest/reachabilitytests/tests=%d' % size,
+                        self._get('/api/neutron/reachabilitytests/', **AJAX))
+            self._bench('rest/reachabilitytests?q/tests=%d' % size,
+                        self._get('/api/neutron/reachabilitytests/'
+                                  '?q=src:10.0.0.0/8%20result:pass', **AJAX))
+            status_url = '/api/neutron/reachabilityteststatus/?%s' % (
+                '&'.join('id=%s' % i for i in ids))
+            self._bench('rest/reachabilityteststatus/tests=%d' % size,
+                        self._get(status_url, **AJAX))
+        flows = [{'source': '10.0.%d.1' % (i % 256),
+                  'destination': '192.168.%d.1' % (i % 256),
+                  'protocol': 'tcp', 'destination_port': 443}
+                 for i in range(200)]
+
+        def match():
+            response = self.client.post(
+                '/api/neutron/tenantpolicies/match/',
+                json.dumps({'flows': flows}),
+                content_type='application/json', **AJAX)
+            self.assertEqual(200, response.status_code)
+
+        self._bench('rest/tenantpolicies/match/policies=%d' % POLICIES,
+                    match)
+        self._bench('rest/tenantpolicies/compaction/policies=%d' % POLICIES,
+                    self._get('/api/neutron/tenantpolicies/compaction/',
+                              **AJAX))
@@ -0,0 +1,395 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-memory neutron BSN extension and heat backends.
+
+FakeNeutronClient answers the neutronclient calls made by
+horizon_bsn.api.neutron and by the openstack_dashboard router calls;
+FakeHeatClient answers the heatclient calls made by the network template
+code. Both keep their objects in memory, can be seeded with tens of
+thousands of objects, count every call and may delay every call by a
+fixed latency, so the plugin can be exercised at scale without services::
+
+    neutron = fake_backends.FakeNeutronClient(latency=0.002)
+    neutron.seed_reachabilitytests(20000, tenant_id='demo')
+    heat = fake_backends.FakeHeatClient()
+    self.useFixture(fake_backends.FakeBackends(neutron, heat))
+    ...
+    neutron.calls['list_reachabilitytests']
+"""
+
+import collections
+import copy
+import itertools
+import os
+import threading
+import time
+import uuid
+
+import fixtures
+from heatclient import exc as heat_exceptions
+from neutronclient.common import exceptions as neutron_exceptions
+import six
+import yaml
+
+# resource name, and its plural as used by the API and in list responses
+RESOURCES = (('reachabilitytest', 'reachabilitytests'),
+             ('reachabilityquicktest', 'reachabilityquicktests'),
+             ('networktemplate', 'networktemplates'),
+             ('networktemplateassignment', 'networktemplateassignments'),
+             ('tenantpolicy', 'tenantpolicies'),
+             ('router', 'routers'))
+_TESTS = ('reachabilitytest', 'reachabilityquicktest')
+SAMPLE_TEMPLATE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'content', 'connections', 'sample_heat_templates', 'basic_3tier.yaml')
+EXPECTED_RESULTS = ('reached destination', 'dropped by route',
+                    'dropped by policy', 'dropped by security group',
+                    'dropped due to private segment')
+
+
+class _Backend(object):
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.calls = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+
+def _neutron_method(action, resource, plural):
+    def method(self, *args, **kwargs):
+        self._call(name)
+        return getattr(self, '_' + action)(resource, plural, *args,
+                                           **kwargs)
+    name = '%s_%s' % (action, plural if action == 'list' else resource)
+    method.__name__ = str(name)
+    return name, method
+
+
+class FakeNeutronClient(_Backend):
+    """neutronclient.v2_0.client.Client for the BSN extension resources.
+
+    list_<plural>(**filters), show_<resource>(id), create_<resource>(body),
+    update_<resource>(id, body) and delete_<resource>(id) exist for every
+    resource in RESOURCES. Lists filter on any field, a list value
+    matching any of its items, and honour fields=[...].
+
+    :param latency: seconds every call is delayed
+    :param run_duration: seconds a reachability test run stays pending
+    """
+
+    def __init__(self, latency=0, run_duration=0):
+        super(FakeNeutronClient, self).__init__(latency)
+        self.run_duration = run_duration
+        self._objects = dict((resource, collections.OrderedDict())
+                             for resource, _plural in RESOURCES)
+
+    def _get(self, resource, obj_id):
+        obj = self._objects[resource].get(obj_id)
+        if obj is None:
+            raise neutron_exceptions.NotFound(
+                message="%s %s could not be found" % (resource, obj_id))
+        if resource in _TESTS:
+            self._finish_run(obj)
+        return obj
+
+    def _finish_run(self, test):
+        if '_done_at' in test and test['_done_at'] <= time.time():
+            del test['_done_at']
+            test['test_result'] = 'pass'
+            test['detail'] = [{'path-index': 1, 'hop-index': hop,
+                               'hop-name': 'leaf%d' % hop}
+                              for hop in (1, 2)]
+            test['logical_path'] = [{'hop-index': 1, 'hop': 'router',
+                                     'ingress-interface-name': 'web',
+                                     'policy': 'permit any',
+                                     'route': '0.0.0.0/0',
+                                     'egress-interface-name': 'app'}]
+
+    @staticmethod
+    def _public(obj, fields=None):
+        return dict((key, copy.copy(value)) for key, value in obj.items()
+                    if not key.startswith('_')
+                    if not fields or key in fields)
+
+    def _list(self, resource, plural, **params):
+        fields = params.pop('fields', None)
+        if isinstance(fields, six.string_types):
+            fields = [fields]
+        objects = self._objects[resource]
+        if 'id' in params:
+            ids = params.pop('id')
+            ids = ids if isinstance(ids, (list, tuple, set)) else [ids]
+            candidates = [objects[i] for i in ids if i in objects]
+        else:
+            candidates = list(objects.values())
+        result = []
+        for obj in candidates:
+            if resource in _TESTS:
+                self._finish_run(obj)
+            for key, wanted in params.items():
+                value = obj.get(key)
+                if isinstance(wanted, (list, tuple, set)):
+                    if value not in wanted:
+                        break
+                elif value != wanted:
+                    break
+            else:
+                result.append(self._public(obj, fields))
+        return {plural: result}
+
+    def _show(self, resource, plural, obj_id, **params):
+        return {resource: self._public(self._get(resource, obj_id))}
+
+    def _create(self, resource, plural, body):
+        return {resource: self._public(self.add(resource, **body[resource]))}
+
+    def _update(self, resource, plural, obj_id, body):
+        with self._lock:
+            obj = self._get(resource, obj_id)
+            fields = dict(body[resource])
+            if fields.pop('run_test', False) and resource in _TESTS:
+                fields.update(test_result='pending',
+                              test_time=time.strftime('%Y-%m-%d %H:%M:%S'),
+                              _done_at=time.time() + self.run_duration)
+            obj.update(fields)
+            if resource in _TESTS:
+                self._finish_run(obj)
+        return {resource: self._public(obj)}
+
+    def _delete(self, resource, plural, obj_id):
+        with self._lock:
+            self._get(resource, obj_id)
+            del self._objects[resource][obj_id]
+
+    def add(self, resource, **fields):
+        """Store an object without counting a call; returns it."""
+        obj = dict(fields)
+        if resource == 'networktemplateassignment':
+            # assignments are looked up by the id of their tenant
+            obj.setdefault('id', obj.get('tenant_id'))
+        obj.setdefault('id', str(uuid.uuid4()))
+        if resource in _TESTS:
+            obj.setdefault('test_result', None)
+            obj.setdefault('test_time', None)
+            obj.setdefault('detail', None)
+            obj.setdefault('logical_path', None)
+            obj.pop('run_test', None)
+        self._objects[resource][obj['id']] = obj
+        return obj
+
+    def count(self, resource):
+        return len(self._objects[resource])
+
+    def seed_reachabilitytests(self, count, tenant_id='demo', run=True):
+        """Add count reachability tests; every other one has been run."""
+        for i in range(count):
+            test = self.add(
+                'reachabilitytest', tenant_id=tenant_id,
+                name='test-%05d' % i, src_tenant_id=tenant_id,
+                src_tenant_name=tenant_id, src_segment_id='segment-%d' % (
+                    i % 20), src_segment_name='web%d' % (i % 20),
+                src_ip='10.%d.%d.%d' % (i % 200, i // 256 % 256, i % 256),
+                dst_ip='10.200.%d.%d' % (i // 256 % 256, i % 256),
+                expected_result=EXPECTED_RESULTS[i % len(EXPECTED_RESULTS)])
+            if run and i % 2 == 0:
+                test['_done_at'] = 0
+                test['test_time'] = '2016-01-01 00:00:00'
+                self._finish_run(test)
+
+    def seed_tenantpolicies(self, count, tenant_id='demo'):
+        """Add count tenant policies with distinct priorities."""
+        actions = itertools.cycle(('permit', 'deny', 'permit'))
+        for i in range(count):
+            self.add('tenantpolicy', tenant_id=tenant_id, priority=i + 1,
+                     source='10.%d.%d.0/24' % (i // 256 % 256, i % 256),
+                     source_port=0,
+                     destination='any' if i % 3 else '192.168.%d.0/24' % (
+                         i % 256),
+                     destination_port=443 if i % 5 == 0 else 0,
+                     protocol='tcp' if i % 5 == 0 else '',
+                     action=next(actions), nexthops=[])
+
+    def seed_networktemplate(self, tenant_id='demo', stack_id=None,
+                             name='three tier'):
+        """Add the sample template, assigned to tenant_id if stack_id."""
+        with open(SAMPLE_TEMPLATE) as f:
+            template = self.add('networktemplate', name=name, body=f.read())
+        if stack_id:
+            self.add('networktemplateassignment', tenant_id=tenant_id,
+                     template_id=template['id'], stack_id=stack_id)
+        return template
+
+    def seed_routers(self, count, tenant_id='demo'):
+        for i in range(count):
+            self.add('router', tenant_id=tenant_id, name='router-%d' % i,
+                     status='ACTIVE', admin_state_up=True,
+                     external_gateway_info=None)
+
+
+for _resource, _plural in RESOURCES:
+    for _action in ('list', 'show', 'create', 'update', 'delete'):
+        _name, _method = _neutron_method(_action, _resource, _plural)
+        setattr(FakeNeutronClient, _name, _method)
+
+
+class _HeatObject(object):
+    """Attribute access like heatclient's Resource."""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+class _Stacks(object):
+
+    def __init__(self, client):
+        self.client = client
+
+    def list(self, **params):
+        self.client._call('stacks.list')
+        tenant_id = params.get('tenant_id')
+        return [stack for stack in self.client._stacks.values()
+                if tenant_id is None or stack.tenant_id == tenant_id]
+
+    def get(self, stack_id):
+        self.client._call('stacks.get')
+        return self.client._stack(stack_id)
+
+    def create(self, stack_name, template=None, parameters=None, **kwargs):
+        self.client._call('stacks.create')
+        stack = self.client.add_stack(stack_name, template=template,
+                                      parameters=parameters)
+        return {'stack': {'id': stack.id, 'links': []}}
+
+    def delete(self, stack_id):
+        self.client._call('stacks.delete')
+        stack = self.client._stack(stack_id)
+        del self.client._stacks[stack.id]
+        self.client._resources.pop(stack.id, None)
+
+    def validate(self, template=None, **kwargs):
+        self.client._call('stacks.validate')
+        parsed = yaml.safe_load(template) or {}
+        parameters = {}
+        for name, spec in (parsed.get('parameters') or {}).items():
+            parameters[name] = {'Type': spec.get('type', 'string').title(),
+                                'Label': spec.get('label', name),
+                                'Description': spec.get('description', ''),
+                                'NoEcho': 'false'}
+            if 'default' in spec:
+                parameters[name]['Default'] = spec['default']
+        return {'Description': parsed.get('description', ''),
+                'Parameters': parameters}
+
+
+class _Resources(object):
+
+    def __init__(self, client):
+        self.client = client
+
+    def list(self, stack_id, **params):
+        self.client._call('resources.list')
+        return list(self.client._resources.get(
+            self.client._stack(stack_id).id, ()))
+
+
+class FakeHeatClient(_Backend):
+    """heatclient.v1.client.Client for stacks, resources and validate.
+
+    :param latency: seconds every call is delayed
+    :param tenant_id: tenant of the stacks created through the client
+    """
+
+    def __init__(self, latency=0, tenant_id='demo'):
+        super(FakeHeatClient, self).__init__(latency)
+        self.tenant_id = tenant_id
+        self.stacks = _Stacks(self)
+        self.resources = _Resources(self)
+        self._stacks = collections.OrderedDict()
+        self._resources = {}
+
+    def _stack(self, stack_id):
+        stack = self._stacks.get(stack_id)
+        if stack is None:
+            # stacks are found by name as well
+            for stack in self._stacks.values():
+                if stack.stack_name == stack_id:
+                    return stack
+            raise heat_exceptions.HTTPNotFound(
+                "Stack %s could not be found" % stack_id)
+        return stack
+
+    def add_stack(self, stack_name, subnets=3, tenant_id=None, **fields):
+        """Add a stack of a router with subnets interfaces; returns it."""
+        stack = _HeatObject(id=str(uuid.uuid4()), stack_name=stack_name,
+                            tenant_id=tenant_id or self.tenant_id,
+                            stack_status='CREATE_COMPLETE',
+                            stack_status_reason='', **fields)
+        self._stacks[stack.id] = stack
+        router = str(uuid.uuid4())
+        resources = [_HeatObject(resource_name='router',
+                                 resource_type='OS::Neutron::Router',
+                                 physical_resource_id=router,
+                                 resource_status='CREATE_COMPLETE')]
+        for i in range(subnets):
+            subnet = str(uuid.uuid4())
+            resources.append(_HeatObject(
+                resource_name='subnet%d' % i,
+                resource_type='OS::Neutron::Subnet',
+                physical_resource_id=subnet,
+                resource_status='CREATE_COMPLETE'))
+            resources.append(_HeatObject(
+                resource_name='interface%d' % i,
+                resource_type='OS::Neutron::RouterInterface',
+                physical_resource_id='%s:subnet_id=%s' % (router, subnet),
+                resource_status='CREATE_COMPLETE'))
+        self._resources[stack.id] = resources
+        return stack
+
+
+class FakeBackends(fixtures.Fixture):
+    """Route the neutron and heat clients of Horizon to the fakes."""
+
+    def __init__(self, neutron=None, heat=None):
+        super(FakeBackends, self).__init__()
+        self.neutron = neutron or FakeNeutronClient()
+        self.heat = heat or FakeHeatClient()
+
+    def setUp(self):
+        super(FakeBackends, self).setUp()
+
+        def neutronclient(request):
+            return self.neutron
+
+        def heatclient(request, password=None):
+            return self.heat
+
+        for name, value in (
+                ('openstack_dashboard.api.neutron.neutronclient',
+                 neutronclient),
+                ('horizon_bsn.api.neutron.neutronclient', neutronclient),
+                ('openstack_dashboard.api.heat.heatclient', heatclient)):
+            self.useFixture(fixtures.MonkeyPatch(name, value))
@@ -0,0 +1,297 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-process stand-in for the BSN controller REST API.
+
+Serves ``/api/v1/auth/login`` and a JSON data tree under
+``/api/v1/data/controller/`` over HTTPS with keep-alive connections, so
+rest_lib can be tested and benchmarked without a controller::
+
+    with fake_controller.FakeController(latency=0.005) as controller:
+        controller.data['core']['switch'] = [{'name': 'leaf1'}]
+        pool = rest_lib.ConnectionPool(context=controller.client_context())
+        rest_lib.request('core/switch', host=controller.address,
+                         cookie=controller.login(), connection_pool=pool)
+
+The controller:
+
+* checks session cookies handed out by the login URL, answering 401 for
+  unknown or expired sessions,
+* returns a Floodlight-Verify-Path hash of every GET body, and 304 when
+  the request carries the current hash,
+* delays every response by latency seconds,
+* answers with injected errors, either the next ones (inject_error) or a
+  random fraction (error_rate).
+
+It runs standalone for load generation against a fixed port::
+
+    python -m horizon_bsn.tests.fake_controller --port 8443 --latency 0.01
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import ssl
+import threading
+import time
+import uuid
+
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+from six.moves.urllib import parse
+
+CERT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'fake_controller.pem')
+LOGIN_PATH = '/api/v1/auth/login'
+DATA_PATH = '/api/v1/data/controller/'
+HASH_HEADER = 'Floodlight-Verify-Path'
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # keep-alive, as the real controller
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None, headers=None):
+        data = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        controller = self.server.controller
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        cookie = None
+        for part in (self.headers.get('Cookie') or '').split(';'):
+            name, _sep, value = part.strip().partition('=')
+            if name == 'session_cookie':
+                cookie = value
+        controller._record(self.command, self.path, cookie)
+        if controller.latency:
+            time.sleep(controller.latency)
+        error = controller._next_error(self.path)
+        if error:
+            return self._reply(error, {'description': 'injected error'})
+        if self.path == LOGIN_PATH and self.command == 'POST':
+            return self._login(body)
+        if not self.path.startswith(DATA_PATH):
+            return self._reply(404, {'description': 'not found'})
+        if controller.users and not controller._valid(cookie):
+            return self._reply(401, {'description': 'authorization '
+                                                    'required'})
+        path = parse.urlparse(self.path).path[len(DATA_PATH):]
+        if self.command == 'GET':
+            return self._get(path)
+        try:
+            value = json.loads(body.decode('utf-8')) if body else None
+        except ValueError:
+            return self._reply(400, {'description': 'invalid JSON'})
+        if not controller._write(self.command, path, value):
+            return self._reply(404, {'description': 'not found'})
+        self._reply(204)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    def _login(self, body):
+        controller = self.server.controller
+        try:
+            credentials = json.loads(body.decode('utf-8'))
+        except ValueError:
+            credentials = {}
+        if controller.users.get(credentials.get('user')) != \
+                credentials.get('password'):
+            return self._reply(401, {'success': False,
+                                     'error_message': 'bad credentials'})
+        self._reply(200, {'success': True,
+                          'session_cookie': controller.login()})
+
+    def _get(self, path):
+        controller = self.server.controller
+        found, value = controller._lookup(path)
+        if not found:
+            return self._reply(404, {'description': 'not found'})
+        data = json.dumps(value, sort_keys=True)
+        digest = hashlib.sha1(data.encode('utf-8')).hexdigest()
+        if self.headers.get(HASH_HEADER) == digest:
+            return self._reply(304, headers={HASH_HEADER: digest})
+        self._reply(200, value, {HASH_HEADER: digest})
+
+
+class FakeController(object):
+    """Fake BSN controller serving requests on a background thread.
+
+    :param port: port to listen on, 0 for any free port
+    :param latency: seconds every response is delayed
+    :param error_rate: fraction of requests answered with error_status
+    :param error_status: status of randomly injected errors
+    :param users: dict of user name to password; when empty, no session
+        is required
+    :param session_lifetime: seconds a session cookie stays valid
+    :param use_ssl: serve HTTPS with the bundled test certificate
+    """
+
+    def __init__(self, port=0, latency=0, error_rate=0, error_status=500,
+                 users=None, session_lifetime=3600, use_ssl=True,
+                 host='127.0.0.1'):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.users = {'admin': 'admin'} if users is None else users
+        self.session_lifetime = session_lifetime
+        self.data = {'core': {'controller': {'role': {'role': 'active'}}}}
+        self.requests = []
+        self._sessions = {}
+        self._errors = []
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.controller = self
+        if use_ssl:
+            context = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_SERVER',
+                                             ssl.PROTOCOL_SSLv23))
+            context.load_cert_chain(CERT_FILE)
+            self._server.socket = context.wrap_socket(self._server.socket,
+                                                      server_side=True)
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def address(self):
+        return '%s:%d' % (self._server.server_address[0], self.port)
+
+    @staticmethod
+    def client_context():
+        """Return an SSL context trusting the test certificate."""
+        return ssl.create_default_context(cafile=CERT_FILE)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        args=(0.05,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def login(self):
+        """Open a session and return its cookie."""
+        cookie = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[cookie] = time.time() + self.session_lifetime
+        return cookie
+
+    def expire_sessions(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def inject_error(self, status=500, count=1, path=None):
+        """Answer the next count requests, to path if given, with status."""
+        with self._lock:
+            self._errors.extend([(status, path)] * count)
+
+    def _next_error(self, path):
+        with self._lock:
+            for i, (status, error_path) in enumerate(self._errors):
+                if error_path is None or path.endswith(error_path):
+                    del self._errors[i]
+                    return status
+        if self.error_rate and random.random() < self.error_rate:
+            return self.error_status
+        return None
+
+    def _record(self, method, path, cookie):
+        with self._lock:
+            self.requests.append((method, path, cookie))
+
+    def _valid(self, cookie):
+        with self._lock:
+            return self._sessions.get(cookie, 0) > time.time()
+
+    def _lookup(self, path):
+        with self._lock:
+            value = self.data
+            for name in filter(None, path.split('/')):
+                if not isinstance(value, dict) or name not in value:
+                    return False, None
+                value = value[name]
+            return True, value
+
+    def _write(self, method, path, value):
+        names = [name for name in path.split('/') if name]
+        if not names:
+            return False
+        with self._lock:
+            parent = self.data
+            for name in names[:-1]:
+                parent = parent.setdefault(name, {})
+                if not isinstance(parent, dict):
+                    return False
+            name = names[-1]
+            if method == 'DELETE':
+                return parent.pop(name, None) is not None
+            if method == 'POST' and isinstance(parent.get(name), list):
+                parent[name].append(value)
+            elif method == 'PATCH' and isinstance(parent.get(name), dict):
+                parent[name].update(value or {})
+            else:
+                parent[name] = value
+            return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--no-ssl', action='store_true')
+    args = parser.parse_args()
+    controller = FakeController(port=args.port, latency=args.latency,
+                                error_rate=args.error_rate,
+                                use_ssl=not args.no_ssl, host='0.0.0.0')
+    print("Fake controller listening on %s (user admin, password admin)" %
+          controller.address)
+    controller.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        controller.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+panel_views
+----------------------------------
+
+Tests building the tables and views of the Connections panel against the
+in-memory backends of horizon_bsn.tests.fake_backends. They need Horizon
+and its test settings, so they are not named test_* and run with::
+
+    tox -e panel-views
+"""
+
+from django.core.urlresolvers import reverse
+from openstack_dashboard.test import helpers
+
+from horizon_bsn.api import neutron
+from horizon_bsn.content.connections.reachability_tests \
+    import tables as reachability_tables
+from horizon_bsn.tests import fake_backends
+
+INDEX_URL = reverse('horizon:project:connections:index')
+
+
+class ReachabilityTestsTableTests(helpers.TestCase):
+
+    def setUp(self):
+        super(ReachabilityTestsTableTests, self).setUp()
+        self.backends = self.useFixture(fake_backends.FakeBackends())
+        self.backends.neutron.seed_reachabilitytests(
+            4, tenant_id=self.request.user.project_id)
+
+    def test_table_builds(self):
+        tests = neutron.reachabilitytest_list(
+            self.request, tenant_id=self.request.user.project_id)
+        table = reachability_tables.ReachabilityTestsTable(self.request,
+                                                           data=tests)
+        self.assertEqual(4, len(table.get_rows()))
+
+    def test_index_filters_tests(self):
+        response = self.client.post(
+            INDEX_URL, {'reachabilitytests__filter__q': 'name:test-00003'})
+        self.assertEqual(200, response.status_code)
+        self.assertContains(response, 'test-00003')
+        self.assertNotContains(response, 'test-00001')
+
+
+class AnalyzeViewTests(helpers.TestCase):
+
+    def setUp(self):
+        super(AnalyzeViewTests, self).setUp()
+        self.backends = self.useFixture(fake_backends.FakeBackends())
+        neutron = self.backends.neutron
+        tenant_id = self.request.user.project_id
+        # priority 20 is made redundant by priority 10
+        for priority, source in ((10, 'any'), (20, '10.0.0.0/24')):
+            neutron.add('tenantpolicy', tenant_id=tenant_id,
+                        priority=priority, source=source, source_port=0,
+                        destination='any', destination_port=0, protocol='',
+                        action='permit', nexthops=[])
+
+    def test_findings_are_listed(self):
+        response = self.client.get(
+            reverse('horizon:project:connections:tenant_policies:analyze'))
+        self.assertEqual(200, response.status_code)
+        findings = response.context['table'].data
+        self.assertEqual([20], [finding['priority'] for finding in findings])
+        self.assertContains(response, '10.0.0.0/24')
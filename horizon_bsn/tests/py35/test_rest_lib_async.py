@@ -0,0 +1,94 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_rest_lib_async
+----------------------------------
+
+Tests for the asyncio BSN controller client, against a local server.
+"""
+
+import asyncio
+
+from horizon_bsn.content.connections.reachability_tests import rest_lib_async
+from horizon_bsn.tests import base
+
+
+class TestAsyncClient(base.TestCase):
+
+    def setUp(self):
+        super(TestAsyncClient, self).setUp()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.connections = 0
+        self.server = self.loop.run_until_complete(asyncio.start_server(
+            self._handle, '127.0.0.1', 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.addCleanup(self._stop)
+        self.client = rest_lib_async.AsyncClient(ssl=False, timeout=5)
+
+    def _stop(self):
+        self.client.close()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b'\r\n':
+                    break
+                if line.lower().startswith(b'content-length'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            path = request_line.split()[1].decode()
+            if path.endswith('slow'):
+                await asyncio.sleep(1)
+            body = ('["%s"]' % path).encode()
+            writer.write(b'HTTP/1.1 200 OK\r\nFloodlight-Verify-Path: h\r\n'
+                         b'Content-Length: %d\r\n\r\n' % len(body) + body)
+            await writer.drain()
+        writer.close()
+
+    def _run(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_concurrent_requests_share_pooled_connections(self):
+        self.client.max_connections = 4
+
+        async def poll():
+            return await asyncio.gather(*[
+                self.client.get(None, 'core/test%d' % i, '127.0.0.1',
+                                self.port)
+                for i in range(20)])
+
+        results = self._run(poll())
+        self.assertEqual((200, 'OK',
+                          b'["/api/v1/data/controller/core/test3"]', 'h'),
+                         results[3])
+        self.assertLessEqual(self.connections, 4)
+        self._run(self.client.get(None, 'core/again', '127.0.0.1', self.port))
+        self.assertEqual(self.connections, self.client.stats['created'])
+
+    def test_timeout_discards_connection(self):
+        self.assertRaises(asyncio.TimeoutError, self._run, self.client.get(
+            None, 'core/slow', '127.0.0.1', self.port, timeout=0.05))
+        self.assertEqual(1, self.client.stats['discarded'])
+        result = self._run(self.client.post(
+            None, 'core/tenant', '127.0.0.1', self.port, '{"name": "t"}'))
+        self.assertEqual(200, result[0])
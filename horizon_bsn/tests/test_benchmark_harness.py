@@ -0,0 +1,52 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_benchmark_harness
+----------------------------------
+
+Tests for `horizon_bsn.tests.benchmarks.harness` module.
+"""
+
+from horizon_bsn.tests import base
+from horizon_bsn.tests.benchmarks import harness
+
+
+class TestHarness(base.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(51, harness.percentile(values, 0.5))
+        self.assertEqual(95, harness.percentile(values, 0.95))
+        self.assertIsNone(harness.percentile([], 0.5))
+
+    def test_measure_counts_calls_per_run(self):
+        made = []
+        result = harness.measure(lambda: made.extend([1, 2]), repeat=4,
+                                 calls=lambda: len(made))
+        self.assertEqual(2, result['calls'])
+        self.assertLessEqual(result['p50'], result['p95'])
+
+    def test_regressions(self):
+        baselines = {'index': {'p95': 0.1, 'calls': 5, 'peak_kib': 1000}}
+        result = {'p50': 0.1, 'p95': 0.12, 'calls': 5, 'peak_kib': 1200}
+        self.assertEqual([], harness.regressions('index', result,
+                                                 baselines))
+        result.update(p95=0.5, calls=6, peak_kib=2000)
+        self.assertEqual(3, len(harness.regressions('index', result,
+                                                    baselines)))
+        self.assertEqual([], harness.regressions('detail', result,
+                                                 baselines))
+        self.assertIn('detail', harness.missing_baseline('detail',
+                                                         baselines))
+        self.assertIsNone(harness.missing_baseline('index', baselines))
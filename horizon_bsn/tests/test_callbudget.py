@@ -0,0 +1,115 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+from openstack_dashboard.api import heat
+
+from horizon_bsn.api import callbudget
+from horizon_bsn.api import neutron
+from horizon_bsn.tests import base
+from horizon_bsn.tests import fake_backends
+from horizon_bsn.tests import test_neutron
+
+
+class _Match(object):
+    view_name = 'horizon:project:connections:index'
+
+
+class TestCallBudget(base.TestCase):
+
+    def setUp(self):
+        super(TestCallBudget, self).setUp()
+        self.backends = self.useFixture(fake_backends.FakeBackends())
+        self.backends.neutron.seed_tenantpolicies(3)
+        self.backends.heat.add_stack('three tier')
+
+    def test_counts_and_duplicates(self):
+        request = test_neutron.FakeRequest()
+        with callbudget.recording() as recorder:
+            neutron.tenantpolicy_list(request)
+            neutron.tenantpolicy_list(request)
+            neutron.reachabilitytest_list(request, tenant_id='demo')
+            heat.heatclient(request).stacks.list()
+        self.assertEqual({'neutron.list_tenantpolicies': 2,
+                          'neutron.list_reachabilitytests': 1,
+                          'heat.stacks.list': 1}, recorder.counts())
+        duplicates = recorder.duplicates()
+        self.assertEqual([('neutron.list_tenantpolicies', '')],
+                         list(duplicates))
+        # the stacks lead to the calls made by this test
+        call = duplicates[('neutron.list_tenantpolicies', '')][0]
+        self.assertIn('test_counts_and_duplicates',
+                      [frame[2] for frame in call.stack])
+        self.assertIn('called 2 times', recorder.report())
+
+    def test_not_recording(self):
+        request = test_neutron.FakeRequest()
+        with callbudget.recording() as recorder:
+            pass
+        neutron.tenantpolicy_list(request)
+        self.assertEqual([], recorder.calls)
+        self.assertIsNone(callbudget.current())
+
+    def test_worker_threads(self):
+        request = test_neutron.FakeRequest()
+
+        def worker():
+            neutron.tenantpolicy_list(request, priority=1)
+
+        with callbudget.recording(stacks=False) as recorder:
+            threads = [threading.Thread(target=callbudget.propagate(worker)),
+                       threading.Thread(target=worker)]
+            for thread in threads:
+                thread.start()
+                thread.join()
+        self.assertEqual({'neutron.list_tenantpolicies': 1},
+                         recorder.counts())
+        self.assertIs(worker, callbudget.propagate(worker))
+
+    def test_check(self):
+        request = test_neutron.FakeRequest()
+        with callbudget.recording(stacks=False) as recorder:
+            neutron.tenantpolicy_list(request)
+            neutron.tenantpolicy_list(request, priority=1)
+        recorder.check(budget=2)
+        self.assertRaises(callbudget.CallBudgetExceeded,
+                          recorder.check, budget=1)
+        neutron.tenantpolicy_list(request)
+        with callbudget.recording(stacks=False) as recorder:
+            neutron.tenantpolicy_list(request)
+            neutron.tenantpolicy_list(request)
+        recorder.check(duplicates=True)
+        self.assertRaises(callbudget.CallBudgetExceeded, recorder.check)
+
+    def test_middleware(self):
+        request = test_neutron.FakeRequest()
+        request.resolver_match = _Match()
+        callbudget.settings.BSN_CALL_BUDGETS = {_Match.view_name: 1}
+        callbudget.settings.BSN_CALL_BUDGET_ENFORCE = True
+        self.addCleanup(delattr, callbudget.settings, 'BSN_CALL_BUDGETS')
+        self.addCleanup(delattr, callbudget.settings,
+                        'BSN_CALL_BUDGET_ENFORCE')
+        middleware = callbudget.CallBudgetMiddleware()
+
+        middleware.process_request(request)
+        neutron.tenantpolicy_list(request)
+        self.assertEqual('response',
+                         middleware.process_response(request, 'response'))
+
+        middleware.process_request(request)
+        neutron.tenantpolicy_list(request)
+        neutron.reachabilitytest_list(request)
+        self.assertRaises(callbudget.CallBudgetExceeded,
+                          middleware.process_response, request, 'response')
+        self.assertIsNone(callbudget.current())
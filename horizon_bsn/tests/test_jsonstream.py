@@ -0,0 +1,86 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_jsonstream
+----------------------------------
+
+Tests for `horizon_bsn.api.jsonstream` module.
+"""
+
+import json
+
+from horizon_bsn.api import jsonstream
+from horizon_bsn.tests import base
+
+DOCUMENT = json.dumps([1, -2.5e3, u'caf\u00e9 "quoted" \\ \u2603', True,
+                       None, {'a': [1, {'b': 'x,]'}]}, [], ''])
+
+
+def split(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class TestIterJson(base.TestCase):
+
+    def decode(self, chunks):
+        return list(jsonstream.iter_json(chunks))
+
+    def test_every_chunk_boundary(self):
+        expected = json.loads(DOCUMENT)
+        for size in range(1, len(DOCUMENT) + 1):
+            self.assertEqual(expected, self.decode(split(DOCUMENT, size)),
+                             'chunk size %d' % size)
+        for cut in range(1, len(DOCUMENT)):
+            self.assertEqual(expected, self.decode(
+                [DOCUMENT[:cut], DOCUMENT[cut:]]), 'cut at %d' % cut)
+
+    def test_number_split_across_chunks(self):
+        self.assertEqual([1.5e3], self.decode(['[1', '.5e', '3]']))
+        self.assertEqual([12, 3], self.decode(['[1', '2', ',3', ']']))
+        self.assertEqual([True, None], self.decode(['[tr', 'ue,nu', 'll]']))
+
+    def test_escape_split_across_chunks(self):
+        self.assertEqual([u'a"b\u00e9'],
+                         self.decode(['["a\\', '"b\\u0', '0e9"]']))
+
+    def test_stream_of_documents(self):
+        self.assertEqual([{'a': 1}, 2, 'x'],
+                         self.decode(['{"a": 1}\n', '2', '\n"x"']))
+        self.assertEqual([12], self.decode(['1', '2']))
+        self.assertEqual([], self.decode([]))
+
+    def test_empty_array(self):
+        self.assertEqual([], self.decode(['[', ' ]  ']))
+
+    def test_malformed_arrays(self):
+        for document in ('[1,,2]', '[1 2]', '[,1]', '[1,]', '[1] 2',
+                         '[1]]', '[1', '[1, tru', '[{"a": 1]', '["a]'):
+            self.assertRaises(ValueError, self.decode, [document])
+            self.assertRaises(ValueError, self.decode, list(document))
+
+    def test_elements_are_yielded_before_the_end(self):
+        def chunks():
+            yield '[{"a": 1}, '
+            raise AssertionError('read past the first element')
+
+        self.assertEqual({'a': 1}, next(jsonstream.iter_json(chunks())))
+
+
+class TestDecodeChunks(base.TestCase):
+
+    def test_characters_split_across_chunks(self):
+        data = u'caf\u00e9 \u2603'.encode('utf-8')
+        chunks = [data[i:i + 1] for i in range(len(data))]
+        self.assertEqual(u'caf\u00e9 \u2603',
+                         u''.join(jsonstream.decode_chunks(chunks)))
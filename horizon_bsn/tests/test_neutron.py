@@ -0,0 +1,136 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_neutron
+----------------------------------
+
+Tests for `horizon_bsn.api.neutron` module.
+"""
+
+import fixtures
+from neutronclient.common import exceptions as neutron_exceptions
+
+from horizon_bsn.api import neutron
+from horizon_bsn.tests import base
+from horizon_bsn.tests import fake_backends
+
+
+class FakeRequest(object):
+
+    class user(object):
+        project_id = tenant_id = 'demo'
+
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def list_reachabilitytests(self, **params):
+        self.calls.append(params)
+        return {'reachabilitytests': [
+            {'id': test_id, 'test_result': 'pending', 'test_time': None}
+            for test_id in params.get('id', [])]}
+
+
+class TestReachabilityTestStatus(base.TestCase):
+
+    def setUp(self):
+        super(TestReachabilityTestStatus, self).setUp()
+        self.client = FakeClient()
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.api.neutron.neutronclient',
+            lambda request: self.client))
+
+    def test_one_list_call_with_status_fields(self):
+        result = neutron.reachabilitytest_status(None, ['a', 'b'])
+        self.assertEqual([{'id': ['a', 'b'],
+                           'fields': ['id', 'test_result', 'test_time']}],
+                         self.client.calls)
+        self.assertEqual(['a', 'b'], [status['id'] for status in result])
+
+    def test_no_ids(self):
+        self.assertEqual([], neutron.reachabilitytest_status(None, []))
+        self.assertEqual([], self.client.calls)
+
+
+class TestAgainstFakeBackends(base.TestCase):
+
+    def setUp(self):
+        super(TestAgainstFakeBackends, self).setUp()
+        self.backends = self.useFixture(fake_backends.FakeBackends(
+            fake_backends.FakeNeutronClient(run_duration=60)))
+        self.neutron = self.backends.neutron
+        self.request = FakeRequest()
+
+    def test_run_reachabilitytest(self):
+        self.neutron.seed_reachabilitytests(100)
+        tests = neutron.reachabilitytest_list(self.request,
+                                              tenant_id='demo')
+        self.assertEqual(100, len(tests))
+        pending = [test.id for test in tests if not test.test_result]
+        neutron.reachabilitytest_update(self.request, pending[0],
+                                        run_test=True)
+        status = neutron.reachabilitytest_status(self.request, pending[:2])
+        self.assertEqual(['pending', None],
+                         [s['test_result'] for s in status])
+        self.assertEqual(2, self.neutron.calls['list_reachabilitytests'])
+
+    def test_reachabilitytest_row(self):
+        self.neutron.seed_reachabilitytests(2)
+        test = neutron.reachabilitytest_list(self.request)[0]
+        row = neutron.reachabilitytest_row(self.request, test.id)
+        self.assertEqual(test.name, row.name)
+        self.assertEqual(set(neutron.REACHABILITYTEST_ROW_FIELDS),
+                         set(row.to_dict()))
+        self.assertEqual(0, self.neutron.calls['show_reachabilitytest'])
+        self.assertRaises(neutron_exceptions.NotFound,
+                          neutron.reachabilitytest_row, self.request, 'gone')
+
+    def test_reachabilitytest_detail_of_run_test(self):
+        self.neutron.seed_reachabilitytests(2)
+        test = neutron.reachabilitytest_list(self.request,
+                                             test_result='pass')[0]
+        detail = neutron.reachabilitytest_get(self.request, test.id)
+        self.assertIn('leaf2', detail.command_line)
+
+    def test_tenantpolicy_writes_invalidate_owning_tenant(self):
+        self.neutron.seed_tenantpolicies(2, tenant_id='other')
+        ids = [p['id'] for p in
+               self.neutron.list_tenantpolicies()['tenantpolicies']]
+        invalidated = []
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.api.tenantpolicy_search.invalidate',
+            invalidated.append))
+        neutron.tenantpolicy_update(self.request, ids[0], action='deny')
+        neutron.tenantpolicy_delete(self.request, ids[1], tenant_id='other')
+        self.assertEqual(['other', 'other'], invalidated)
+
+    def test_tenantpolicy_match_at_scale(self):
+        self.neutron.seed_tenantpolicies(3000)
+        matches = neutron.tenantpolicy_match(
+            self.request, [{'source': '10.0.5.1', 'destination': '8.8.8.8',
+                            'protocol': 'tcp', 'destination_port': 443},
+                           {'source': '10.0.5.1', 'destination': '8.8.8.8'}])
+        self.assertEqual([6, None], [match and match['priority']
+                                     for match in matches])
+
+    def test_heat_validate_sample_template(self):
+        template = self.neutron.seed_networktemplate()
+        result = self.backends.heat.stacks.validate(template=template['body'])
+        self.assertEqual('Outer Tier Name',
+                         result['Parameters']['out_net_name']['Label'])
+        stack = self.backends.heat.add_stack('auto-three tier')
+        self.assertEqual(7, len(self.backends.heat.resources.list(
+            stack.stack_name)))
@@ -0,0 +1,69 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_request_cache
+----------------------------------
+
+Tests for `horizon_bsn.api.request_cache` module.
+"""
+
+from horizon_bsn.api import request_cache
+from horizon_bsn.tests import base
+
+
+class FakeRequest(object):
+    pass
+
+
+class TestRequestCache(base.TestCase):
+
+    def setUp(self):
+        super(TestRequestCache, self).setUp()
+        self.calls = []
+
+        @request_cache.cached('assignment')
+        def lookup(request, object_id):
+            self.calls.append(object_id)
+            if object_id == 'missing':
+                raise KeyError(object_id)
+            return {'id': object_id}
+
+        self.lookup = lookup
+
+    def test_fetched_once_per_request(self):
+        request = FakeRequest()
+        self.assertIs(self.lookup(request, 'a'), self.lookup(request, 'a'))
+        self.lookup(request, 'b')
+        self.lookup(FakeRequest(), 'a')
+        self.assertEqual(['a', 'b', 'a'], self.calls)
+
+    def test_failures_are_cached(self):
+        request = FakeRequest()
+        self.assertRaises(KeyError, self.lookup, request, 'missing')
+        self.assertRaises(KeyError, self.lookup, request, 'missing')
+        self.assertEqual(['missing'], self.calls)
+
+    def test_invalidate(self):
+        request = FakeRequest()
+        self.lookup(request, 'a')
+        request_cache.invalidate(request, 'other')
+        self.lookup(request, 'a')
+        request_cache.invalidate(request, 'assignment')
+        self.lookup(request, 'a')
+        self.assertEqual(['a', 'a'], self.calls)
+
+    def test_no_request(self):
+        self.lookup(None, 'a')
+        self.lookup(None, 'a')
+        self.assertEqual(['a', 'a'], self.calls)
@@ -0,0 +1,386 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_rest_lib
+----------------------------------
+
+Tests for the BSN controller REST client of the reachability tests panel.
+"""
+
+import errno
+import json
+import socket
+import time
+
+import fixtures
+from six.moves import http_client
+
+from horizon_bsn.api import tracing
+from horizon_bsn.content.connections.reachability_tests import rest_lib
+from horizon_bsn.tests import base
+from horizon_bsn.tests import fake_controller
+
+
+class FakeResponse(object):
+
+    def __init__(self, status=200, body='{}', will_close=False):
+        self.status = status
+        self.reason = 'OK'
+        self.body = body
+        self.will_close = will_close
+
+    def read(self, amt=None):
+        data, self.body = self.body[:amt], self.body[amt:] if amt else ''
+        return data
+
+    def getheader(self, name):
+        return 'hash' if name == rest_lib.HASH_HEADER else None
+
+
+class FailedResponse(object):
+    """Raise error once the request has been sent."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class FakeConnection(object):
+
+    opened = []
+    responses = []
+
+    def __init__(self, host, timeout=None):
+        self.host = host
+        self.sock = None
+        self.closed = False
+        self.requests = []
+        FakeConnection.opened.append(self)
+
+    def request(self, method, path, body, headers):
+        response = FakeConnection.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        self.sock = object()
+        self.requests.append((method, path))
+        self.response = response
+
+    def getresponse(self):
+        if isinstance(self.response, FailedResponse):
+            raise self.response.error
+        return self.response
+
+    def close(self):
+        self.closed = True
+        self.sock = None
+
+
+class TestConnectionPool(base.TestCase):
+
+    def setUp(self):
+        super(TestConnectionPool, self).setUp()
+        FakeConnection.opened = []
+        FakeConnection.responses = []
+        self.pool = rest_lib.ConnectionPool(
+            connection_class=FakeConnection)
+        self.pool._healthy = lambda connection: connection.sock is not None
+
+    def test_connection_is_reused(self):
+        FakeConnection.responses = [FakeResponse(), FakeResponse()]
+        self.pool.urlopen('bcf:8443', 'GET', '/a')
+        result = self.pool.urlopen('bcf:8443', 'GET', '/b')
+        self.assertEqual((200, 'OK', '{}', 'hash'), result)
+        self.assertEqual(1, len(FakeConnection.opened))
+        stats = self.pool.stats()
+        self.assertEqual(1, stats['created'])
+        self.assertEqual(1, stats['reused'])
+        self.assertEqual({'bcf:8443': 1}, stats['idle'])
+
+    def test_closed_response_is_not_pooled(self):
+        FakeConnection.responses = [FakeResponse(will_close=True),
+                                    FakeResponse()]
+        self.pool.urlopen('bcf:8443', 'GET', '/a')
+        self.pool.urlopen('bcf:8443', 'GET', '/b')
+        self.assertEqual(2, len(FakeConnection.opened))
+        self.assertTrue(FakeConnection.opened[0].closed)
+
+    def test_broken_pipe_on_reused_connection_reconnects(self):
+        FakeConnection.responses = [
+            FakeResponse(), socket.error(errno.EPIPE, 'Broken pipe'),
+            FakeResponse(status=201)]
+        self.pool.urlopen('bcf:8443', 'GET', '/a')
+        result = self.pool.urlopen('bcf:8443', 'POST', '/b')
+        self.assertEqual(201, result[0])
+        self.assertEqual(2, len(FakeConnection.opened))
+        self.assertEqual(1, self.pool.stats()['retried'])
+
+    def _disconnected(self):
+        # raised by Python 3 when the controller closed the connection
+        disconnected = getattr(http_client, 'RemoteDisconnected',
+                               http_client.BadStatusLine)
+        return FailedResponse(disconnected('closed'))
+
+    def test_closed_reused_connection_reconnects(self):
+        FakeConnection.responses = [FakeResponse(), self._disconnected(),
+                                    FakeResponse(status=201)]
+        self.pool.urlopen('bcf:8443', 'GET', '/a')
+        result = self.pool.urlopen('bcf:8443', 'GET', '/b')
+        self.assertEqual(201, result[0])
+        self.assertEqual(2, len(FakeConnection.opened))
+        self.assertEqual(1, self.pool.stats()['retried'])
+
+    def test_sent_write_is_not_replayed(self):
+        FakeConnection.responses = [FakeResponse(), self._disconnected(),
+                                    FakeResponse(status=201)]
+        self.pool.urlopen('bcf:8443', 'GET', '/a')
+        self.assertRaises(http_client.BadStatusLine, self.pool.urlopen,
+                          'bcf:8443', 'POST', '/b')
+        self.assertEqual(1, len(FakeConnection.opened))
+        self.assertEqual(0, self.pool.stats()['retried'])
+
+    def test_error_on_new_connection_is_raised(self):
+        FakeConnection.responses = [socket.error(errno.ECONNREFUSED,
+                                                 'refused')]
+        self.assertRaises(socket.error, self.pool.urlopen, 'bcf:8443',
+                          'GET', '/a')
+        self.assertEqual({}, self.pool.stats()['idle'])
+
+    def test_streamed_elements(self):
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.content.connections.reachability_tests.rest_lib.'
+            'tracer', tracing.Tracer()))
+        body = json.dumps([{'id': i} for i in range(100)]).encode('utf-8')
+        FakeConnection.responses = [FakeResponse(body=body + b'\n'),
+                                    FakeResponse(body=body)]
+        status, _reason, elements, _hash = rest_lib.request_iter(
+            'core/endpoint', host='bcf:8443', connection_pool=self.pool,
+            chunk_size=7)
+        self.assertEqual(200, status)
+        self.assertEqual(list(range(100)), [e['id'] for e in elements])
+        self.assertEqual({'bcf:8443': 1}, self.pool.stats()['idle'])
+        self.assertEqual(len(body) + 1,
+                         rest_lib.tracer.slow_log.slowest()[0].bytes)
+
+        elements = rest_lib.request_iter(
+            'core/endpoint', host='bcf:8443', connection_pool=self.pool,
+            chunk_size=7)[2]
+        self.assertEqual({'id': 0}, next(elements))
+        elements.close()
+        self.assertEqual({'bcf:8443': 0}, self.pool.stats()['idle'])
+        self.assertTrue(FakeConnection.opened[0].closed)
+
+    def test_expired_connection_is_dropped(self):
+        self.pool.max_idle_time = -1
+        FakeConnection.responses = [FakeResponse(), FakeResponse()]
+        self.pool.urlopen('bcf:8443', 'GET', '/a')
+        self.pool.urlopen('bcf:8443', 'GET', '/b')
+        self.assertEqual(2, len(FakeConnection.opened))
+        self.assertEqual(1, self.pool.stats()['expired'])
+
+
+class TestSessionManager(base.TestCase):
+
+    def setUp(self):
+        super(TestSessionManager, self).setUp()
+        self.calls = []
+        self.expired = set()
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.content.connections.reachability_tests.rest_lib.'
+            'request', self._request))
+        self.sessions = rest_lib.SessionManager()
+
+    def _request(self, url, prefix=None, method='GET', data='',
+                 hashPath=None, host=None, cookie=None):
+        self.calls.append((method, url, cookie))
+        if url == rest_lib.LOGIN_URL:
+            cookie = 'cookie-%d' % len(self.calls)
+            return 200, 'OK', json.dumps({'session_cookie': cookie}), None
+        if cookie in self.expired:
+            return 401, 'Unauthorized', '', None
+        return 200, 'OK', '[]', None
+
+    def test_session_is_shared(self):
+        self.sessions.request('bcf', 'admin', 'secret', 'core/switch')
+        self.sessions.request('bcf', 'admin', 'secret', 'core/switch')
+        self.assertEqual([('POST', 'auth/login', None),
+                          ('GET', 'core/switch', 'cookie-1'),
+                          ('GET', 'core/switch', 'cookie-1')], self.calls)
+
+    def test_unauthorized_logs_in_again(self):
+        self.sessions.request('bcf', 'admin', 'secret', 'core/switch')
+        self.expired.add('cookie-1')
+        result = self.sessions.request('bcf', 'admin', 'secret',
+                                       'core/switch')
+        self.assertEqual(200, result[0])
+        self.assertEqual(('GET', 'core/switch', 'cookie-4'), self.calls[-1])
+
+    def test_session_is_renewed_before_expiry(self):
+        self.sessions.refresh_margin = self.sessions.lifetime
+        self.sessions.cookie('bcf', 'admin', 'secret')
+        self.sessions.cookie('bcf', 'admin', 'secret')
+        self.assertEqual(2, len(self.calls))
+
+    def test_failed_login(self):
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.content.connections.reachability_tests.rest_lib.'
+            'request', lambda *args, **kwargs: (401, 'Unauthorized', '',
+                                                None)))
+        self.assertRaises(rest_lib.LoginError, self.sessions.cookie, 'bcf',
+                          'admin', 'wrong')
+
+
+class TestControllerCluster(base.TestCase):
+
+    def setUp(self):
+        super(TestControllerCluster, self).setUp()
+        self.calls = []
+        self.roles = {'c1:8443': 'standby', 'c2:8443': 'active'}
+        self.down = set()
+        self.slow = {}
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.content.connections.reachability_tests.rest_lib.'
+            'request', self._request))
+        self.cluster = rest_lib.ControllerCluster(
+            ['c1:8443', 'c2:8443'], hedge_delay=0.01)
+
+    def _request(self, url, prefix=None, method='GET', data='',
+                 hashPath=None, host=None, cookie=None,
+                 connection_pool=None):
+        if host in self.down:
+            raise socket.error(errno.ECONNREFUSED, 'Connection refused')
+        time.sleep(self.slow.get(host, 0))
+        if url == rest_lib.ROLE_URL:
+            return (200, 'OK', json.dumps([{'role': self.roles[host]}]),
+                    None)
+        self.calls.append((method, host))
+        return 200, 'OK', host, None
+
+    def test_writes_go_to_active_node(self):
+        self.assertEqual('c2:8443', self.cluster.active())
+        self.cluster.request('core/tenant', method='POST', data='{}')
+        self.assertEqual([('POST', 'c2:8443')], self.calls)
+
+    def test_write_fails_over_when_active_is_unreachable(self):
+        self.cluster.probe()
+        self.down.add('c2:8443')
+        self.roles['c1:8443'] = 'active'
+        result = self.cluster.request('core/tenant', method='POST')
+        self.assertEqual('c1:8443', result[2])
+        self.assertFalse(self.cluster.nodes()['c2:8443']['healthy'])
+
+    def test_slow_read_is_hedged(self):
+        self.cluster.probe()
+        with self.cluster._lock:
+            self.cluster._nodes['c1:8443']['latency'] = 0.001
+            self.cluster._nodes['c2:8443']['latency'] = 0.002
+        self.slow['c1:8443'] = 0.5
+        result = self.cluster.request('core/switch')
+        self.assertEqual('c2:8443', result[2])
+
+    def test_no_healthy_node(self):
+        self.down.update(self.cluster.hosts)
+        self.assertRaises(rest_lib.NoControllerAvailable,
+                          self.cluster.request, 'core/switch')
+
+
+class TestResponseCache(base.TestCase):
+
+    def setUp(self):
+        super(TestResponseCache, self).setUp()
+        self.sent = []
+        self.body = '[{"name": "leaf1"}]'
+        self.hash = 'h1'
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.content.connections.reachability_tests.rest_lib.'
+            'request', self._request))
+        self.cache = rest_lib.ResponseCache()
+
+    def _request(self, url, prefix=None, method='GET', data='',
+                 hashPath=None, host=None, cookie=None):
+        self.sent.append(hashPath)
+        if hashPath == self.hash:
+            return 304, 'Not Modified', '', self.hash
+        return 200, 'OK', self.body, self.hash
+
+    def test_unchanged_body_is_reused(self):
+        status, first = self.cache.get_json('core/switch')
+        status, second = self.cache.get_json('core/switch')
+        self.assertEqual(200, status)
+        self.assertIs(first, second)
+        self.assertEqual([None, 'h1'], self.sent)
+        self.assertEqual(1, self.cache.stats()['hits'])
+
+    def test_changed_body_is_fetched(self):
+        self.cache.get('core/switch')
+        self.body, self.hash = '[]', 'h2'
+        self.assertEqual((200, 'OK', '[]', 'h2'),
+                         self.cache.get('core/switch'))
+        self.assertEqual([], self.cache.get_json('core/switch')[1])
+
+    def test_lru_eviction(self):
+        self.cache.max_entries = 1
+        self.cache.get('core/switch')
+        self.cache.get('core/tenant')
+        self.cache.get('core/switch')
+        self.assertEqual([None, None, None], self.sent)
+
+
+class TestAgainstFakeController(base.TestCase):
+
+    def setUp(self):
+        super(TestAgainstFakeController, self).setUp()
+        self.controller = fake_controller.FakeController().start()
+        self.addCleanup(self.controller.stop)
+        self.controller.data['core']['switch'] = [{'name': 'leaf1'}]
+        self.pool = rest_lib.ConnectionPool(
+            context=self.controller.client_context())
+        self.addCleanup(self.pool.clear)
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.content.connections.reachability_tests.rest_lib.'
+            'pool', self.pool))
+
+    def test_session_keep_alive_and_relogin(self):
+        sessions = rest_lib.SessionManager()
+        host = self.controller.address
+        result = sessions.request(host, 'admin', 'admin', 'core/switch')
+        self.assertEqual(200, result[0])
+        self.assertEqual([{'name': 'leaf1'}], json.loads(result[2]))
+        self.controller.expire_sessions()
+        self.assertEqual(200, sessions.request(host, 'admin', 'admin',
+                                               'core/switch')[0])
+        # login, 401, login again and the retried GET, on one connection
+        self.assertEqual(5, len(self.controller.requests))
+        self.assertEqual(1, self.pool.stats()['created'])
+
+    def test_hash_path_and_writes(self):
+        cache = rest_lib.ResponseCache()
+        cookie = self.controller.login()
+        host = self.controller.address
+        first = cache.get_json('core/switch', host=host, cookie=cookie)[1]
+        self.assertIs(first, cache.get_json('core/switch', host=host,
+                                            cookie=cookie)[1])
+        rest_lib.request('core/switch', method='POST', host=host,
+                         cookie=cookie, data='{"name": "leaf2"}')
+        self.assertEqual(['leaf1', 'leaf2'], [
+            s['name'] for s in cache.get_json('core/switch', host=host,
+                                              cookie=cookie)[1]])
+
+    def test_injected_errors(self):
+        self.controller.inject_error(503, path='core/switch')
+        cookie = self.controller.login()
+        host = self.controller.address
+        self.assertEqual(503, rest_lib.request('core/switch', host=host,
+                                               cookie=cookie)[0])
+        self.assertEqual(200, rest_lib.request('core/switch', host=host,
+                                               cookie=cookie)[0])
+        self.assertEqual(401, rest_lib.request('core/switch', host=host)[0])
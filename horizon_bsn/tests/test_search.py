@@ -0,0 +1,238 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_search
+----------------------------------
+
+Tests for `horizon_bsn.api.search` module.
+"""
+
+import fixtures
+
+from horizon_bsn.api import neutron
+from horizon_bsn.api import reachabilitytest_index
+from horizon_bsn.api import search
+from horizon_bsn.api import tenantpolicy_search
+from horizon_bsn.tests import base
+
+
+def reachabilitytest(name, src_ip, dst_ip, segment='web',
+                     expected='dropped by policy', result='pass'):
+    return {'id': name,
+            'name': name,
+            'src_tenant_name': 'demo',
+            'src_segment_name': segment,
+            'src_ip': src_ip,
+            'dst_ip': dst_ip,
+            'expected_result': expected,
+            'test_result': result}
+
+
+TESTS = [reachabilitytest('prod-web-01', '10.0.0.5', '10.1.0.5'),
+         reachabilitytest('prod-db-01', '10.0.1.5', '192.168.0.1',
+                          segment='db', result='fail'),
+         reachabilitytest('staging-web', '172.16.0.1', '10.1.2.3',
+                          expected='reached')]
+
+
+class TestSearchIndex(base.TestCase):
+
+    def setUp(self):
+        super(TestSearchIndex, self).setUp()
+        self.index = search.SearchIndex(
+            TESTS,
+            text=reachabilitytest_index.TEXT_FIELDS,
+            exact=reachabilitytest_index.EXACT_FIELDS,
+            address=reachabilitytest_index.ADDRESS_FIELDS,
+            aliases=reachabilitytest_index.ALIASES)
+
+    def names(self, query):
+        return [test['name'] for test in self.index.query(query)]
+
+    def test_parse_query(self):
+        self.assertEqual([('name', 'web'), (None, 'fe80::1'),
+                          ('expected', 'dropped by policy')],
+                         search.parse_query(
+                             'name:web fe80::1 expected:"dropped by policy"',
+                             ['name', 'expected']))
+
+    def test_token_prefix(self):
+        self.assertEqual(['prod-web-01', 'staging-web'], self.names('we'))
+        self.assertEqual(['prod-web-01', 'prod-db-01'],
+                         self.names('name:prod'))
+
+    def test_cidr_containment(self):
+        self.assertEqual(['prod-web-01', 'prod-db-01'],
+                         self.names('src:10.0.0.0/16'))
+        self.assertEqual(['prod-web-01', 'staging-web'],
+                         self.names('dst:10.1.0.0/16'))
+        self.assertEqual(['prod-db-01'], self.names('ip:192.168.0.1'))
+
+    def test_exact_and_combined_terms(self):
+        self.assertEqual(['prod-db-01'], self.names('result:FAIL'))
+        self.assertEqual(['staging-web'],
+                         self.names('segment:web expected:reached'))
+        self.assertEqual([], self.names('segment:db result:pass'))
+
+    def test_empty_query_returns_everything(self):
+        self.assertEqual(3, len(self.index.query('')))
+
+
+class TestReachabilityTestSearch(base.TestCase):
+
+    def setUp(self):
+        super(TestReachabilityTestSearch, self).setUp()
+        self.addCleanup(reachabilitytest_index.invalidate, 'demo')
+        self.calls = []
+        self.tests = TESTS
+
+        def reachabilitytest_list(request, **params):
+            self.calls.append(params)
+            return [test for test in self.tests
+                    if test['test_result'] == params.get('test_result',
+                                                         test['test_result'])]
+
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.api.neutron.reachabilitytest_list',
+            reachabilitytest_list))
+
+    def names(self, query):
+        return [test['name'] for test in neutron.reachabilitytest_search(
+            None, query, tenant_id='demo')]
+
+    def test_exact_terms_are_passed_to_neutron(self):
+        self.assertEqual(['prod-db-01'],
+                         self.names('status:Fail src:10.0.0.0/8'))
+        self.assertEqual([{'tenant_id': 'demo', 'test_result': 'fail'}],
+                         self.calls)
+
+    def test_filter_listed_tests(self):
+        self.assertEqual(['prod-web-01', 'staging-web'], [
+            test['name'] for test in neutron.reachabilitytest_filter(
+                None, TESTS, 'dst:10.1.0.0/16', tenant_id='demo')])
+        self.assertEqual(TESTS, neutron.reachabilitytest_filter(
+            None, TESTS, ' ', tenant_id='demo'))
+        self.assertEqual([], self.calls)
+
+    def test_repeated_exact_terms_are_anded(self):
+        self.assertEqual([], self.names('result:pass status:fail'))
+        self.assertEqual([{'tenant_id': 'demo'}], self.calls)
+        self.assertEqual(['prod-web-01', 'staging-web'],
+                         self.names('result:pass status:pass'))
+        self.assertEqual({'tenant_id': 'demo', 'test_result': 'pass'},
+                         self.calls[-1])
+
+    def test_index_is_reused_until_invalidated(self):
+        built = []
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.api.search.SearchIndex',
+            _recording(search.SearchIndex, built)))
+        self.assertEqual(['prod-web-01'],
+                         self.names('segment:web dst:10.1.0.5'))
+        self.assertEqual(['prod-db-01'], self.names('segment:db'))
+        self.assertEqual(1, len(built))
+        self.tests = [dict(test) for test in TESTS]
+        self.tests[0]['src_segment_name'] = 'db'
+        self.assertEqual(['prod-db-01'], self.names('segment:db'))
+        reachabilitytest_index.invalidate('demo')
+        self.assertEqual(['prod-web-01', 'prod-db-01'],
+                         self.names('segment:db'))
+        self.assertEqual(2, len(built))
+
+    def test_writes_drop_the_all_tenant_index(self):
+        key = (None, ())
+        index = reachabilitytest_index.get_index(key, TESTS)
+        self.assertIs(index, reachabilitytest_index.get_index(key, TESTS))
+        reachabilitytest_index.invalidate('demo')
+        self.assertIsNot(index, reachabilitytest_index.get_index(key, TESTS))
+
+    def test_updated_tests_are_searched_after_ttl(self):
+        # as seen by a worker that did not make the update itself
+        self.assertEqual(['prod-web-01', 'prod-db-01'], self.names('prod'))
+        self.tests = [dict(test) for test in TESTS]
+        self.tests[2]['name'] = 'prod-web-02'
+        self.assertEqual(['prod-web-01', 'prod-db-01'], self.names('prod'))
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.api.reachabilitytest_index._indexes.ttl', -1))
+        self.assertEqual(['prod-web-01', 'prod-db-01', 'prod-web-02'],
+                         self.names('prod'))
+
+
+def _recording(cls, built):
+    def build(*args, **kwargs):
+        built.append(args)
+        return cls(*args, **kwargs)
+    return build
+
+
+def policy(priority, source='any', destination='any', action='permit',
+           protocol='', destination_port=0, nexthops=()):
+    return {'id': 'policy-%d' % priority, 'priority': priority,
+            'source': source, 'source_port': 0,
+            'destination': destination,
+            'destination_port': destination_port, 'protocol': protocol,
+            'action': action, 'nexthops': list(nexthops)}
+
+
+class TestTenantPolicySearch(base.TestCase):
+
+    def setUp(self):
+        super(TestTenantPolicySearch, self).setUp()
+        self.addCleanup(tenantpolicy_search.invalidate, 'tenant')
+        self.policies = [
+            policy(10, destination='10.1.0.0/16', action='deny'),
+            policy(20, source='external', destination='10.2.3.0/24',
+                   protocol='tcp', destination_port=443),
+            policy(30, destination='192.168.0.0/24',
+                   nexthops=['10.9.9.9'])]
+
+    def priorities(self, query, policies=None):
+        return [p['priority'] for p in tenantpolicy_search.filter_policies(
+            'tenant', policies or self.policies, query)]
+
+    def test_field_scoped_queries(self):
+        self.assertEqual([10], self.priorities('action:deny'))
+        self.assertEqual([10, 20], self.priorities('dst:10.0.0.0/8'))
+        self.assertEqual([20], self.priorities('src:external port:443'))
+        self.assertEqual([30], self.priorities('nexthop:10.9'))
+        self.assertEqual([10], self.priorities('deny'))
+
+    def test_index_is_reused_until_invalidated(self):
+        index = tenantpolicy_search.get_index('tenant', self.policies)
+        self.assertIs(index,
+                      tenantpolicy_search.get_index('tenant', self.policies))
+        tenantpolicy_search.invalidate('tenant')
+        self.assertIsNot(index, tenantpolicy_search.get_index(
+            'tenant', self.policies))
+
+    def test_updated_fields_are_searched_after_ttl(self):
+        # as seen by a worker that did not make the update itself
+        self.assertEqual([10], self.priorities('action:deny'))
+        policies = [dict(p) for p in self.policies]
+        policies[2]['action'] = 'deny'
+        self.assertEqual([10], self.priorities('action:deny', policies))
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.api.tenantpolicy_search._indexes.ttl', -1))
+        self.assertEqual([10, 30], self.priorities('action:deny', policies))
+
+    def test_reordered_policies_rebuild_index(self):
+        self.assertEqual([10], self.priorities('action:deny'))
+        policies = [dict(p) for p in reversed(self.policies)]
+        self.assertEqual([10], self.priorities('action:deny', policies))
+        self.assertEqual([30], self.priorities('dst:192.168.0.0/16', policies))
+
+    def test_changed_policy_list_rebuilds_index(self):
+        self.priorities('action:deny')
+        policies = self.policies + [policy(40, action='deny')]
+        self.assertEqual([10, 40], self.priorities('action:deny', policies))
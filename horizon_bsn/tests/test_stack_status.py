@@ -0,0 +1,102 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_stack_status
+----------------------------------
+
+Tests for `horizon_bsn.api.stack_status` module.
+"""
+
+import collections
+
+import fixtures
+
+from horizon_bsn.api import stack_status
+from horizon_bsn.tests import base
+
+Obj = collections.namedtuple('Obj', ['id', 'name', 'template_id',
+                                     'stack_name', 'stack_status',
+                                     'resource_name', 'resource_type'])
+
+
+def obj(**kwargs):
+    fields = dict((field, None) for field in Obj._fields)
+    fields.update(kwargs)
+    return Obj(**fields)
+
+
+class FakeRequest(object):
+
+    class user(object):
+        tenant_id = 'tenant'
+
+
+class TestStackStatus(base.TestCase):
+
+    def setUp(self):
+        super(TestStackStatus, self).setUp()
+        self.calls = []
+        self.status = 'CREATE_IN_PROGRESS'
+        patches = {
+            'horizon_bsn.api.stack_status.cache': base.DictCache(),
+            'horizon_bsn.api.neutron.networktemplateassignment_list':
+                self._assignment_list,
+            'horizon_bsn.api.neutron.networktemplate_get':
+                self._template_get,
+            'horizon_bsn.api.stack_status.heat.stack_get': self._stack_get,
+            'horizon_bsn.api.stack_status.heat.resources_list':
+                self._resources_list}
+        for name, value in patches.items():
+            self.useFixture(fixtures.MonkeyPatch(name, value))
+
+    def _assignment_list(self, request, **params):
+        self.calls.append('assignment_list')
+        return [obj(id='assign', template_id='template')]
+
+    def _template_get(self, request, template_id):
+        self.calls.append('template_get')
+        return obj(id=template_id, name='three tier')
+
+    def _stack_get(self, request, stack_id):
+        self.calls.append('stack_get')
+        return obj(id=stack_id, stack_name='auto-three-tier',
+                   stack_status=self.status)
+
+    def _resources_list(self, request, stack_name):
+        self.calls.append('resources_list')
+        return [obj(resource_name='router', resource_type='OS::Router')]
+
+    def test_join_and_resources_are_cached_while_status_is_unchanged(self):
+        request = FakeRequest()
+        stack_status.get_row(request, 'stack')
+        stack_status.get_row(request, 'stack')
+        self.assertEqual(['assignment_list', 'template_get', 'stack_get',
+                          'resources_list', 'stack_get'], self.calls)
+
+    def test_status_change_refreshes_resources(self):
+        request = FakeRequest()
+        stack_status.get_row(request, 'stack')
+        self.status = 'CREATE_COMPLETE'
+        self.calls = []
+        stack, entry = stack_status.get_row(request, 'stack')
+        self.assertEqual(['stack_get', 'resources_list'], self.calls)
+        self.assertEqual('three tier', entry['template_name'])
+        self.assertEqual([('router', 'OS::Router')], entry['resources'])
+
+    def test_missing_assignment(self):
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.api.neutron.networktemplateassignment_list',
+            lambda request, **params: []))
+        self.assertRaises(stack_status.AssignmentNotFound,
+                          stack_status.get_row, FakeRequest(), 'stack')
@@ -0,0 +1,59 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from horizon_bsn.api import stack_topology
+from horizon_bsn.tests import base
+from horizon_bsn.tests import fake_backends
+from horizon_bsn.tests import test_neutron
+
+
+class TestStackTopology(base.TestCase):
+
+    def setUp(self):
+        super(TestStackTopology, self).setUp()
+        self.backends = self.useFixture(fake_backends.FakeBackends())
+        self.request = test_neutron.FakeRequest()
+
+    def test_no_template(self):
+        topology = stack_topology.get_stack_topology(self.request)
+        self.assertEqual({'network_entities': '{}',
+                          'network_connections': '{}'}, topology)
+
+    def test_topology(self):
+        stack = self.backends.heat.add_stack('three tier', subnets=2)
+        template = self.backends.neutron.seed_networktemplate(
+            stack_id=stack.id)
+        topology = stack_topology.get_stack_topology(self.request)
+        self.assertEqual(template['id'], topology['template'].id)
+        self.assertEqual(stack.id, topology['stack'].id)
+        # the router and both subnets, each subnet connected to the router
+        resources = dict((r.resource_name, r.physical_resource_id)
+                         for r in topology['stack_resources'])
+        self.assertEqual(
+            sorted([resources['router'], resources['subnet0'],
+                    resources['subnet1']]),
+            sorted(json.loads(topology['network_entities'])))
+        self.assertEqual(
+            [{'source': resources['router'],
+              'destination': resources['subnet%d' % i],
+              'expected_connection': 'forward'} for i in range(2)],
+            json.loads(topology['network_connections']))
+
+    def test_leftover_assignment(self):
+        self.backends.neutron.seed_networktemplate(stack_id='gone')
+        topology = stack_topology.get_stack_topology(self.request)
+        self.assertEqual('', topology['network_entities'])
+        self.assertEqual(
+            0, self.backends.neutron.count('networktemplateassignment'))
@@ -0,0 +1,215 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_tenantpolicy
+----------------------------------
+
+Tests for `horizon_bsn.api.tenantpolicy` module.
+"""
+
+from horizon_bsn.api import tenantpolicy
+from horizon_bsn.tests import base
+
+
+def policy(priority, source='any', destination='any', action='permit',
+           source_port=0, destination_port=0, protocol='', nexthops=None):
+    return {'id': 'policy-%d' % priority,
+            'priority': priority,
+            'source': source,
+            'source_port': source_port,
+            'destination': destination,
+            'destination_port': destination_port,
+            'protocol': protocol,
+            'action': action,
+            'nexthops': nexthops or []}
+
+
+def outcome(match):
+    if match is None:
+        return None
+    return match['action'], match['nexthops']
+
+
+class TestTenantPolicyAnalyzer(base.TestCase):
+
+    def test_cidr_key_containment(self):
+        outer = tenantpolicy.cidr_key('10.0.0.0/8')
+        inner = tenantpolicy.cidr_key('10.1.2.0/24')
+        self.assertTrue(inner.startswith(outer))
+        self.assertEqual('', tenantpolicy.cidr_key('any'))
+        self.assertFalse(tenantpolicy.cidr_key('external').startswith(outer))
+
+    def test_shadowed_by_different_action(self):
+        findings = tenantpolicy.analyze([
+            policy(10, destination='10.0.0.0/8', action='deny'),
+            policy(20, destination='10.1.0.0/16')])
+        self.assertEqual(1, len(findings))
+        self.assertEqual(tenantpolicy.SHADOWED, findings[0].kind)
+        self.assertEqual(20, findings[0].policy['priority'])
+        self.assertEqual(10, findings[0].other['priority'])
+
+    def test_redundant_with_same_action(self):
+        findings = tenantpolicy.analyze([
+            policy(20, destination='10.1.0.0/16', protocol='tcp',
+                   destination_port=80),
+            policy(10, destination='10.0.0.0/8')])
+        self.assertEqual([tenantpolicy.REDUNDANT],
+                         [f.kind for f in findings])
+
+    def test_port_and_protocol_limit_coverage(self):
+        findings = tenantpolicy.analyze([
+            policy(10, destination='10.0.0.0/8', protocol='tcp',
+                   destination_port=80, action='deny'),
+            policy(20, destination='10.1.0.0/16')])
+        self.assertEqual([tenantpolicy.CONFLICT],
+                         [f.kind for f in findings])
+
+    def test_disjoint_policies(self):
+        findings = tenantpolicy.analyze([
+            policy(10, source='10.0.0.0/24', action='deny'),
+            policy(20, source='10.0.1.0/24'),
+            policy(30, source='external', action='deny')])
+        self.assertEqual([], findings)
+
+    def test_nexthops_are_part_of_the_outcome(self):
+        findings = tenantpolicy.analyze([
+            policy(10, nexthops=['1.1.1.1']),
+            policy(20, destination='10.0.0.0/8', nexthops=['2.2.2.2'])])
+        self.assertEqual([tenantpolicy.SHADOWED],
+                         [f.kind for f in findings])
+
+    def test_check_policy_ignores_lower_priority(self):
+        existing = [policy(10, destination='10.0.0.0/8', action='deny')]
+        new = policy(5, destination='10.1.0.0/16')
+        self.assertEqual([], tenantpolicy.check_policy(existing, new))
+        new = policy(50, destination='10.1.0.0/16')
+        findings = tenantpolicy.check_policy(existing, new)
+        self.assertEqual([tenantpolicy.SHADOWED],
+                         [f.kind for f in findings])
+
+
+class TestPolicyMatcher(base.TestCase):
+
+    def setUp(self):
+        super(TestPolicyMatcher, self).setUp()
+        self.matcher = tenantpolicy.PolicyMatcher([
+            policy(30),
+            policy(20, destination='10.0.0.0/8', action='deny'),
+            policy(10, destination='10.1.0.0/16', protocol='tcp',
+                   destination_port=443),
+            policy(5, source='external', action='deny')])
+
+    def test_first_match_by_priority(self):
+        match = self.matcher.match('192.168.0.1', '10.1.2.3', 'tcp',
+                                   destination_port=443)
+        self.assertEqual(10, match['priority'])
+        match = self.matcher.match('192.168.0.1', '10.1.2.3', 'tcp',
+                                   destination_port=80)
+        self.assertEqual(20, match['priority'])
+        match = self.matcher.match('192.168.0.1', '172.16.0.1')
+        self.assertEqual(30, match['priority'])
+        match = self.matcher.match('external', '10.1.2.3')
+        self.assertEqual(5, match['priority'])
+
+    def test_no_match(self):
+        matcher = tenantpolicy.PolicyMatcher(
+            [policy(10, source='10.0.0.0/8')])
+        self.assertIsNone(matcher.match('192.168.0.1', '10.0.0.1'))
+
+    def test_match_many(self):
+        flows = [{'source': '1.1.1.1', 'destination': '10.9.9.9'},
+                 {'source': '1.1.1.1', 'destination': '11.0.0.1'}]
+        self.assertEqual([20, 30], [p['priority'] for p in
+                                    self.matcher.match_many(flows)])
+
+    def test_validate_flow(self):
+        flow = tenantpolicy.validate_flow(
+            {'source': ' 192.168.0.1', 'destination': '10.1.2.3',
+             'protocol': 'TCP', 'destination_port': '443'})
+        self.assertEqual({'source': '192.168.0.1', 'destination': '10.1.2.3',
+                          'protocol': 'tcp', 'source_port': None,
+                          'destination_port': 443}, flow)
+        self.assertEqual(10, self.matcher.match(**flow)['priority'])
+        self.assertEqual('external', tenantpolicy.validate_flow(
+            {'source': 'external', 'destination': '::1'})['source'])
+        for flow in ([], {'destination': '10.0.0.1'},
+                     {'source': '10.0.0.1', 'destination': '10.0.0.0/8'},
+                     {'source': 'any', 'destination': '10.0.0.1'},
+                     {'source': 1, 'destination': '10.0.0.1'},
+                     {'source': '10.0.0.1', 'destination': '10.0.0.1',
+                      'protocol': 'icmp'},
+                     {'source': '10.0.0.1', 'destination': '10.0.0.1',
+                      'destination_port': 65536},
+                     {'source': '10.0.0.1', 'destination': '10.0.0.1',
+                      'source_port': 'http'},
+                     {'source': '10.0.0.1', 'destination': '10.0.0.1',
+                      'action': 'deny'}):
+            self.assertRaises(ValueError, tenantpolicy.validate_flow, flow)
+
+
+class TestCompaction(base.TestCase):
+
+    def test_cidr_from_key_round_trip(self):
+        for value in ('any', 'external', '10.1.0.0/16', '2001:db8::/32'):
+            self.assertEqual(value, tenantpolicy.cidr_from_key(
+                tenantpolicy.cidr_key(value)))
+
+    def test_merges_adjacent_prefixes(self):
+        compaction = tenantpolicy.compact([
+            policy(10, destination='10.0.0.0/24'),
+            policy(11, destination='10.0.1.0/24'),
+            policy(12, destination='10.0.2.0/24'),
+            policy(13, destination='10.0.3.0/24')])
+        self.assertEqual(['10.0.0.0/22'],
+                         [p['destination'] for p in compaction.policies])
+        self.assertEqual({'policy-10': {'destination': '10.0.0.0/22'}},
+                         compaction.updates)
+        self.assertEqual(['policy-11', 'policy-12', 'policy-13'],
+                         compaction.deletes)
+
+    def test_no_merge_across_different_outcome(self):
+        policies = [policy(10, destination='10.0.0.0/24'),
+                    policy(15, destination='10.0.1.0/25', action='deny'),
+                    policy(20, destination='10.0.1.0/24')]
+        compaction = tenantpolicy.compact(policies)
+        self.assertEqual({}, compaction.updates)
+        self.assertEqual([], compaction.deletes)
+
+    def test_drops_shadowed_and_covered_policies(self):
+        compaction = tenantpolicy.compact([
+            policy(10, destination='10.0.0.0/24'),
+            policy(20, destination='10.0.0.0/8'),
+            policy(30, destination='10.1.0.0/16', action='deny')])
+        self.assertEqual([20], [p['priority'] for p in compaction.policies])
+        self.assertEqual(set([tenantpolicy.SHADOWED,
+                              tenantpolicy.REDUNDANT]),
+                         set(f.kind for f in compaction.dropped))
+
+    def test_compacted_set_is_equivalent(self):
+        policies = [policy(10, destination='10.0.0.0/25', action='deny'),
+                    policy(11, destination='10.0.0.128/25', action='deny'),
+                    policy(20, source='10.9.0.0/16', nexthops=['1.1.1.1']),
+                    policy(21, source='10.8.0.0/16', nexthops=['1.1.1.1']),
+                    policy(30, destination='10.0.0.0/23', protocol='tcp',
+                           destination_port=80)]
+        compaction = tenantpolicy.compact(policies)
+        self.assertEqual(3, len(compaction.policies))
+        before = tenantpolicy.PolicyMatcher(policies)
+        after = tenantpolicy.PolicyMatcher(compaction.policies)
+        for source in ('10.8.1.1', '10.9.1.1', '10.7.1.1'):
+            for destination in ('10.0.0.1', '10.0.0.200', '10.0.1.1'):
+                flow = {'source': source, 'destination': destination,
+                        'protocol': 'tcp', 'destination_port': 80}
+                self.assertEqual(outcome(before.match(**flow)),
+                                 outcome(after.match(**flow)))
@@ -0,0 +1,180 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_tenantpolicy_bulk
+----------------------------------
+
+Tests for `horizon_bsn.content.connections.tenant_policies.bulk` module.
+"""
+
+import io
+import threading
+
+import fixtures
+
+from horizon_bsn.content.connections.tenant_policies import bulk
+from horizon_bsn.tests import base
+
+CSV = (u'priority,source,source_port,destination,destination_port,'
+       u'protocol,action,nexthops\n'
+       u'10,any,0,10.1.0.0/16,0,,deny,\n'
+       u'\n'
+       u'20,external,0,10.2.3.0/24,443,TCP,permit,'
+       u'"10.9.9.1,10.9.9.2"\n')
+JSON = (u'[{"priority": 10, "source": "any", "destination": "10.1.0.0/16",'
+        u' "action": "deny"},\n'
+        u' {"priority": "20", "source": "external", "destination_port": 443,'
+        u' "destination": "10.2.3.0/24", "protocol": "tcp",'
+        u' "action": "permit", "nexthops": ["10.9.9.1", "10.9.9.2"]}]')
+YAML = (u'- priority: 10\n'
+        u'  source: any\n'
+        u'  destination: 10.1.0.0/16\n'
+        u'  action: deny\n'
+        u'---\n'
+        u'priority: 20\n'
+        u'source: external\n'
+        u'destination: 10.2.3.0/24\n'
+        u'destination_port: 443\n'
+        u'protocol: tcp\n'
+        u'action: permit\n'
+        u'nexthops: [10.9.9.1, 10.9.9.2]\n')
+
+EXPECTED = [{'priority': 10, 'source': 'any', 'source_port': 0,
+             'destination': '10.1.0.0/16', 'destination_port': 0,
+             'protocol': '', 'action': 'deny', 'nexthops': ''},
+            {'priority': 20, 'source': 'external', 'source_port': 0,
+             'destination': '10.2.3.0/24', 'destination_port': 443,
+             'protocol': 'tcp', 'action': 'permit',
+             'nexthops': '10.9.9.1,10.9.9.2'}]
+
+
+def row(priority, **fields):
+    fields.setdefault('source', 'any')
+    fields.setdefault('destination', 'any')
+    fields.setdefault('action', 'permit')
+    fields['priority'] = priority
+    return fields
+
+
+class TestParsePolicies(base.TestCase):
+
+    def parse(self, text, fmt):
+        return list(bulk.parse_policies(
+            io.BytesIO(text.encode('utf-8')), fmt))
+
+    def test_formats_parse_to_the_same_rows(self):
+        for text, fmt in ((CSV, 'csv'), (JSON, 'json'), (YAML, 'yaml')):
+            rows = self.parse(text, fmt)
+            self.assertEqual([1, 2], [number for number, _row in rows], fmt)
+            self.assertEqual(EXPECTED,
+                             [bulk.validate_row(data) for _n, data in rows],
+                             fmt)
+
+    def test_csv_rows_are_counted_not_lines(self):
+        # a blank line and a quoted line break
+        text = CSV.replace(u'"10.9.9.1,10.9.9.2"', u'"10.9.9.1,\n10.9.9.2"')
+        rows = self.parse(text + u'30,any,0,any,0,,deny,\n', 'csv')
+        self.assertEqual([1, 2, 3], [number for number, _row in rows])
+
+    def test_unsupported_format(self):
+        self.assertRaises(ValueError, list,
+                          bulk.parse_policies(io.BytesIO(b''), 'xml'))
+
+
+class TestValidateRow(base.TestCase):
+
+    def test_invalid_rows(self):
+        for data in (row('x'), row(0), row(3001),
+                     row(10, destination='10.0.0.1'),
+                     row(10, destination='10.0.0.300/24'),
+                     row(10, protocol='tcp', source_port=70000),
+                     row(10, destination_port=80),
+                     row(10, protocol='icmp'),
+                     row(10, action='drop'),
+                     row(10, nexthops='10.0.0.1.1'),
+                     row(10, color='red'),
+                     ['10', 'any']):
+            self.assertRaises(bulk.ValidationError, bulk.validate_row, data)
+
+    def test_deny_drops_nexthops(self):
+        self.assertEqual('', bulk.validate_row(
+            row(10, action='deny', nexthops='10.0.0.1'))['nexthops'])
+
+
+class TestImportPolicies(base.TestCase):
+
+    def setUp(self):
+        super(TestImportPolicies, self).setUp()
+        self.created = []
+        lock = threading.Lock()
+
+        def tenantpolicy_create(request, **params):
+            if params['priority'] == 50:
+                raise Exception('backend refused')
+            with lock:
+                self.created.append(params)
+            return dict(params, id='policy-%d' % params['priority'])
+
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.api.neutron.tenantpolicy_create',
+            tenantpolicy_create))
+
+    def statuses(self, rows, existing=()):
+        results = bulk.import_policies(None, enumerate(rows, 1),
+                                       existing_priorities=existing,
+                                       max_workers=3)
+        return [(r.row, r.status) for r in results]
+
+    def test_one_result_per_row(self):
+        rows = [row(10), row(20, destination='10.0.0.1'), row(30),
+                row(40, destination_port=99999, protocol='tcp'), row(50)]
+        self.assertEqual([(1, bulk.CREATED), (2, bulk.INVALID),
+                          (3, bulk.CREATED), (4, bulk.INVALID),
+                          (5, bulk.FAILED)], self.statuses(rows))
+        self.assertEqual([10, 30],
+                         sorted(p['priority'] for p in self.created))
+
+    def test_duplicate_priorities(self):
+        rows = [row(10), row(20), row(10), row('30')]
+        self.assertEqual([(1, bulk.CREATED), (2, bulk.INVALID),
+                          (3, bulk.INVALID), (4, bulk.CREATED)],
+                         self.statuses(rows, existing=['20']))
+        self.assertEqual([10, 30],
+                         sorted(p['priority'] for p in self.created))
+
+    def test_parse_error_stops_the_import(self):
+        rows = bulk.parse_policies(
+            io.BytesIO(b'[{"priority": 10, "source": "any", '
+                       b'"destination": "any", "action": "permit"}, oops]'),
+            'json')
+        results = bulk.import_policies(None, rows)
+        self.assertEqual([(1, bulk.CREATED), (None, bulk.INVALID)],
+                         [(r.row, r.status) for r in results])
+
+
+class TestExportPolicies(base.TestCase):
+
+    def test_round_trip(self):
+        policies = [dict(data, id='policy-%d' % data['priority'],
+                         tenant_id='tenant')
+                    for data in reversed(EXPECTED)]
+        for fmt in bulk.FORMATS:
+            text = u''.join(bulk.export_policies(policies, fmt))
+            rows = bulk.parse_policies(io.BytesIO(text.encode('utf-8')), fmt)
+            self.assertEqual(EXPECTED,
+                             [bulk.validate_row(data) for _n, data in rows],
+                             fmt)
+
+    def test_unsupported_format(self):
+        self.assertRaises(ValueError, list, bulk.export_policies([], 'xml'))
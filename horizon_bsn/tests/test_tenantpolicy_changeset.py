@@ -0,0 +1,201 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_tenantpolicy_changeset
+----------------------------------
+
+Tests for `horizon_bsn.api.tenantpolicy_changeset` module.
+"""
+
+import fixtures
+
+from horizon_bsn.api import tenantpolicy_changeset as changeset
+from horizon_bsn.tests import base
+
+
+def policy(priority, destination='any', action='permit'):
+    return {'id': 'policy-%d' % priority,
+            'priority': priority,
+            'source': 'any',
+            'source_port': 0,
+            'destination': destination,
+            'destination_port': 0,
+            'protocol': '',
+            'action': action,
+            'nexthops': []}
+
+
+class FakeBackend(object):
+    """Tenant policies kept in a dict, enforcing unique priorities."""
+
+    def __init__(self, policies, fail_on=None):
+        self.policies = dict((p['id'], dict(p)) for p in policies)
+        self.fail_on = fail_on
+        self.calls = []
+        self.counter = 0
+
+    def _check(self, kind, priority, policy_id=None):
+        self.calls.append((kind, priority))
+        if self.fail_on == (kind, priority):
+            raise Exception('injected failure')
+        for other in self.policies.values():
+            if other['priority'] == priority and other['id'] != policy_id:
+                raise Exception('priority %s in use' % priority)
+
+    def create(self, request, **params):
+        self._check('create', params['priority'])
+        self.counter += 1
+        params['id'] = 'new-%d' % self.counter
+        self.policies[params['id']] = params
+        return params
+
+    def update(self, request, policy_id, **params):
+        self._check('update',
+                    params.get('priority',
+                               self.policies[policy_id]['priority']),
+                    policy_id)
+        self.policies[policy_id].update(params)
+        return self.policies[policy_id]
+
+    def delete(self, request, policy_id, tenant_id=None):
+        self.calls.append(('delete', policy_id))
+        del self.policies[policy_id]
+
+    def priorities(self):
+        return dict((p['id'], p['priority'])
+                    for p in self.policies.values())
+
+    def install(self, test):
+        for name in ('create', 'update', 'delete'):
+            test.useFixture(fixtures.MonkeyPatch(
+                'horizon_bsn.api.neutron.tenantpolicy_%s' % name,
+                getattr(self, name)))
+
+
+class TestChangeSet(base.TestCase):
+
+    def test_swap_priorities_uses_spare_priority(self):
+        current = [policy(10), policy(20, destination='10.0.0.0/8')]
+        backend = FakeBackend(current)
+        backend.install(self)
+        cs = changeset.ChangeSet(current, moves={'policy-10': 20,
+                                                 'policy-20': 10})
+        self.assertEqual(3, len(cs))
+        cs.apply(None)
+        self.assertEqual({'policy-10': 20, 'policy-20': 10},
+                         backend.priorities())
+
+    def test_shift_chain_is_ordered(self):
+        current = [policy(p, destination='10.0.%d.0/24' % p)
+                   for p in (1, 2, 3)]
+        backend = FakeBackend(current)
+        backend.install(self)
+        moves = {'policy-1': 2, 'policy-2': 3, 'policy-3': 4}
+        cs = changeset.ChangeSet(current, moves=moves)
+        self.assertEqual(3, len(cs.stages))
+        cs.apply(None)
+        self.assertEqual(moves, backend.priorities())
+
+    def test_delete_and_identical_add_becomes_move(self):
+        current = [policy(10, destination='10.0.0.0/8')]
+        new = dict(policy(30, destination='10.0.0.0/8'), id=None)
+        cs = changeset.ChangeSet(current, adds=[new], deletes=['policy-10'])
+        self.assertEqual([changeset.Operation(changeset.UPDATE, 'policy-10',
+                                              {'priority': 30})],
+                         cs.operations)
+
+    def test_deletes_free_priorities_for_creates(self):
+        current = [policy(10)]
+        backend = FakeBackend(current)
+        backend.install(self)
+        new = policy(10, action='deny')
+        del new['id']
+        cs = changeset.ChangeSet(current, adds=[new], deletes=['policy-10'])
+        cs.apply(None)
+        self.assertEqual([('delete', 'policy-10'), ('create', 10)],
+                         backend.calls)
+
+    def test_duplicate_priorities_rejected(self):
+        current = [policy(10), policy(20)]
+        self.assertRaises(changeset.ChangeSetError, changeset.ChangeSet,
+                          current, moves={'policy-10': 20})
+
+    def test_failure_rolls_back(self):
+        current = [policy(10), policy(20, destination='10.0.0.0/8')]
+        backend = FakeBackend(current, fail_on=('create', 40))
+        backend.install(self)
+        new = policy(40, action='deny')
+        del new['id']
+        cs = changeset.ChangeSet(current, adds=[new],
+                                 deletes=['policy-10'],
+                                 moves={'policy-20': 30})
+        error = self.assertRaises(changeset.ChangeSetError, cs.apply, None)
+        self.assertTrue(error.rolled_back)
+        self.assertEqual([10, 20], sorted(backend.priorities().values()))
+
+    def test_field_updates_run_before_deletes(self):
+        current = [policy(10, destination='10.0.0.0/24'),
+                   policy(20, destination='10.0.1.0/24')]
+        backend = FakeBackend(current)
+        backend.install(self)
+        cs = changeset.ChangeSet(
+            current, deletes=['policy-20'],
+            updates={'policy-10': {'destination': '10.0.0.0/23'}})
+        cs.apply(None)
+        self.assertEqual([('update', 10), ('delete', 'policy-20')],
+                         backend.calls)
+        self.assertEqual('10.0.0.0/23',
+                         backend.policies['policy-10']['destination'])
+
+    def test_failure_restores_updated_fields(self):
+        current = [policy(10, destination='10.0.0.0/24'),
+                   policy(20, destination='10.0.1.0/24')]
+        backend = FakeBackend(current, fail_on=('create', 30))
+        backend.install(self)
+        new = policy(30, action='deny')
+        del new['id']
+        cs = changeset.ChangeSet(
+            current, adds=[new],
+            updates={'policy-10': {'destination': '10.0.0.0/23'}})
+        error = self.assertRaises(changeset.ChangeSetError, cs.apply, None)
+        self.assertTrue(error.rolled_back)
+        self.assertEqual('10.0.0.0/24',
+                         backend.policies['policy-10']['destination'])
+
+    def test_apply_changes_writes_to_the_given_tenant(self):
+        current = [dict(policy(10), tenant_id='other')]
+        backend = FakeBackend(current)
+        backend.install(self)
+        listed = []
+
+        def tenantpolicy_list(request, **params):
+            listed.append(params)
+            return current
+
+        deleted = []
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.api.neutron.tenantpolicy_list', tenantpolicy_list))
+        self.useFixture(fixtures.MonkeyPatch(
+            'horizon_bsn.api.neutron.tenantpolicy_delete',
+            lambda request, policy_id, tenant_id=None: deleted.append(
+                (policy_id, tenant_id))))
+        new = policy(20, action='deny')
+        del new['id']
+        changeset.apply_changes(None, adds=[new], deletes=['policy-10'],
+                                tenant_id='other')
+        self.assertEqual([{'tenant_id': 'other'}], listed)
+        self.assertEqual([('policy-10', 'other')], deleted)
+        self.assertEqual(['other'],
+                         [p.get('tenant_id') for p in backend.policies.values()
+                          if p['id'].startswith('new-')])
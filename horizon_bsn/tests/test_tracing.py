@@ -0,0 +1,68 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+test_tracing
+----------------------------------
+
+Tests for `horizon_bsn.api.tracing` module.
+"""
+
+from horizon_bsn.api import tracing
+from horizon_bsn.tests import base
+
+
+class FakeRequest(object):
+
+    def __init__(self, request_id=None):
+        self.META = {}
+        if request_id:
+            self.META[tracing.REQUEST_ID_HEADER] = request_id
+
+
+def trace(latency, path='core/switch'):
+    return tracing.Trace(None, 'GET', path, 200, 0, None, latency, 0)
+
+
+class TestTracing(base.TestCase):
+
+    def test_slow_log_keeps_slowest(self):
+        slow_log = tracing.SlowLog(size=3)
+        for latency in (0.5, 0.1, 2.0, 0.3, 1.0, 0.2):
+            slow_log.add(trace(latency))
+        self.assertEqual([2.0, 1.0, 0.5],
+                         [t.latency for t in slow_log.slowest()])
+
+    def test_calls_carry_request_correlation_id(self):
+        tracer = tracing.Tracer(sample_rate=0)
+        request = FakeRequest('req-1234')
+        with tracing.correlate(request):
+            state = tracer.start('GET', 'core/switch')
+            tracing.first_byte(state)
+            tracing.add_bytes(state, 10)
+            recorded = tracer.finish(state, 200)
+        self.assertIsNone(tracing.correlation_id())
+        self.assertEqual('req-1234', recorded.correlation_id)
+        self.assertEqual(10, recorded.bytes)
+        self.assertLessEqual(recorded.ttfb, recorded.latency)
+        self.assertEqual([recorded], tracer.slow_log.slowest())
+
+    def test_middleware_sets_and_clears_id(self):
+        middleware = tracing.CorrelationMiddleware()
+        request = FakeRequest()
+        middleware.process_request(request)
+        cid = tracing.correlation_id()
+        self.assertTrue(cid.startswith('req-'))
+        self.assertEqual(cid, tracing.request_correlation_id(request))
+        middleware.process_response(request, None)
+        self.assertIsNone(tracing.correlation_id())